@@ -12,10 +12,9 @@ DISCORD_CLIENT_ID = os.environ["DISCORD_CLIENT_ID"]
 OWNER_USERID = int(os.environ["OWNER_USERID"])
 ADMIN_SERVER_ID = int(os.environ["ADMIN_SERVER_ID"])
 
-ALLOWED_SERVER_IDS: list[int] = [ADMIN_SERVER_ID]
-server_ids = os.environ["ALLOWED_SERVER_IDS"].split(",")
-for s in server_ids:
-    ALLOWED_SERVER_IDS.append(int(s))
+ALLOWED_SERVER_IDS: frozenset[int] = frozenset(
+    [ADMIN_SERVER_ID] + [int(s) for s in os.environ["ALLOWED_SERVER_IDS"].split(",")]
+)
 
 # Send Messages, Create Public Threads, Send Messages in Threads, Manage Messages, Manage Threads, Read Message History, Use Slash Command
 BOT_INVITE_URL = f"https://discord.com/api/oauth2/authorize?client_id={DISCORD_CLIENT_ID}&permissions=328565073920&scope=bot"
@@ -26,6 +25,77 @@ ACTIVATE_CHAT_THREAD_PREFIX = "💬✅"
 INACTIVATE_CHAT_THREAD_PREFIX = "💬❌"
 ACTIVATE_BUILD_THREAD_PREFIX = "🔨✅"
 INACTIVATE_BUILD_THREAD_PREFIX = "🔨❌"
-MAX_CHARS_PER_REPLY_MSG = 1500  # discord has a 2k limit, we just break message into 1.5k
+MAX_CHARS_PER_REPLY_MSG = 2000  # the discord limit, the splitter never exceeds it
+# Replies longer than this are sent as a markdown file, with their beginning as the message
+REPLY_ATTACHMENT_CHARS = int(os.environ.get("REPLY_ATTACHMENT_CHARS", "16000"))
 
 MAX_ASSISTANT_LIST = 20  # must be between 1 and 100
+
+# Stream assistant replies into the thread by editing a placeholder message as tokens arrive
+STREAM_RESPONSES = os.environ.get("STREAM_RESPONSES", "true").lower() == "true"
+STREAM_EDIT_INTERVAL_SECONDS = float(os.environ.get("STREAM_EDIT_INTERVAL_SECONDS", "1.0"))  # discord allows ~5 edits / 5s per channel
+STREAM_PLACEHOLDER_TEXT = "..."
+
+# Polling of runs when streaming is not used: start fast, then back off exponentially with jitter
+RUN_POLL_INITIAL_INTERVAL_SECONDS = float(os.environ.get("RUN_POLL_INITIAL_INTERVAL_SECONDS", "0.25"))
+RUN_POLL_MAX_INTERVAL_SECONDS = float(os.environ.get("RUN_POLL_MAX_INTERVAL_SECONDS", "4.0"))
+RUN_POLL_BACKOFF = 1.5
+RUN_POLL_JITTER = 0.2  # +-20% of the interval
+
+# Wall-clock budget of a run, after which it is cancelled
+RUN_DEADLINE_SECONDS = float(os.environ.get("RUN_DEADLINE_SECONDS", "300"))
+
+# In-memory catalog of all assistants, refreshed in the background
+ASSISTANT_CATALOG_TTL_SECONDS = float(os.environ.get("ASSISTANT_CATALOG_TTL_SECONDS", str(10 * 60)))
+ASSISTANT_CATALOG_PAGE_SIZE = 100  # the maximum page size of the list assistants API
+
+# Pool of empty OpenAI threads kept ready for /chat
+THREAD_POOL_SIZE = int(os.environ.get("THREAD_POOL_SIZE", "4"))  # disabled if 0
+THREAD_POOL_REFILL_PER_SECOND = float(os.environ.get("THREAD_POOL_REFILL_PER_SECOND", "1"))
+THREAD_POOL_MAX_AGE_SECONDS = float(os.environ.get("THREAD_POOL_MAX_AGE_SECONDS", str(24 * 60 * 60)))  # older pooled threads are recycled
+
+# Execution of function tools requested by runs
+TOOL_THREAD_POOL_WORKERS = int(os.environ.get("TOOL_THREAD_POOL_WORKERS", "8"))  # for tools doing blocking I/O
+TOOL_TIMEOUT_SECONDS = float(os.environ.get("TOOL_TIMEOUT_SECONDS", "20"))
+TOOL_MAX_CONCURRENCY = int(os.environ.get("TOOL_MAX_CONCURRENCY", "4"))  # per tool
+
+# Wikipedia function tools
+WIKIPEDIA_LANGUAGE = os.environ.get("WIKIPEDIA_LANGUAGE", "ja")
+WIKIPEDIA_CACHE_SIZE = int(os.environ.get("WIKIPEDIA_CACHE_SIZE", "1024"))  # entries per cache
+WIKIPEDIA_CACHE_TTL_SECONDS = float(os.environ.get("WIKIPEDIA_CACHE_TTL_SECONDS", str(24 * 60 * 60)))
+WIKIPEDIA_NEGATIVE_TTL_SECONDS = 5 * 60  # searches without a result are retried after this long
+WIKIPEDIA_CACHE_DB = os.environ.get("WIKIPEDIA_CACHE_DB", "")  # SQLite file for the on-disk cache, disabled if empty
+WIKIPEDIA_CONTENT_MAX_CHARS = int(os.environ.get("WIKIPEDIA_CONTENT_MAX_CHARS", "8000"))  # budget of the page content tool output
+WIKIPEDIA_CHUNK_CHARS = 1200  # size of the chunks the page content is ranked by
+WIKIPEDIA_BACKEND = os.environ.get("WIKIPEDIA_BACKEND", "api")  # "api" or "local" (offline index, see src/openai_api/wikipedia_index.py)
+WIKIPEDIA_INDEX_DB = os.environ.get("WIKIPEDIA_INDEX_DB", "wikipedia.db")
+WIKIPEDIA_FALLBACK_TO_API = os.environ.get("WIKIPEDIA_FALLBACK_TO_API", "true").lower() == "true"  # when the local index has no match
+TOOL_MAX_OUTPUT_CHARS = int(os.environ.get("TOOL_MAX_OUTPUT_CHARS", "20000"))  # longer outputs are truncated
+TOOL_CACHE_SIZE = 256  # results per cacheable tool
+TOOL_CACHE_TTL_SECONDS = 10 * 60
+
+# Files attached to the messages of a turn, uploaded to OpenAI
+MAX_ATTACHMENTS_PER_TURN = int(os.environ.get("MAX_ATTACHMENTS_PER_TURN", "10"))  # the OpenAI limit per message
+MAX_ATTACHMENT_BYTES = int(os.environ.get("MAX_ATTACHMENT_BYTES", str(512 * 1024 * 1024)))  # the OpenAI limit per file
+UPLOAD_MAX_CONCURRENCY = int(os.environ.get("UPLOAD_MAX_CONCURRENCY", "4"))
+# Files larger than this are streamed through a temporary file instead of being held in memory
+TRANSFER_SPOOL_BYTES = int(os.environ.get("TRANSFER_SPOOL_BYTES", str(8 * 1024 * 1024)))
+TRANSFER_CHUNK_BYTES = 64 * 1024
+
+# Files of code interpreter outputs downloaded to render a reply
+RENDER_MAX_CONCURRENCY = int(os.environ.get("RENDER_MAX_CONCURRENCY", "4"))
+RENDER_CACHE_BYTES = int(os.environ.get("RENDER_CACHE_BYTES", str(64 * 1024 * 1024)))  # memory cap of the cache by file id
+# SQLite file mapping the sha256 of uploaded files to their OpenAI file ids
+FILE_CACHE_DB = os.environ.get("FILE_CACHE_DB", "files.db")
+FILE_CACHE_CHECK_SECONDS = 60 * 60  # a cached file id is checked with the API at most this often
+# Filenames of the files cited in replies, for the sources footer
+FILE_METADATA_CACHE_SIZE = 1024
+FILE_METADATA_TTL_SECONDS = 24 * 60 * 60
+
+# SQLite file mapping discord chat threads to OpenAI threads and assistants
+SESSION_DB = os.environ.get("SESSION_DB", "sessions.db")
+SESSION_FLUSH_SECONDS = 60  # the last activity of the sessions is written in one batch at most this often
+
+# Messages sent to a chat thread within this window, or while a run is in progress, are merged into one turn
+SECONDS_DELAY_RECEIVING_MSG = float(os.environ.get("SECONDS_DELAY_RECEIVING_MSG", "0.5"))
+CONVERSATION_IDLE_SECONDS = 10 * 60  # a conversation actor stops after this long without messages
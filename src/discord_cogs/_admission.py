@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import logging
+
+import discord
+
+from src.constants import ACTIVATE_CHAT_THREAD_PREFIX, ALLOWED_SERVER_IDS
+
+logger = logging.getLogger(__name__)
+
+
+class ChatAdmission:
+    """Decides with a single set lookup whether a gateway message is a message in an active chat thread.
+
+    on_message runs for every message in every allowed guild, so the set of active chat thread
+    ids is kept up to date from the thread events instead of inspecting every message. Only
+    messages in threads missing from the set are inspected, so that chat threads unarchived
+    without an event the bot receives are admitted again.
+    """
+
+    def __init__(self, allowed_guild_ids: frozenset[int] = ALLOWED_SERVER_IDS):
+        self.allowed_guild_ids = allowed_guild_ids
+        self.active_thread_ids: set[int] = set()
+        self.admitted = 0
+        self.rejected = 0
+
+    def admit(self, message: discord.Message, bot_user_id: int) -> bool:
+        if message.channel.id in self.active_thread_ids:
+            self.admitted += 1
+            return True
+        # a chat thread unarchived without a thread update, or archived while the bot was offline
+        if isinstance(message.channel, discord.Thread) and self.is_active_chat_thread(message.channel, bot_user_id):
+            self.active_thread_ids.add(message.channel.id)
+            self.admitted += 1
+            return True
+        self.rejected += 1
+        return False
+
+    def is_active_chat_thread(self, thread: discord.Thread, bot_user_id: int) -> bool:
+        return (
+            thread.guild.id in self.allowed_guild_ids
+            and thread.owner_id == bot_user_id
+            and not thread.archived
+            and not thread.locked
+            and thread.name.startswith(ACTIVATE_CHAT_THREAD_PREFIX)
+        )
+
+    def track(self, thread: discord.Thread, bot_user_id: int) -> None:
+        """Add or remove the thread depending on its current state"""
+        if self.is_active_chat_thread(thread, bot_user_id):
+            self.active_thread_ids.add(thread.id)
+        else:
+            self.active_thread_ids.discard(thread.id)
+
+    def forget(self, thread_id: int) -> None:
+        self.active_thread_ids.discard(thread_id)
+
+    def track_guilds(self, guilds: list[discord.Guild], bot_user_id: int) -> None:
+        """Track the active threads the gateway reported for the guilds"""
+        for guild in guilds:
+            if guild.id not in self.allowed_guild_ids:
+                continue
+            for thread in guild.threads:
+                self.track(thread, bot_user_id)
+        logger.info(f"Tracking {len(self.active_thread_ids)} active chat threads")
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "active_threads": len(self.active_thread_ids),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+        }
+
+
+admission = ChatAdmission()
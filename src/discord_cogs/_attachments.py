@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from typing import IO, AsyncIterator
+
+import aiohttp
+import discord
+
+from src.constants import (
+    MAX_ATTACHMENT_BYTES,
+    MAX_ATTACHMENTS_PER_TURN,
+    TRANSFER_SPOOL_BYTES,
+    UPLOAD_MAX_CONCURRENCY,
+)
+from src.openai_api.files import upload_file
+from src.openai_api.tool_registry import LatencyHistogram
+from src.openai_api.transfer import download_url
+
+logger = logging.getLogger(__name__)
+
+IMAGE_FILE_EXTENSIONS = frozenset([".jpeg", ".jpg", ".gif", ".png", ".webp"])
+
+FILE_SEARCH_EXTENSIONS = frozenset([
+    ".c", ".cs", ".cpp", ".doc", ".docx", ".html", ".java", ".json",
+    ".md", ".pdf", ".php", ".pptx", ".py", ".rb", ".tex", ".txt",
+    ".css", ".js", ".sh", ".ts"
+])
+CODE_INTERPRETER_EXTENSIONS = frozenset([
+    ".c", ".cs", ".cpp", ".doc", ".docx", ".html", ".java", ".json",
+    ".md", ".pdf", ".php", ".pptx", ".py", ".rb", ".tex", ".txt",
+    ".css", ".js", ".sh", ".ts", ".csv", ".jpeg", ".jpg", ".gif",
+    ".png", ".tar", ".xlsx", ".xml", ".zip"
+])
+
+
+@dataclass
+class AttachmentPlan:
+    """What to do with an attachment, decided from its extension"""
+    attachment: discord.Attachment
+    vision: bool  # uploaded as an image the assistant can see
+    tools: list[dict[str, str]]  # the tools the uploaded file is attached to
+
+
+@dataclass
+class IngestedAttachments:
+    image_ids: list[str] = field(default_factory=list)
+    attachments: list[dict[str, str | list[dict[str, str]]]] | None = None
+    rejected: list[str] = field(default_factory=list)  # why files were left out, to tell the user
+
+
+def classify(attachment: discord.Attachment) -> AttachmentPlan | None:
+    """The plan for an attachment, or None if no tool can use it"""
+    extension = os.path.splitext(attachment.filename)[1].lower()
+    tools = []
+    if extension in FILE_SEARCH_EXTENSIONS:
+        tools.append({"type": "file_search"})
+    if extension in CODE_INTERPRETER_EXTENSIONS:
+        tools.append({"type": "code_interpreter"})
+    vision = extension in IMAGE_FILE_EXTENSIONS
+    if not vision and not tools:
+        return None
+    return AttachmentPlan(attachment=attachment, vision=vision, tools=tools)
+
+
+class AttachmentIngestion:
+    """Uploads the attachments of a turn to OpenAI.
+
+    Every attachment is classified once and read once, even if it is uploaded both as an image
+    and for the tools. The limits are checked on the sizes discord reports, before anything is
+    downloaded, and the files are processed concurrently, at most max_concurrency at a time.
+    Files larger than max_memory are streamed through a temporary file, so a transfer never
+    holds more than max_memory in memory.
+    """
+
+    def __init__(
+        self,
+        max_files: int = MAX_ATTACHMENTS_PER_TURN,
+        max_bytes: int = MAX_ATTACHMENT_BYTES,
+        max_concurrency: int = UPLOAD_MAX_CONCURRENCY,
+        max_memory: int = TRANSFER_SPOOL_BYTES,
+        upload=upload_file,
+    ):
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.max_concurrency = max_concurrency
+        self.max_memory = max_memory
+        self.upload = upload
+        self.latency = LatencyHistogram()  # per file, download and uploads
+        self.files = 0
+        self.bytes = 0
+        self.failed = 0
+        self.spooled = 0  # files streamed through a temporary file
+        self._semaphore: asyncio.Semaphore | None = None
+        self._session: aiohttp.ClientSession | None = None
+
+    async def ingest(self, attachments: list[discord.Attachment]) -> IngestedAttachments:
+        result = IngestedAttachments()
+        plans = []
+        for attachment in attachments:
+            plan = classify(attachment)
+            if plan is None:
+                result.rejected.append(f"{attachment.filename}: unsupported file type")
+            elif attachment.size > self.max_bytes:
+                result.rejected.append(f"{attachment.filename}: larger than {self.max_bytes // (1024 * 1024)}MB")
+            elif len(plans) >= self.max_files:
+                result.rejected.append(f"{attachment.filename}: more than {self.max_files} files")
+            else:
+                plans.append(plan)
+        if not plans:
+            return result
+
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        uploaded = await asyncio.gather(*(self._ingest_one(plan) for plan in plans), return_exceptions=True)
+
+        # keep the order of the attachments
+        for plan, outcome in zip(plans, uploaded):
+            if isinstance(outcome, Exception):
+                self.failed += 1
+                logger.exception(outcome)
+                result.rejected.append(f"{plan.attachment.filename}: upload failed")
+                continue
+            image_id, file_id = outcome
+            if image_id is not None:
+                result.image_ids.append(image_id)
+            if file_id is not None:
+                if result.attachments is None:
+                    result.attachments = []
+                result.attachments.append({"file_id": file_id, "tools": plan.tools})
+        return result
+
+    async def _ingest_one(self, plan: AttachmentPlan) -> tuple[str | None, str | None]:
+        """Download the attachment and upload it for vision and/or the tools"""
+        async with self._semaphore:
+            start = time.perf_counter()
+            attachment = plan.attachment
+            image_id = file_id = None
+            if attachment.size <= self.max_memory:
+                pseudo_file = (attachment.filename, await attachment.read(), attachment.content_type)
+                uploads = []
+                if plan.vision:
+                    uploads.append(self.upload(file=pseudo_file, purpose="vision"))
+                if plan.tools:
+                    uploads.append(self.upload(file=pseudo_file))
+                ids = await asyncio.gather(*uploads)
+                image_id = ids[0] if plan.vision else None
+                file_id = ids[-1] if plan.tools else None
+            else:
+                async with self.open(attachment) as f:
+                    # one upload at a time, they read the same file
+                    pseudo_file = (attachment.filename, f, attachment.content_type)
+                    if plan.vision:
+                        f.seek(0)
+                        image_id = await self.upload(file=pseudo_file, purpose="vision")
+                    if plan.tools:
+                        f.seek(0)  # the vision upload read it to the end
+                        file_id = await self.upload(file=pseudo_file)
+            self.latency.observe(time.perf_counter() - start)
+            self.files += 1
+            self.bytes += attachment.size
+        return image_id, file_id
+
+    @contextlib.asynccontextmanager
+    async def open(self, attachment: discord.Attachment) -> AsyncIterator[bytes | IO[bytes]]:
+        """The content of the attachment: bytes up to max_memory, a temporary file above"""
+        if attachment.size <= self.max_memory:
+            yield await attachment.read()
+            return
+        self.spooled += 1
+        if self._session is None:
+            self._session = aiohttp.ClientSession()
+        with await download_url(self._session, attachment.url, attachment.size, self.max_memory) as f:
+            yield f
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def stats(self) -> dict[str, int | str]:
+        return {
+            "files": self.files,
+            "bytes": self.bytes,
+            "failed": self.failed,
+            "spooled": self.spooled,
+            "latency": self.latency.render(),
+        }
+
+
+ingestion = AttachmentIngestion()
@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Awaitable, Callable
+
+import discord
+
+from src.constants import CONVERSATION_IDLE_SECONDS, SECONDS_DELAY_RECEIVING_MSG
+
+logger = logging.getLogger(__name__)
+
+TurnHandler = Callable[[discord.Thread, "list[discord.Message]"], Awaitable[None]]
+SupersedeHandler = Callable[[discord.Thread], Awaitable[None]]
+
+
+class ConversationActor:
+    """Serves one discord chat thread, so that there is only one run at a time per OpenAI thread.
+
+    Messages are posted to a mailbox. A turn is started with every message already in the mailbox
+    plus those arriving within the debounce window, and the messages that arrive while the turn is
+    running are merged into the next turn. If on_supersede is given, it is called once per turn
+    when such a message arrives, so that the run of the current turn can be cancelled.
+    """
+
+    def __init__(
+        self,
+        thread: discord.Thread,
+        handle_turn: TurnHandler,
+        on_stop: Callable[[ConversationActor], None],
+        on_supersede: SupersedeHandler | None = None,
+        debounce: float = SECONDS_DELAY_RECEIVING_MSG,
+        idle_timeout: float = CONVERSATION_IDLE_SECONDS,
+    ):
+        self.thread = thread
+        self.handle_turn = handle_turn
+        self.on_stop = on_stop
+        self.on_supersede = on_supersede
+        self.superseded = False
+        self.debounce = debounce
+        self.idle_timeout = idle_timeout
+        self.mailbox: asyncio.Queue[discord.Message] = asyncio.Queue()
+        self.busy = False
+        self.turns = 0
+        self.task = asyncio.get_running_loop().create_task(self._run())
+
+    def post(self, message: discord.Message) -> None:
+        self.mailbox.put_nowait(message)
+        if self.busy and not self.superseded and self.on_supersede is not None:
+            self.superseded = True
+            asyncio.get_running_loop().create_task(self._supersede())
+
+    async def _supersede(self) -> None:
+        try:
+            await self.on_supersede(self.thread)
+        except Exception as e:
+            logger.exception(e)
+
+    def _drain(self, batch: list[discord.Message]) -> None:
+        while True:
+            try:
+                batch.append(self.mailbox.get_nowait())
+            except asyncio.QueueEmpty:
+                return
+
+    async def _next_batch(self) -> list[discord.Message] | None:
+        try:
+            batch = [await asyncio.wait_for(self.mailbox.get(), timeout=self.idle_timeout)]
+        except asyncio.TimeoutError:
+            return None
+        self._drain(batch)
+        while self.debounce > 0:
+            try:
+                batch.append(await asyncio.wait_for(self.mailbox.get(), timeout=self.debounce))
+            except asyncio.TimeoutError:
+                break
+            self._drain(batch)
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._next_batch()
+            if batch is None:
+                # no await between the check and the removal, so no message can be posted to a stopped actor
+                if self.mailbox.empty():
+                    self.on_stop(self)
+                    return
+                continue
+            self.busy = True
+            self.superseded = False
+            self.turns += 1
+            try:
+                await self.handle_turn(self.thread, batch)
+            except Exception as e:
+                logger.exception(e)
+            finally:
+                self.busy = False
+
+
+class Conversations:
+    """The conversation actors of the active chat threads"""
+
+    def __init__(
+        self,
+        handle_turn: TurnHandler,
+        on_supersede: SupersedeHandler | None = None,
+        debounce: float = SECONDS_DELAY_RECEIVING_MSG,
+        idle_timeout: float = CONVERSATION_IDLE_SECONDS,
+    ):
+        self.handle_turn = handle_turn
+        self.on_supersede = on_supersede
+        self.debounce = debounce
+        self.idle_timeout = idle_timeout
+        self.actors: dict[int, ConversationActor] = {}
+
+    def post(self, message: discord.Message) -> ConversationActor:
+        thread = message.channel
+        actor = self.actors.get(thread.id)
+        if actor is None:
+            actor = ConversationActor(
+                thread,
+                self.handle_turn,
+                on_stop=self._remove,
+                on_supersede=self.on_supersede,
+                debounce=self.debounce,
+                idle_timeout=self.idle_timeout,
+            )
+            self.actors[thread.id] = actor
+        actor.post(message)
+        return actor
+
+    def _remove(self, actor: ConversationActor) -> None:
+        if self.actors.get(actor.thread.id) is actor:
+            del self.actors[actor.thread.id]
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "actors": len(self.actors),
+            "busy": sum(1 for actor in self.actors.values() if actor.busy),
+        }
@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import io
+import logging
+from dataclasses import dataclass, field
+
+import discord
+
+from src.constants import MAX_CHARS_PER_REPLY_MSG, REPLY_ATTACHMENT_CHARS
+from src.discord_cogs._streaming import StreamingReply
+from src.discord_cogs._utils import iter_message_chunks
+
+logger = logging.getLogger(__name__)
+
+MAX_FILES_PER_MESSAGE = 10  # the discord limit
+MAX_EMBEDS_PER_MESSAGE = 10  # the discord limit
+MAX_EMBED_CHARS = 6000  # the discord limit for all the embeds of a message
+REPLY_FILENAME = "reply.md"
+
+
+@dataclass
+class OutboundMessage:
+    content: str | None = None
+    embeds: list[discord.Embed] = field(default_factory=list)
+    files: list[discord.File] = field(default_factory=list)
+
+    def kwargs(self) -> dict[str, str | list[discord.Embed] | list[discord.File]]:
+        """The arguments of thread.send"""
+        kwargs = {}
+        if self.content:
+            kwargs["content"] = self.content
+        if self.embeds:
+            kwargs["embeds"] = self.embeds
+        if self.files:
+            kwargs["files"] = self.files
+        return kwargs
+
+    def edit_kwargs(self) -> dict[str, str | None | list[discord.Embed] | list[discord.File]]:
+        """The arguments of message.edit, replacing everything a streamed message showed"""
+        kwargs = {"content": self.content, "embeds": self.embeds}
+        if self.files:
+            kwargs["attachments"] = self.files
+        return kwargs
+
+
+def pack_reply(
+    text: str,
+    files: list[discord.File],
+    limit: int = MAX_CHARS_PER_REPLY_MSG,
+    attachment_chars: int = REPLY_ATTACHMENT_CHARS,
+) -> list[OutboundMessage]:
+    """Pack the text and files of a reply into as few discord messages as possible.
+
+    Every message carries a chunk of the text in its content, the following chunks in embeds
+    and up to MAX_FILES_PER_MESSAGE files, which go with the last messages. A text longer than
+    attachment_chars is sent as a markdown file instead, with its beginning as the content.
+    """
+    if len(text) > attachment_chars:
+        preview = next(iter_message_chunks(text, limit), None)
+        files = [discord.File(io.BytesIO(text.encode()), filename=REPLY_FILENAME)] + files
+        chunks = [preview] if preview else []
+    else:
+        chunks = [chunk for chunk in iter_message_chunks(text, limit) if chunk.strip()]
+
+    messages = []
+    embeds_per_message = min(MAX_EMBEDS_PER_MESSAGE, MAX_EMBED_CHARS // limit)
+    for start in range(0, len(chunks), embeds_per_message + 1):
+        content, *folded = chunks[start:start + embeds_per_message + 1]
+        messages.append(OutboundMessage(
+            content=content, embeds=[discord.Embed(description=chunk) for chunk in folded]
+        ))
+
+    batches = [files[i:i + MAX_FILES_PER_MESSAGE] for i in range(0, len(files), MAX_FILES_PER_MESSAGE)]
+    if batches and messages:
+        messages[-1].files = batches.pop(0)
+    messages += [OutboundMessage(files=batch) for batch in batches]
+    return messages
+
+
+class ReplySender:
+    """Sends the replies of the assistant packed with pack_reply, counting the sends per reply"""
+
+    def __init__(self):
+        self.replies = 0
+        self.sends = 0
+        self.max_sends = 0
+        self.as_file = 0  # replies sent as a markdown file
+
+    async def send(
+        self,
+        thread: discord.Thread,
+        text: str,
+        files: list[discord.File],
+        streamed: StreamingReply | None = None,
+    ) -> discord.Message | None:
+        """Send the reply, reusing the streamed messages if there are, and return the last message"""
+        outbound = pack_reply(text, files)
+        if len(text) > REPLY_ATTACHMENT_CHARS:
+            self.as_file += 1
+        if streamed:
+            # the streamed messages are edited into the first messages of the layout
+            if outbound:
+                await streamed.finalize(outbound)
+            else:
+                await streamed.discard()
+            sends = len(streamed.messages)
+            self._record(sends)
+            return streamed.messages[-1] if streamed.messages else None
+
+        sent_message = None
+        for message in outbound:
+            sent_message = await thread.send(**message.kwargs())
+        self._record(len(outbound))
+        return sent_message
+
+    def _record(self, sends: int) -> None:
+        self.replies += 1
+        self.sends += sends
+        self.max_sends = max(self.max_sends, sends)
+
+    def stats(self) -> dict[str, int | str]:
+        return {
+            "replies": self.replies,
+            "sends": self.sends,
+            "sends_per_reply": f"{self.sends / self.replies:.2f}" if self.replies else "0",
+            "max_sends": self.max_sends,
+            "as_file": self.as_file,
+        }
+
+
+reply_sender = ReplySender()
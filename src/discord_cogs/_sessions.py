@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import logging
+import sqlite3
+import time
+from dataclasses import asdict, dataclass, field, fields
+
+from src.constants import SESSION_DB, SESSION_FLUSH_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ChatSession:
+    """What a discord chat thread is linked to"""
+    discord_thread_id: int
+    openai_thread_id: str | None = None
+    assistant_id: str | None = None  # None until an assistant is selected
+    owner_id: int | None = None
+    created_at: float = field(default_factory=time.time)
+    last_activity: float = field(default_factory=time.time)
+
+
+_COLUMNS = [f.name for f in fields(ChatSession)]
+
+
+class SessionStore:
+    """ChatSessions by discord thread id, kept in memory and written through to SQLite.
+
+    This replaces reading the thread ids from the embed of the thread starter message, which
+    costs a discord API call for every user message. The last activity, which changes with
+    every message, is only written in batches every flush_interval and by flush.
+    """
+
+    def __init__(self, path: str = SESSION_DB, flush_interval: float = SESSION_FLUSH_SECONDS):
+        self.flush_interval = flush_interval
+        self._sessions: dict[int, ChatSession] = {}
+        self._touched: set[int] = set()  # sessions whose last activity is not written yet
+        self._last_flush = time.monotonic()
+        self._conn = sqlite3.connect(path)
+        with self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS chat_sessions (
+                    discord_thread_id INTEGER PRIMARY KEY,
+                    openai_thread_id TEXT,
+                    assistant_id TEXT,
+                    owner_id INTEGER,
+                    created_at REAL NOT NULL,
+                    last_activity REAL NOT NULL
+                )
+                """
+            )
+
+    def get(self, discord_thread_id: int) -> ChatSession | None:
+        session = self._sessions.get(discord_thread_id)
+        if session is None:
+            row = self._conn.execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM chat_sessions WHERE discord_thread_id = ?",
+                (discord_thread_id,),
+            ).fetchone()
+            if row is None:
+                return None
+            session = ChatSession(*row)
+            self._sessions[discord_thread_id] = session
+        return session
+
+    def put(self, session: ChatSession) -> None:
+        self._sessions[session.discord_thread_id] = session
+        self._touched.discard(session.discord_thread_id)
+        with self._conn:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO chat_sessions ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})",
+                tuple(asdict(session).values()),
+            )
+
+    def update(self, discord_thread_id: int, **changes) -> ChatSession | None:
+        """Change fields of a session. Return None if there is no session for the thread."""
+        session = self.get(discord_thread_id)
+        if session is None:
+            return None
+        for name, value in changes.items():
+            setattr(session, name, value)
+        self.put(session)
+        return session
+
+    def touch(self, discord_thread_id: int) -> None:
+        session = self.get(discord_thread_id)
+        if session is None:
+            return
+        session.last_activity = time.time()
+        self._touched.add(discord_thread_id)
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write the last activity of the touched sessions in one transaction"""
+        self._last_flush = time.monotonic()
+        if not self._touched:
+            return
+        touched, self._touched = self._touched, set()
+        with self._conn:
+            self._conn.executemany(
+                "UPDATE chat_sessions SET last_activity = ? WHERE discord_thread_id = ?",
+                [(self._sessions[id].last_activity, id) for id in touched],
+            )
+
+    def close(self) -> None:
+        self.flush()
+        self._conn.close()
+
+
+sessions = SessionStore()
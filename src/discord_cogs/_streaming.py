@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import TYPE_CHECKING
+
+import discord
+
+from src.constants import STREAM_EDIT_INTERVAL_SECONDS, STREAM_PLACEHOLDER_TEXT
+from src.discord_cogs._utils import split_into_shorter_messages
+
+if TYPE_CHECKING:
+    from src.discord_cogs._outbound import OutboundMessage
+
+logger = logging.getLogger(__name__)
+
+
+class StreamingReply:
+    """A reply in a discord thread that grows while the assistant run is streaming.
+
+    The first message is a placeholder which is edited with the partial text at most once
+    per edit_interval. When the text gets longer than MAX_CHARS_PER_REPLY_MSG, it is moved
+    over to the chunks of split_into_shorter_messages and new messages are sent as needed.
+    Once the run is done, finalize edits the messages into the layout of pack_reply.
+    """
+
+    def __init__(self, thread: discord.Thread, edit_interval: float = STREAM_EDIT_INTERVAL_SECONDS):
+        self.thread = thread
+        self.edit_interval = edit_interval
+        self.messages: list[discord.Message] = []
+        self._pieces: list[str] = []
+        self._shown: list[str] = []
+        self._last_edit = 0.0
+        self._lock = asyncio.Lock()
+
+    @property
+    def text(self) -> str:
+        return "".join(self._pieces)
+
+    async def start(self) -> None:
+        """Send the placeholder message"""
+        self.messages.append(await self.thread.send(STREAM_PLACEHOLDER_TEXT))
+        self._shown.append(STREAM_PLACEHOLDER_TEXT)
+        self._last_edit = time.monotonic()
+
+    async def on_text_delta(self, delta: str) -> None:
+        """Append the delta and edit the thread messages if the edit interval has passed"""
+        self._pieces.append(delta)
+        if self._lock.locked() or time.monotonic() - self._last_edit < self.edit_interval:
+            return
+        await self.show(split_into_shorter_messages(self.text))
+
+    async def show(self, chunks: list[str]) -> None:
+        """Make the thread messages show the chunks, editing only the ones that changed"""
+        async with self._lock:
+            chunks = [chunk for chunk in chunks if chunk.strip()]
+            for i, chunk in enumerate(chunks):
+                if i < len(self.messages):
+                    if self._shown[i] != chunk:
+                        await self.messages[i].edit(content=chunk)
+                        self._shown[i] = chunk
+                else:
+                    self.messages.append(await self.thread.send(chunk))
+                    self._shown.append(chunk)
+            self._last_edit = time.monotonic()
+
+    async def finalize(self, outbound: list[OutboundMessage]) -> None:
+        """Turn the streamed messages into the outbound messages and delete the ones left over"""
+        async with self._lock:
+            for i, message in enumerate(outbound):
+                if i >= len(self.messages):
+                    self.messages.append(await self.thread.send(**message.kwargs()))
+                    self._shown.append(message.content)
+                elif self._shown[i] != message.content or message.embeds or message.files:
+                    try:
+                        await self.messages[i].edit(**message.edit_kwargs())
+                    except discord.HTTPException as e:
+                        # e.g. deleted by a moderator while streaming, the message is sent again
+                        logger.warning(f"Failed to edit streamed message {self.messages[i].id}: {e}")
+                        self.messages[i] = await self.thread.send(**message.kwargs())
+                    self._shown[i] = message.content
+            while len(self.messages) > len(outbound):
+                extra = self.messages.pop()
+                self._shown.pop()
+                try:
+                    await extra.delete()
+                except discord.HTTPException as e:
+                    logger.warning(f"Failed to delete streamed message {extra.id}: {e}")
+
+    async def discard(self) -> None:
+        """Delete all streamed messages"""
+        async with self._lock:
+            for message in self.messages:
+                try:
+                    await message.delete()
+                except discord.HTTPException as e:
+                    logger.warning(f"Failed to delete streamed message {message.id}: {e}")
+            self.messages.clear()
+            self._shown.clear()
@@ -1,8 +1,8 @@
 import logging
-from typing import Optional
+import re
+from typing import Iterator, Optional
 
 import discord
-from discord import Message as DiscordMessage
 from discord import app_commands
 
 from src.constants import (
@@ -11,96 +11,162 @@ from src.constants import (
     MAX_CHARS_PER_REPLY_MSG,
     OWNER_USERID
 )
-from src.openai_api.assistants import list_assistants
+from src.models.assistant import Assistant
+from src.openai_api.assistant_catalog import assistant_catalog
 
 logger = logging.getLogger(__name__)
 
+MAX_AUTOCOMPLETE_CHOICES = 25  # the discord limit
+_OPENING_FENCE_RE = re.compile(r" {0,3}(`{3,})([\w+#.-]{0,32})[ \t]*\n?")
+_CLOSING_FENCE_RE = re.compile(r" {0,3}(`{3,})[ \t]*\n?")
+
 
 async def search_assistants(search: str = '', limit: int = MAX_ASSISTANT_LIST):
-    if search == '':
-        return await list_assistants(limit)
-
-    after = ''
-    found = []
-    while True:
-        assistants = await list_assistants(after=after)
-        for assistant in assistants:
-            if search in assistant.name \
-               or search in assistant.description \
-               or search in assistant.instructions:
-                found.append(assistant)
-            if len(found) >= limit:
-                return found
-
-        if len(assistants) < MAX_ASSISTANT_LIST:
-            break
-        after = assistants[-1].id
-
-    return found
-
-
-def split_into_shorter_messages(text : str, limit=MAX_CHARS_PER_REPLY_MSG, code_block="```"):
-    def split_at_boundary(s, boundary):
-        parts = s.split(boundary)
-        result = []
-        for i, part in enumerate(parts):
-            if i % 2 == 1:
-                result.extend(split_code_block(part))
-            else:
-                result += split_substring(part)
-        return result
-
-    def split_substring(s):
-        if len(s) <= limit:
-            return [s]
-        for boundary in ("\n", " "):
-            if boundary in s:
-                break
-        else:
-            return [s[:limit]] + split_substring(s[limit:])
-
-        pieces = s.split(boundary)
-        result = []
-        current_part = pieces[0]
-        for piece in pieces[1:]:
-            if len(current_part) + len(boundary) + len(piece) > limit:
-                result.append(current_part)
-                current_part = piece
-            else:
-                current_part += boundary + piece
-        result.append(current_part)
-        return result
-
-    def split_code_block(s):
-        if len(code_block + s + code_block) <= limit:
-            return [code_block + s + code_block]
-        else:
-            lines = s.split("\n")
-            result = [code_block]
-            for line in lines:
-                if len(result[-1] + "\n" + line) > limit:
-                    result[-1] += code_block
-                    result.append(code_block + line)
-                else:
-                    result[-1] += "\n" + line
-            result[-1] += code_block
-            return result
-
-    if code_block in text:
-        return split_at_boundary(text, code_block)
-    else:
-        return split_substring(text)
-
-
-def is_last_message_stale(
-    interaction_message: DiscordMessage, last_message: DiscordMessage, bot_id: str
-) -> bool:
-    return (
-        last_message
-        and last_message.id != interaction_message.id
-        and last_message.author
-        and last_message.author.id != bot_id
-    )
+    """The newest assistants, or the best matches of the search in their name, description and instructions.
+
+    Unlike the substring search this replaced, only the words of the instructions are indexed:
+    a term in the middle of a word of the instructions is no longer found, in the name and
+    description it still is.
+    """
+    if search.strip() == '':
+        return (await assistant_catalog.list())[:limit]
+    return await assistant_catalog.search(search, limit)
+
+
+async def assistant_id_autocomplete(int: discord.Interaction, current: str) -> list[app_commands.Choice[str]]:
+    """Suggest assistants from the catalog, ranked by name match and recent use. Never calls OpenAI."""
+    if not assistant_catalog.loaded:
+        # answer within the autocomplete deadline, the next keystroke gets suggestions
+        assistant_catalog.preload()
+        return []
+    return [
+        app_commands.Choice(name=render_assistant_choice(assistant), value=assistant.id)
+        for assistant in assistant_catalog.suggest(current, limit=MAX_AUTOCOMPLETE_CHOICES)
+    ]
+
+
+def render_assistant_choice(assistant: Assistant) -> str:
+    """The label of an assistant in autocomplete, at most 100 characters"""
+    name = assistant.name if assistant.name is not None else "Unknown"
+    return f"{name[:100 - len(assistant.id) - 3]} [{assistant.id}]"
+
+
+def split_into_shorter_messages(text: str, limit: int = MAX_CHARS_PER_REPLY_MSG) -> list[str]:
+    return list(iter_message_chunks(text, limit))
+
+
+def _fence_after(text: str, start: int, end: int, fence: tuple[str, str] | None) -> tuple[str, str] | None:
+    """The code block after the line text[start:end], given the block it starts in.
+
+    Like discord, a block is opened by three or more backticks at the start of the line with
+    at most a language after them, ```inline code``` or ``` followed by prose is text. It is
+    closed by a line of at least as many backticks, so nested fences stay inside.
+    """
+    if fence is None:
+        match = _OPENING_FENCE_RE.fullmatch(text, start, end)
+        return (match.group(1), match.group(1) + match.group(2)) if match else None
+    match = _CLOSING_FENCE_RE.fullmatch(text, start, end)
+    return None if match and len(match.group(1)) >= len(fence[0]) else fence
+
+
+def _cut_position(text: str, start: int, room: int) -> int:
+    """Where to cut a line that does not fit in the room: after the last space that fits, or at the room.
+
+    Neither part may look like a fence the text does not have, so the cut is never right before a
+    backtick and never leaves only backticks before it.
+    """
+    def fence_like(cut: int) -> bool:
+        head = text[start:cut].strip(" ")
+        return text[cut:cut + 4].lstrip(" ").startswith("`") or (head != "" and head.strip("`") == "")
+
+    space = text.rfind(" ", start, start + room)
+    while space > start:
+        if not fence_like(space + 1):
+            return space + 1
+        space = text.rfind(" ", start, space)
+    cut = start + room
+    while cut > start + 1 and fence_like(cut):
+        cut -= 1
+    return cut
+
+
+def iter_message_chunks(text: str, limit: int = MAX_CHARS_PER_REPLY_MSG) -> Iterator[str]:
+    """Split the text into chunks of at most limit characters, in one pass over the text.
+
+    Chunks end at line breaks where possible, then at spaces, and are cut anywhere as a last
+    resort. A code block split over several chunks is closed at the end of a chunk and reopened
+    with the same fence and language at the start of the next one. Lines are only copied once
+    they are placed, so a long unbroken line costs no more than its chunks.
+    """
+    fence = None  # (backticks, opening line) of the code block the current position is in
+    pieces: list[str] = []
+    length = 0  # of the pieces
+    reopened = 0  # length of the opening line the pieces start with, if a code block was reopened
+    position = 0
+    newline = -1  # of the line at the position
+
+    def has_content() -> bool:
+        return length > reopened
+
+    def flush() -> str:
+        """The chunk of the pieces, closed if it ends inside a code block, and start the next one"""
+        nonlocal pieces, length, reopened
+        chunk = "".join(pieces).rstrip("\n")
+        pieces = []
+        length = reopened = 0
+        if fence is not None:
+            chunk += "\n" + fence[0]
+            reopen = fence[1] + "\n"
+            pieces.append(reopen)
+            length = reopened = len(reopen)
+        return chunk
+
+    while position < len(text):
+        if newline < position:
+            newline = text.find("\n", position)
+            if newline == -1:
+                newline = len(text)
+        end = min(newline + 1, len(text))
+
+        # a fence line changes the state once it is placed, only at the start of a line
+        next_fence = fence
+        if (position == 0 or text[position - 1] == "\n") and text.startswith(("`", " "), position):
+            next_fence = _fence_after(text, position, end, fence)
+
+        # keep room for closing the code block in case the chunk ends inside it
+        open_fence = fence or next_fence
+        reserve = len(open_fence[0]) + 1 if open_fence is not None else 0
+        if length + newline - position + reserve <= limit:
+            pieces.append(text[position:end])
+            length += end - position
+            fence = next_fence
+            position = end
+            continue
+
+        if has_content():
+            chunk = flush()
+            if chunk.strip():
+                yield chunk
+            continue
+
+        # the line does not fit in a chunk of its own: cut it at the last space that fits
+        room = limit - length - reserve
+        if room <= 0:
+            raise ValueError(f"limit {limit} is too small for the code block {open_fence[1]!r}")
+        cut = _cut_position(text, position, room)
+        pieces.append(text[position:cut])
+        length += cut - position
+        position = cut
+        fence = open_fence  # a cut opening line still opens the code block
+        chunk = flush()
+        if chunk.strip():
+            yield chunk
+
+    if has_content():
+        # an unterminated code block is closed as well
+        chunk = flush()
+        if chunk.strip():
+            yield chunk
 
 
 def should_block(guild: Optional[discord.Guild]) -> bool:
@@ -11,11 +11,25 @@ from discord.ext import commands
 
 from src.constants import (
     ADMIN_SERVER_ID,
+    OWNER_USERID,
 )
 
+from src.discord_cogs._admission import admission
+from src.discord_cogs._attachments import ingestion
+from src.discord_cogs._outbound import reply_sender
 from src.discord_cogs._utils import (
     is_me,
+    split_into_shorter_messages,
 )
+from src.openai_api.assistant_catalog import assistant_catalog
+from src.openai_api.file_cache import file_cache
+from src.openai_api.file_downloads import file_downloads
+from src.openai_api.file_metadata import file_metadata
+from src.openai_api.functions import wikipedia_cache_stats
+from src.openai_api.run_poller import run_poller
+from src.openai_api.function_tools import tool_registry
+from src.openai_api.run_supervisor import run_supervisor
+from src.openai_api.thread_pool import thread_pool
 
 logger = logging.getLogger(__name__)
 
@@ -39,5 +53,88 @@ class Admin(commands.Cog):
             logger.exception(e)
             await int.response.send_message(f"Failed to sync commands {str(e)}", ephemeral=True)
 
+    @app_commands.command(name="runs")
+    @app_commands.guilds(ADMIN_SERVER_ID)
+    async def runs(self, int: discord.Interaction):
+        """List the assistant runs in progress"""
+        try:
+            if int.user.id != OWNER_USERID:
+                await int.response.send_message('You must be the owner to use this command!')
+                return
+
+            active = run_supervisor.list_runs()
+            poll_counts = run_poller.poll_counts()
+            s = "Runs: " + ", ".join(f"{k}={v}" for k, v in run_supervisor.stats().items()) + "\n"
+            for supervised in active:
+                s += (
+                    f"`{supervised.run_id}` thread `{supervised.thread_id}` assistant `{supervised.assistant_id}`"
+                    f" - {supervised.elapsed:.0f}s / {supervised.budget:.0f}s"
+                    f", {poll_counts.get(supervised.run_id, 0)} polls\n"
+                )
+            responses = split_into_shorter_messages(s)
+            await int.response.send_message(responses[0])
+            for response in responses[1:]:
+                await int.followup.send(response)
+
+        except Exception as e:
+            logger.exception(e)
+            await int.response.send_message(f"Failed to list runs {str(e)}", ephemeral=True)
+
+    @app_commands.command(name="killrun")
+    @app_commands.guilds(ADMIN_SERVER_ID)
+    async def killrun(self, int: discord.Interaction, run_id: str):
+        """Cancel a run in progress by its run id or thread id"""
+        try:
+            if int.user.id != OWNER_USERID:
+                await int.response.send_message('You must be the owner to use this command!')
+                return
+
+            await int.response.defer()
+            supervised = await run_supervisor.kill(run_id)
+            if supervised is None:
+                await int.followup.send(f"No run in progress with id `{run_id}`.")
+            else:
+                await int.followup.send(f"Cancelled run `{supervised.run_id}` in thread `{supervised.thread_id}`.")
+
+        except Exception as e:
+            logger.exception(e)
+            await int.followup.send(f"Failed to cancel run {str(e)}", ephemeral=True)
+
+    @app_commands.command(name="stats")
+    @app_commands.guilds(ADMIN_SERVER_ID)
+    async def stats(self, int: discord.Interaction):
+        """Show the cache and tool statistics of the bot"""
+        try:
+            if int.user.id != OWNER_USERID:
+                await int.response.send_message('You must be the owner to use this command!')
+                return
+
+            s = "```\n"
+            for name, cache_stats in wikipedia_cache_stats().items():
+                s += f"{name}: " + ", ".join(f"{k}={v}" for k, v in cache_stats.items()) + "\n"
+            s += "on_message: " + ", ".join(f"{k}={v}" for k, v in admission.stats().items()) + "\n"
+            s += "assistants: " + ", ".join(f"{k}={v}" for k, v in assistant_catalog.stats().items()) + "\n"
+            s += "attachments: " + ", ".join(f"{k}={v}" for k, v in ingestion.stats().items()) + "\n"
+            s += "file uploads: " + ", ".join(f"{k}={v}" for k, v in file_cache.stats().items()) + "\n"
+            s += "file downloads: " + ", ".join(f"{k}={v}" for k, v in file_downloads.stats().items()) + "\n"
+            s += "file metadata: " + ", ".join(f"{k}={v}" for k, v in file_metadata.stats().items()) + "\n"
+            s += "replies: " + ", ".join(f"{k}={v}" for k, v in reply_sender.stats().items()) + "\n"
+            s += "thread pool: " + ", ".join(f"{k}={v}" for k, v in thread_pool.stats().items()) + "\n"
+            chat = self.bot.get_cog("Chat")
+            if chat is not None:
+                s += "conversations: " + ", ".join(f"{k}={v}" for k, v in chat.conversations.stats().items()) + "\n"
+            for name, latency in tool_registry.latency_stats().items():
+                s += f"{name}: {latency}\n"
+            s += "```"
+            # the code block is reopened in every message of a long output
+            responses = split_into_shorter_messages(s)
+            await int.response.send_message(responses[0])
+            for response in responses[1:]:
+                await int.followup.send(response)
+
+        except Exception as e:
+            logger.exception(e)
+            await int.response.send_message(f"Failed to show stats {str(e)}", ephemeral=True)
+
 async def setup(bot):
     await bot.add_cog(Admin(bot))
@@ -15,7 +15,9 @@ from src.constants import (
     MAX_CHARS_PER_REPLY_MSG,
     ADMIN_SERVER_ID,
 )
+from src.discord_cogs._attachments import ingestion
 from src.discord_cogs._utils import (
+    assistant_id_autocomplete,
     search_assistants,
     should_block,
     split_into_shorter_messages,
@@ -36,7 +38,7 @@ from src.openai_api.files import (
     create_vector_store,
     update_vector_store,
 )
-from src.openai_api.function_tools import get_available_functions
+from src.openai_api.function_tools import tool_registry
 
 logger = logging.getLogger(__name__)
 
@@ -126,13 +128,12 @@ class Assistant(commands.Cog):
                 
             if function_calling_value:
                 view = FunctionSelectView(thread=thread)
-                available_functions = get_available_functions()
                 
-                for func in available_functions:
+                for tool in tool_registry.tools.values():
                     view.selectMenu.add_option(
-                        label=func["function"]["name"],
-                        value=func["function"]["name"],
-                        description=func["function"]["description"][0:min([100, len(func["function"]["description"])])],
+                        label=tool.name,
+                        value=tool.name,
+                        description=tool.description[0:min([100, len(tool.description)])],
                     )
 
                 await thread.send("Select the function:", view=view)
@@ -140,9 +141,9 @@ class Assistant(commands.Cog):
                 try:
                     await asyncio.wait_for(view.wait(), timeout=180)
                     if view.selected_function:
-                        func = next((f for f in available_functions if f["function"]["name"] == view.selected_function), None)
-                        if func:
-                            function_tool_dict = function_tool_to_dict(func)
+                        tool = tool_registry.get(view.selected_function)
+                        if tool:
+                            function_tool_dict = function_tool_to_dict(tool.schema)
                             tools.append(function_tool_dict)
                             await thread.send("Function was added to the assistant.")
                     else:
@@ -178,12 +179,13 @@ class Assistant(commands.Cog):
                     message = await self.bot.wait_for("message", check=lambda m: m.author == user)
                     if message.attachments:
                         for attachment in message.attachments:
-                            pseudo_file = ( 
-                                attachment.filename, 
-                                await attachment.read(), 
-                                attachment.content_type
-                            )
-                            file_id = await upload_file(file=pseudo_file)
+                            async with ingestion.open(attachment) as content:
+                                pseudo_file = (
+                                    attachment.filename,
+                                    content,
+                                    attachment.content_type
+                                )
+                                file_id = await upload_file(file=pseudo_file)
                             file_ids.append(file_id)
             else:
                 file_ids = list() # Reset file_ids
@@ -226,6 +228,7 @@ class Assistant(commands.Cog):
 
     @app_commands.command(name="update")
     @app_commands.guilds(ADMIN_SERVER_ID)
+    @app_commands.autocomplete(assistant_id=assistant_id_autocomplete)
     async def update(self, int: discord.Interaction, assistant_id: str):
         """Update an assistant"""
         try:
@@ -317,13 +320,12 @@ class Assistant(commands.Cog):
 
             if function_calling_value:
                 view = FunctionSelectView(thread=thread)
-                available_functions = get_available_functions()
 
-                for func in available_functions:
+                for tool in tool_registry.tools.values():
                     view.selectMenu.add_option(
-                        label=func["function"]["name"],
-                        value=func["function"]["name"],
-                        description=func["function"]["description"][0:min([100, len(func["function"]["description"])])],
+                        label=tool.name,
+                        value=tool.name,
+                        description=tool.description[0:min([100, len(tool.description)])],
                     )
 
                 await thread.send("Select the function:", view=view)
@@ -331,9 +333,9 @@ class Assistant(commands.Cog):
                 try:
                     await asyncio.wait_for(view.wait(), timeout=180)
                     if view.selected_function:
-                        func = next((f for f in available_functions if f["function"]["name"] == view.selected_function), None)
-                        if func:
-                            function_tool_dict = function_tool_to_dict(func)
+                        tool = tool_registry.get(view.selected_function)
+                        if tool:
+                            function_tool_dict = function_tool_to_dict(tool.schema)
                             tools.append(function_tool_dict)
                             await thread.send("Function was added to the assistant.")
                     else:
@@ -395,32 +397,35 @@ class Assistant(commands.Cog):
                     message = await self.bot.wait_for("message", check=lambda m: m.author == user)
                     if message.attachments:
                         for attachment in message.attachments:
-                            pseudo_file = ( 
-                                attachment.filename, 
-                                await attachment.read(), 
-                                attachment.content_type
-                            )
-                            if retrieval_value:
-                                if tool_resources["file_search"] is None:
-                                    tool_resources["file_search"] = dict(
-                                        vector_store_ids=list()
-                                    )
-                                    tool_resources["file_search"]["vector_store_ids"].append(
-                                        await create_vector_store(
-                                            name=f"{assistant.name} - Vector Store"
+                            async with ingestion.open(attachment) as content:
+                                pseudo_file = (
+                                    attachment.filename,
+                                    content,
+                                    attachment.content_type
+                                )
+                                if retrieval_value:
+                                    if tool_resources["file_search"] is None:
+                                        tool_resources["file_search"] = dict(
+                                            vector_store_ids=list()
+                                        )
+                                        tool_resources["file_search"]["vector_store_ids"].append(
+                                            await create_vector_store(
+                                                name=f"{assistant.name} - Vector Store"
+                                            )
                                         )
-                                    )
-                                else:
-                                    vector_store_id = tool_resources["file_search"]["vector_store_ids"][-1]
-                                    _ = await update_vector_store(vector_store_id, pseudo_file)
+                                    else:
+                                        vector_store_id = tool_resources["file_search"]["vector_store_ids"][-1]
+                                        _ = await update_vector_store(vector_store_id, pseudo_file)
                                 
-                            if code_interpreter_value:
-                                if tool_resources["code_interpreter"] is None:
-                                    tool_resources["code_interpreter"] = dict(
-                                        file_ids=list()
-                                    )
-                                file_id = await upload_file(file=pseudo_file)
-                                tool_resources["code_interpreter"]["file_ids"].append(file_id)
+                                if code_interpreter_value:
+                                    if tool_resources["code_interpreter"] is None:
+                                        tool_resources["code_interpreter"] = dict(
+                                            file_ids=list()
+                                        )
+                                    if not isinstance(content, bytes):
+                                        content.seek(0)  # the vector store upload read it to the end
+                                    file_id = await upload_file(file=pseudo_file)
+                                    tool_resources["code_interpreter"]["file_ids"].append(file_id)
             
                 assistant.tool_resources = tool_resources # Update tool_resources
             else:
@@ -441,16 +446,17 @@ class Assistant(commands.Cog):
 
     @app_commands.command(name="show")
     @app_commands.guilds(ADMIN_SERVER_ID)
+    @app_commands.autocomplete(assistant_id=assistant_id_autocomplete)
     @is_me()
     async def show(self, int: discord.Interaction, assistant_id: str):
         """Show the specified assistant"""
         await int.response.defer()
         assistant = await get_assistant(assistant_id)
-        s = f"```Name: {assistant.name}\n"
+        s = f"```\nName: {assistant.name}\n"
         s += f"Description: {assistant.description}\n"
         s += f"Instructions: {assistant.instructions}\n"
         s += f"Tools: {assistant.tools}\n"
-        s += f"ToolResources: {assistant.tool_resources}```"
+        s += f"ToolResources: {assistant.tool_resources}\n```"
         responses = split_into_shorter_messages(s)
         for response in responses:
             if len(response) > 0:
@@ -475,6 +481,7 @@ class Assistant(commands.Cog):
 
     @app_commands.command(name="delete")
     @app_commands.guilds(ADMIN_SERVER_ID)
+    @app_commands.autocomplete(assistant_id=assistant_id_autocomplete)
     async def delete(self, int: discord.Interaction, assistant_id: str):
         """Delete the specified assistant"""
         await int.response.defer()  # defer the response to avoid timeout during openai_api call
@@ -1,9 +1,8 @@
 from __future__ import annotations
 
-import os
-
 import logging
 import asyncio
+import time
 
 import discord
 from discord import Message as DiscordMessage
@@ -11,40 +10,43 @@ from discord import app_commands
 from discord.ext import commands
 from discord.ui import Select, View
 
-from src.constants import ACTIVATE_CHAT_THREAD_PREFIX, MAX_ASSISTANT_LIST
+from src.constants import ACTIVATE_CHAT_THREAD_PREFIX, MAX_ASSISTANT_LIST, STREAM_RESPONSES
 from src.discord_cogs._utils import (
-    is_last_message_stale,
-    search_assistants,
+    assistant_id_autocomplete,
     should_block,
-    split_into_shorter_messages,
 )
+from src.discord_cogs._admission import admission
+from src.discord_cogs._attachments import ingestion
+from src.discord_cogs._conversation import Conversations
+from src.discord_cogs._outbound import reply_sender
+from src.discord_cogs._sessions import ChatSession, sessions
+from src.discord_cogs._streaming import StreamingReply
 from src.models.api_response import ResponseData, ResponseStatus
 from src.models.message import MessageCreate
-from src.openai_api.assistants import list_assistants, get_assistant
-from src.openai_api.thread_messages import create_thread, generate_response
-from src.openai_api.files import upload_file
+from src.openai_api.assistant_catalog import assistant_catalog
+from src.openai_api.assistants import get_assistant
+from src.openai_api.thread_messages import generate_response
+from src.openai_api.run_supervisor import run_supervisor
+from src.openai_api.thread_pool import thread_pool
 
 logger = logging.getLogger(__name__)
 
-IMAGE_FILE_EXTENSION = [".jpeg", ".jpg", ".gif", ".png", ".webp"]
-
-FILE_SEARCH_EXTENSION = [
-    ".c", ".cs", ".cpp", ".doc", ".docx", ".html", ".java", ".json", 
-    ".md", ".pdf", ".php", ".pptx", ".py", ".rb", ".tex", ".txt", 
-    ".css", ".js", ".sh", ".ts"
-]
-CODE_INTERPRETER_EXTENSION = [
-    ".c", ".cs", ".cpp", ".doc", ".docx", ".html", ".java", ".json", 
-    ".md", ".pdf", ".php", ".pptx", ".py", ".rb", ".tex", ".txt", 
-    ".css", ".js", ".sh", ".ts", ".csv", ".jpeg", ".jpg", ".gif", 
-    ".png", ".tar", ".xlsx", ".xml", ".zip"
-]
-
 class Chat(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
+        self.conversations = Conversations(handle_turn=self.respond, on_supersede=self.supersede)
+
+    async def cog_load(self):
+        thread_pool.start()
+        assistant_catalog.preload()
+
+    async def cog_unload(self):
+        await thread_pool.stop()
+        sessions.flush()
+        await ingestion.close()
 
     @app_commands.command(name="chat")
+    @app_commands.autocomplete(assistant_id=assistant_id_autocomplete)
     async def chat(self, int: discord.Interaction,
             assistant_id: str = "Not selected",
             thread_id: str = None, search: str = ''):
@@ -61,108 +63,128 @@ class Chat(commands.Cog):
             user = int.user
             logger.info(f"Chat command by {user}")
 
+            # Acknowledge right away, the interaction fails if it is not answered within 3 seconds
+            await int.response.defer()
+
             # Create embed
             embed = discord.Embed(
                 description=f"<@{user.id}> wants to chat! 🤖💬",
                 color=discord.Color.green(),
             )
 
-            # Call openai api to create thread
+            # Take a pre-created openai thread. If the pool is empty, the thread is created
+            # with the first run, see generate_response
             if thread_id is None:
-                openai_thread = await create_thread()
-                thread_id = openai_thread.id
+                thread_id = thread_pool.take()
             if assistant_id == "Not selected":
                 name = "Unknown"
             else:
                 assistant = await get_assistant(assistant_id)
                 name = assistant.name
-            embed.add_field(name="thread_id", value=thread_id)
+                assistant_catalog.mark_used(assistant_id)
+            embed.add_field(name="thread_id", value=thread_id or "Not created")
             embed.add_field(name="assistant_id", value=assistant_id)
             embed.add_field(name="name", value=name)
-            await int.response.send_message(embed=embed)
 
             # create the thread
-            response = await int.original_response()
+            response = await int.edit_original_response(embed=embed)
             thread = await response.create_thread(
                 name=f"{ACTIVATE_CHAT_THREAD_PREFIX} {user.name[:20]}",
                 slowmode_delay=1,
                 reason="gpt-bot",
                 auto_archive_duration=60,
             )
+            admission.track(thread, self.bot.user.id)
+            sessions.put(
+                ChatSession(
+                    discord_thread_id=thread.id,
+                    openai_thread_id=thread_id,
+                    assistant_id=None if assistant_id == "Not selected" else assistant_id,
+                    owner_id=user.id,
+                )
+            )
 
             if assistant_id != "Not selected":
                 return
 
             # Show assistants as a select menu
-            view = SelectView(thread=thread)
-            assistants = await search_assistants(search=search)
-            for assistant in assistants:
-                view.selectMenu.add_option(
-                    label=assistant.name if assistant.name is not None else "Unknown",
-                    value=assistant.id,
-                    description=assistant.description[0:min([100,
-                            len(assistant.description)])] if assistant.description is not None else "No description",
-                )
-            await thread.send("Select your assistant", view=view)
+            await assistant_catalog.ensure_loaded()
+            assistant_ids = [assistant.id for assistant in assistant_catalog.suggest(search)]
+            if not assistant_ids:
+                await thread.send("No assistant found")
+                return
+            await thread.send("Select your assistant", view=SelectView(thread=thread, assistant_ids=assistant_ids))
 
         except Exception as e:
             logger.exception(e)
-            await int.response.send_message(f"Failed to start chat {str(e)}", ephemeral=True)
+            if int.response.is_done():
+                await int.followup.send(f"Failed to start chat {str(e)}", ephemeral=True)
+            else:
+                await int.response.send_message(f"Failed to start chat {str(e)}", ephemeral=True)
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        admission.track_guilds(self.bot.guilds, self.bot.user.id)
+
+    @commands.Cog.listener()
+    async def on_thread_create(self, thread: discord.Thread):
+        admission.track(thread, self.bot.user.id)
+
+    @commands.Cog.listener()
+    async def on_thread_update(self, before: discord.Thread, after: discord.Thread):
+        # archived, unarchived, locked or renamed
+        admission.track(after, self.bot.user.id)
+
+    @commands.Cog.listener()
+    async def on_thread_join(self, thread: discord.Thread):
+        # unarchived threads that were not cached are reported as joined instead of updated
+        admission.track(thread, self.bot.user.id)
+
+    @commands.Cog.listener()
+    async def on_raw_thread_delete(self, payload: discord.RawThreadDeleteEvent):
+        admission.forget(payload.thread_id)
 
     @commands.Cog.listener()
     async def on_message(self, message: DiscordMessage):
         try:
-            # block servers not in allow list
-            if should_block(guild=message.guild):
+            # ignore everything but active chat threads of the bot, mostly with a single set lookup
+            if not admission.admit(message, self.bot.user.id):
                 return
 
             # ignore messages from the bot
             if message.author == self.bot.user:
                 return
 
-            # ignore messages not in a thread
-            channel = message.channel
-            if not isinstance(channel, discord.Thread):
-                return
-
-            # ignore threads not created by the bot
-            thread = channel
-            if thread.owner_id != self.bot.user.id:
-                return
+            # the conversation actor of the thread merges bursts of messages into one turn
+            self.conversations.post(message)
+        except Exception as e:
+            logger.exception(e)
 
-            # ignore threads that are archived locked or title is not what we want
-            if (
-                thread.archived
-                or thread.locked
-                or not thread.name.startswith(ACTIVATE_CHAT_THREAD_PREFIX)
-            ):
-                # ignore this thread
-                return
+    async def supersede(self, thread: discord.Thread) -> None:
+        """Cancel the run in progress in the thread, its messages are answered with the next turn"""
+        # by the discord thread, the OpenAI thread of a first turn only exists once its run does
+        await run_supervisor.supersede(thread.id)
 
-            # TODO: add later
-            # # wait a bit in case user has more messages
-            # if SECONDS_DELAY_RECEIVING_MSG > 0:
-            #     await asyncio.sleep(SECONDS_DELAY_RECEIVING_MSG)
-            #     if is_last_message_stale(
-            #         interaction_message=message,
-            #         last_message=thread.last_message,
-            #         bot_id=client.user.id,
-            #     ):
-            #         # there is another message, so ignore this one
-            #         return
-
-            logger.info(
-                f"Thread message to process - {message.author}: {message.content[:50]} - {thread.name} {thread.jump_url}"
-            )
+    async def respond(self, thread: discord.Thread, messages: list[DiscordMessage]) -> None:
+        """Generate one response to the messages received in the thread since the last response"""
+        try:
+            for message in messages:
+                logger.info(
+                    f"Thread message to process - {message.author}: {message.content[:50]} - {thread.name} {thread.jump_url}"
+                )
 
-            # Handle the message in the thread
+            # Handle the messages in the thread
             async with thread.typing():
-                # get field of embed in the first message of thread
-                first_message = await thread.parent.fetch_message(thread.id)
-                openai_thread_id = first_message.embeds[0].fields[0].value
-                openai_assistant_id = first_message.embeds[0].fields[1].value
+                session = sessions.get(thread.id)
+                if session is None:
+                    session = await load_session_from_starter_message(thread)
+                sessions.touch(thread.id)
+                openai_thread_id = session.openai_thread_id
+                openai_assistant_id = session.assistant_id
+                if openai_assistant_id is not None:
+                    assistant_catalog.mark_used(openai_assistant_id)
                 # TODO: appropriate error handling
-                if openai_assistant_id == "Not selected":
+                if openai_assistant_id is None:
                     await thread.send(
                         embed=discord.Embed(
                             description=f"**Invalid response** - assistant not selected",
@@ -170,76 +192,109 @@ class Chat(commands.Cog):
                         )
                     )
                     return
-                                
-                # Add the files to the thread when message has attachments
-                # TODO: Error handling when len(message.attachments) > 10 or size > 512MB
-                image_ids = list()
-                attachments = None
-                if message.attachments:
-                    image_ids = list()
-                    attachments = list()
-                    for attachment in message.attachments:
-                        # Handle the attachment
-                        # For Image files
-                        if os.path.splitext(attachment.filename)[1] in IMAGE_FILE_EXTENSION:
-                            pseudo_file = ( 
-                                attachment.filename, 
-                                await attachment.read(), 
-                                attachment.content_type
-                            )
-                            image_id = await upload_file(file=pseudo_file, purpose="vision")
-                            image_ids.append(image_id)
-                        
-                        # For Tools
-                        if (os.path.splitext(attachment.filename)[1] in FILE_SEARCH_EXTENSION 
-                            or os.path.splitext(attachment.filename)[1] in CODE_INTERPRETER_EXTENSION):
-                            pseudo_file = ( 
-                                attachment.filename, 
-                                await attachment.read(), 
-                                attachment.content_type
-                            )
-                            file_id = await upload_file(file=pseudo_file)
-                            attachment_obj = {
-                                "file_id": file_id,
-                                "tools": [],
-                            }
-                            if os.path.splitext(attachment.filename)[1] in FILE_SEARCH_EXTENSION:
-                                attachment_obj["tools"].append({"type": "file_search"})
-                            if os.path.splitext(attachment.filename)[1] in CODE_INTERPRETER_EXTENSION:
-                                attachment_obj["tools"].append({"type": "code_interpreter"})
-                            attachments.append(attachment_obj)
+
+                # Upload the attachments of the messages, all at once
+                ingested = await ingestion.ingest(
+                    [attachment for message in messages for attachment in message.attachments]
+                )
+                if ingested.rejected:
+                    await thread.send(
+                        embed=discord.Embed(
+                            description="**Skipped attachments**\n" + "\n".join(ingested.rejected),
+                            color=discord.Color.yellow(),
+                        )
+                    )
+
+                # Stream the reply into a placeholder message while the run is in progress
+                streamed = None
+                if STREAM_RESPONSES:
+                    streamed = StreamingReply(thread)
+                    await streamed.start()
 
                 # Generate the response
                 response_data = await generate_response(
                     thread_id=openai_thread_id,
                     assistant_id=openai_assistant_id,
-                    new_message=MessageCreate.from_discord_message(
+                    new_message=MessageCreate.from_discord_messages(
                         thread_id=openai_thread_id,
-                        author_name=message.author.display_name,
-                        message=message.content,
-                        image_ids=image_ids,
-                        attachments=attachments,
+                        messages=[(message.author.display_name, message.content) for message in messages],
+                        image_ids=ingested.image_ids,
+                        attachments=ingested.attachments,
                     ),
+                    on_text_delta=streamed.on_text_delta if streamed else None,
+                    discord_thread_id=thread.id,
                 )
 
-            if is_last_message_stale(
-                interaction_message=message,
-                last_message=thread.last_message,
-                bot_id=self.bot.user.id,
-            ):
-                # there is another message and its not from us, so ignore this response
-                return
+            # The openai thread was created with the run of the first turn
+            created_thread = openai_thread_id is None and response_data.thread_id is not None
+            if created_thread:
+                sessions.update(thread.id, openai_thread_id=response_data.thread_id)
 
             # send response
-            await process_response(thread=thread, response_data=response_data)
+            await process_response(thread=thread, response_data=response_data, streamed=streamed)
+            if created_thread:
+                await store_thread_id_in_starter_message(thread, response_data.thread_id)
         except Exception as e:
             logger.exception(e)
 
 
+async def store_thread_id_in_starter_message(thread: discord.Thread, openai_thread_id: str) -> None:
+    """Show the openai thread created with the first run in the starter embed, the fallback of the session store"""
+    try:
+        starter_message = await thread.parent.fetch_message(thread.id)
+        embed = starter_message.embeds[0]
+        embed.set_field_at(0, name="thread_id", value=openai_thread_id)
+        await starter_message.edit(embed=embed)
+    except discord.HTTPException as e:
+        logger.warning(f"Failed to store thread id {openai_thread_id} in the starter message of {thread.id}: {e}")
+
+
+async def load_session_from_starter_message(thread: discord.Thread) -> ChatSession:
+    """Recover the session of a thread created before the session store from the starter embed"""
+    first_message = await thread.parent.fetch_message(thread.id)
+    fields = first_message.embeds[0].fields
+    openai_thread_id = fields[0].value
+    assistant_id = fields[1].value
+    session = ChatSession(
+        discord_thread_id=thread.id,
+        openai_thread_id=None if openai_thread_id == "Not created" else openai_thread_id,
+        assistant_id=None if assistant_id == "Not selected" else assistant_id,
+        owner_id=first_message.interaction.user.id if first_message.interaction else None,
+        created_at=thread.created_at.timestamp() if thread.created_at else time.time(),
+    )
+    sessions.put(session)
+    return session
+
+
 class SelectView(View):
-    def __init__(self, *, thread: discord.Thread = None):
+    """Select menu of the assistants for a new chat, paged with the Previous and Next buttons"""
+
+    def __init__(self, *, thread: discord.Thread = None, assistant_ids: list[str] | None = None):
         super().__init__()
         self.thread = thread
+        # the ranked assistants when the menu was created, the cursor is the position of the first option
+        self.assistant_ids = assistant_ids or []
+        self.cursor = 0
+        self.next_cursor = 0
+        self.previous_cursors: list[int] = []
+        self.show_page()
+
+    def show_page(self) -> None:
+        self.selectMenu.options = []
+        position = self.cursor
+        while position < len(self.assistant_ids) and len(self.selectMenu.options) < MAX_ASSISTANT_LIST:
+            assistant = assistant_catalog.assistants.get(self.assistant_ids[position])
+            position += 1
+            if assistant is None:  # deleted since the menu was created
+                continue
+            self.selectMenu.add_option(
+                label=assistant.name[:100] if assistant.name is not None else "Unknown",
+                value=assistant.id,
+                description=assistant.description[:100] if assistant.description is not None else "No description",
+            )
+        self.next_cursor = position
+        self.previous.disabled = not self.previous_cursors
+        self.next.disabled = position >= len(self.assistant_ids)
 
     @discord.ui.select(cls=Select, placeholder="Not selected")
     async def selectMenu(self, int: discord.Interaction, select: Select):
@@ -250,7 +305,14 @@ class SelectView(View):
                 break
 
         select.disabled = True
+        self.previous.disabled = True
+        self.next.disabled = True
         await int.response.edit_message(view=self)
+        assistant_catalog.mark_used(selected)
+
+        if sessions.update(self.thread.id, assistant_id=selected) is None:
+            await load_session_from_starter_message(self.thread)
+            sessions.update(self.thread.id, assistant_id=selected)
 
         # modify the starter embed in the thread
         starter_message = await self.thread.parent.fetch_message(self.thread.id)
@@ -260,6 +322,19 @@ class SelectView(View):
         embed.set_field_at(-1, name="name", value=assistant.name)
         await starter_message.edit(embed=embed)
 
+    @discord.ui.button(label="Previous", style=discord.ButtonStyle.secondary)
+    async def previous(self, int: discord.Interaction, button: discord.ui.Button):
+        self.cursor = self.previous_cursors.pop()
+        self.show_page()
+        await int.response.edit_message(view=self)
+
+    @discord.ui.button(label="Next", style=discord.ButtonStyle.secondary)
+    async def next(self, int: discord.Interaction, button: discord.ui.Button):
+        self.previous_cursors.append(self.cursor)
+        self.cursor = self.next_cursor
+        self.show_page()
+        await int.response.edit_message(view=self)
+
 class FunctionSelectView(View):
     def __init__(self, *, thread: discord.Thread = None):
         super().__init__()
@@ -285,14 +360,24 @@ class FunctionSelectView(View):
         self.stop()
 
 # TODO: remove unused args
-async def process_response(thread: discord.Thread, response_data: ResponseData) -> None:
+async def process_response(
+    thread: discord.Thread, response_data: ResponseData, streamed: StreamingReply | None = None
+) -> None:
     status = response_data.status
     message = response_data.message
     status_text = response_data.status_text
 
+    if status is ResponseStatus.SUPERSEDED:
+        # the newer messages are answered by the next turn
+        if streamed:
+            await streamed.discard()
+        return
+
     if status is ResponseStatus.OK:
         sent_message = None
         if not message:
+            if streamed:
+                await streamed.discard()
             sent_message = await thread.send(
                 embed=discord.Embed(
                     description=f"**Invalid response** - empty response",
@@ -301,17 +386,23 @@ async def process_response(thread: discord.Thread, response_data: ResponseData)
             )
         else:
             messages_rendered = await message.render()
-            for message_rendered in messages_rendered:
-                shorter_response = split_into_shorter_messages(message_rendered.content)
-                for i, response in enumerate(shorter_response):
-                    # Send attachments with last message
-                    if i == len(shorter_response) - 1:
-                        message_rendered.content = response
-                        sent_message = await thread.send(**message_rendered.asdict())
-                    else:
-                        sent_message = await thread.send(response)
+            text = "\n".join(rendered.content for rendered in messages_rendered if rendered.content)
+            files = [file for rendered in messages_rendered for file in rendered.files or []]
+            sent_message = await reply_sender.send(thread, text, files, streamed)
+
+    elif status is ResponseStatus.TIMEOUT:
+        if streamed and not streamed.text:
+            await streamed.discard()
+        await thread.send(
+            embed=discord.Embed(
+                description=f"**Timed out** - {status_text}",
+                color=discord.Color.orange(),
+            )
+        )
 
     else:
+        if streamed and not streamed.text:
+            await streamed.discard()
         await thread.send(
             embed=discord.Embed(
                 description=f"**Error** - {status_text}",
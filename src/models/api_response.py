@@ -16,6 +16,8 @@ client = AsyncOpenAI()
 class ResponseStatus(Enum):
     OK = 0
     ERROR = 1
+    TIMEOUT = 2
+    SUPERSEDED = 3  # cancelled because a newer user message arrived
 
 
 @dataclass
@@ -23,3 +25,4 @@ class ResponseData:
     status: ResponseStatus
     message: Message | None
     status_text: str | None
+    thread_id: str | None = None  # the OpenAI thread of the run, set when it was created with the run
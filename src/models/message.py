@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import asyncio
+import bisect
 import logging
 from dataclasses import asdict, dataclass
 from typing import Any, List, Optional, Dict, TypedDict, Literal
@@ -14,7 +16,6 @@ from discord import (
 
 from src.openai_api.files import get_image_file
 
-from io import BytesIO
 import re
 
 # from openai.types.beta.threads.text_content_block_param import TextContentBlockParam
@@ -23,6 +24,63 @@ import re
 
 logger = logging.getLogger(__name__)
 
+# The characters a formula may contain, anything else means the brackets are not math
+_FORMULA_CHARS = r"[\w\s\^_.,=+\-*/{}\[\]()<>!&#:;\|'\\]"
+# \[display\] and \(inline\) formulas in one scan, starting with a backslash to find them fast
+_FORMULA_RE = re.compile(
+    r"\\(?:\[(?P<display>" + _FORMULA_CHARS + r"+?)\\\]|\((?P<inline>" + _FORMULA_CHARS + r"+?)\\\))",
+    re.DOTALL,
+)
+
+
+def _code_spans(text: str) -> tuple[list[int], list[int]]:
+    """The starts and ends of the code blocks, unterminated ones run to the end, and of inline code"""
+    starts, ends = [], []
+    start = text.find("`")
+    while start != -1:
+        if text.startswith("```", start):
+            end = text.find("```", start + 3)
+            end = len(text) if end == -1 else end + 3
+        else:
+            end = text.find("`", start + 1)
+            if end == -1 or text.find("\n", start, end) != -1:
+                # a lone backtick, inline code does not span lines
+                start = end
+                continue
+            end += 1
+        starts.append(start)
+        ends.append(end)
+        start = text.find("`", end)
+    return starts, ends
+
+
+def _rewrite_formula(match: re.Match) -> str:
+    display, inline = match.groups()
+    formula = display if display is not None else inline
+    formula = formula.replace("\n", "").replace("\t", "").replace("\\\\", "\\\\\\\\")
+    return f"$${formula}$$" if display is not None else f"${formula}$"
+
+
+def rewrite_formulas(text: str) -> str:
+    """Rewrite the LaTeX formulas of the text to the $$display$$ and $inline$ form, outside of code"""
+    # most replies have no backslash at all, which is found faster than "\\(" or "\\["
+    if "\\" not in text:
+        return text
+    if "`" not in text:
+        return _FORMULA_RE.sub(_rewrite_formula, text)
+
+    # a formula has no backticks, so it is either inside a code span or outside of all of them
+    code_starts, code_ends = _code_spans(text)
+
+    def rewrite_outside_of_code(match: re.Match) -> str:
+        i = bisect.bisect_right(code_starts, match.start()) - 1
+        if i >= 0 and match.start() < code_ends[i]:
+            return match.group()
+        return _rewrite_formula(match)
+
+    return _FORMULA_RE.sub(rewrite_outside_of_code, text)
+
+
 @dataclass
 class DiscordMessage:
     content: Optional[str] = None
@@ -41,7 +99,7 @@ class DiscordMessage:
 
 @dataclass
 class MessageCreate:
-    thread_id: str
+    thread_id: str | None  # None if the OpenAI thread is created with the run
     content: str | List[dict[str, ContentText|str] | dict[str, ContentImageFile|str]]
     role: str = "user"
     attachments: list[dict[str, str|list[dict[str, str]]]] | None = None
@@ -49,10 +107,19 @@ class MessageCreate:
 
     @classmethod
     def from_discord_message(
-        self, thread_id: str, author_name: str, message: str, image_ids: list[str], attachments: list[dict[str, str|list[dict[str, str]]]] | None = None
+        self, thread_id: str | None, author_name: str, message: str, image_ids: list[str], attachments: list[dict[str, str|list[dict[str, str]]]] | None = None
     ) -> MessageCreate:
         """Create an instance from the discord message"""
-        message = f"{author_name}: {message}"
+        return self.from_discord_messages(
+            thread_id=thread_id, messages=[(author_name, message)], image_ids=image_ids, attachments=attachments
+        )
+
+    @classmethod
+    def from_discord_messages(
+        self, thread_id: str | None, messages: list[tuple[str, str]], image_ids: list[str], attachments: list[dict[str, str|list[dict[str, str]]]] | None = None
+    ) -> MessageCreate:
+        """Create one instance from several discord messages, given as (author_name, message) pairs"""
+        message = "\n".join(f"{author_name}: {text}" for author_name, text in messages)
         content = [
             {
                 "image_file" : 
@@ -75,6 +142,12 @@ class MessageCreate:
         print("[Deb]->MessageCreate: ", dict)
         return asdict(self, dict_factory=lambda x: {k: v for (k, v) in x if v is not None})
 
+    def input_to_additional_message(self) -> dict[str, str]:
+        """Convert the MessageCreate object to dict for the additional_messages of a run create"""
+        data = asdict(self, dict_factory=lambda x: {k: v for (k, v) in x if v is not None})
+        data.pop("thread_id", None)
+        return data
+
 
 @dataclass
 class Message:
@@ -127,18 +200,21 @@ class Message:
         # the list of DiscordMessage object to return
         rendered = []
 
-        # Render the content based on the type
-        for content in self.content:
+        # Render all the contents at once, so that their files are downloaded concurrently
+        contents = [content for content in self.content if type(content) in (ContentText, ContentImageFile)]
+        renders = await asyncio.gather(*(content.render() for content in contents))
+
+        # Assemble them based on the type
+        for content, render in zip(contents, renders):
             # Text content
             if type(content) == ContentText:
-                rendered += await content.render()
+                rendered += render
             # Image content
             elif type(content) == ContentImageFile:
                 if rendered:
-                    message = await content.render()
-                    rendered[-1].files += message.files
+                    rendered[-1].files = (rendered[-1].files or []) + render.files
                 else:
-                    rendered.append(await content.render())
+                    rendered.append(render)
         print("[Deb]->rendered message: ", str(rendered))
         return rendered
 
@@ -146,11 +222,14 @@ class Message:
 class ContentText:
     value: str | None = None
     annotations: list[AnnotationFilePath] | None = None
+    citations: list[Citation] | None = None  # the files the footnote markers of the value refer to
 
     @classmethod
     def from_api_output(cls, api_output: dict[str, Any]) -> ContentText:
         annotations_dct = api_output.pop("annotations")
         annotations = None
+        citations = None
+        value = api_output["value"]
         if annotations_dct is not None:
             annotations = []
             for annotation in annotations_dct:
@@ -159,10 +238,11 @@ class ContentText:
                         AnnotationFilePath.from_api_output(annotation)
                     )
                     print("[Deb]->annotations: ", annotations)
-                else:
+                elif annotation["type"] != "file_citation":
                     # TODO: handle another annotation type
                     logger.warning(f"Unknown annotation type: {annotation['type']}")
-        return cls(value=api_output["value"], annotations=annotations)
+            value, citations = rewrite_annotations(value, annotations_dct)
+        return cls(value=value, annotations=annotations, citations=citations or None)
 
     async def render(self) -> list[DiscordMessage]:
         """Render the ContentText object to list of DiscordMessage Object"""
@@ -172,22 +252,12 @@ class ContentText:
         # Get the text        
         processing_text = self.value
         
-        # Replace display formulas
-        display_pattern = r'\\\[([\w\s\^_.,=+\-*/{}\[\]()<>!&#:;\|\'\\]+?)\\\]'
-        processing_text = re.sub(
-            display_pattern, 
-            lambda match: 
-                '$$' + match.group(1).replace('\n', '').replace('\t', '').replace('\\\\', '\\\\\\\\') 
-                + '$$', processing_text, flags=re.DOTALL
-        )
-        
-        # Replace inline formulas
-        inline_pattern = r'\\\(([\w\s\^_.,=+\-*/{}\[\]()<>!&#:;\|\'\\]+?)\\\)'
-        processing_text = re.sub(
-            inline_pattern, 
-            lambda match: '$' + match.group(1).replace('\n', '').replace('\t', '').replace('\\\\', '\\\\\\\\') 
-            + '$', processing_text, flags=re.DOTALL
-        )
+        # Rewrite the formulas
+        processing_text = rewrite_formulas(processing_text)
+
+        # Add the sources of the footnote markers
+        if self.citations:
+            processing_text += "\n-# Sources: " + ", ".join(citation.render() for citation in self.citations)
 
         # Create the discord message fpr the processing text
         discord_message = DiscordMessage(
@@ -197,15 +267,64 @@ class ContentText:
 
         # Render the annotations
         if self.annotations is not None:
-            for annotation in reversed(self.annotations):
-                message = await annotation.render()
-                rendered.append(message)
+            rendered += await asyncio.gather(
+                *(annotation.render() for annotation in reversed(self.annotations))
+            )
 
         print(f'[Deb]->len(text.rendered): {len(rendered)}')
 
         return rendered
 
 
+@dataclass
+class Citation:
+    number: int  # of the footnote marker, e.g. [1]
+    file_id: str
+    filename: str | None = None  # resolved after the message is received
+
+    def render(self) -> str:
+        return f"[{self.number}] {self.filename or self.file_id}"
+
+
+def _annotation_span(value: str, annotation: dict[str, Any], position: int) -> tuple[int, int] | None:
+    """The span of the annotation in the value, found after position if its indices do not match the text"""
+    text = annotation.get("text") or ""
+    start, end = annotation.get("start_index"), annotation.get("end_index")
+    if start is not None and end is not None and position <= start <= end <= len(value) and value[start:end] == text:
+        return start, end
+    start = value.find(text, position) if text else -1
+    return (start, start + len(text)) if start != -1 else None
+
+
+def rewrite_annotations(value: str, annotations: list[dict[str, Any]]) -> tuple[str, list[Citation]]:
+    """Rewrite the annotated spans of the text in one pass, and the citations of its footnote markers.
+
+    A file citation, like 【4:0†source】, becomes a footnote marker like [1], one number per cited
+    file. Other annotations, like the sandbox path of a file the reply links to, are removed, as
+    the files are attached to the reply.
+    """
+    pieces = []
+    citations: dict[str, Citation] = {}
+    position = 0
+    last_marker = None  # (end of its span, number), the same marker is not repeated right after itself
+    for annotation in sorted(annotations, key=lambda annotation: annotation.get("start_index") or 0):
+        span = _annotation_span(value, annotation, position)
+        if span is None:
+            continue
+        pieces.append(value[position:span[0]])
+        if annotation["type"] == "file_citation":
+            file_id = annotation["file_citation"]["file_id"]
+            citation = citations.get(file_id)
+            if citation is None:
+                citation = citations[file_id] = Citation(number=len(citations) + 1, file_id=file_id)
+            if last_marker != (span[0], citation.number):
+                pieces.append(f"[{citation.number}]")
+            last_marker = (span[1], citation.number)
+        position = span[1]
+    pieces.append(value[position:])
+    return "".join(pieces), list(citations.values())
+
+
 @dataclass
 class AnnotationFilePath:
     type: str | None = None
@@ -223,7 +342,7 @@ class AnnotationFilePath:
         image_file = await get_image_file(self.file_path['file_id'])
         message = DiscordMessage(
             content=f"",
-            files=[File(fp=BytesIO(image_file), filename="output_image.png")],
+            files=[File(fp=image_file, filename="output_image.png")],
         )
         return message
 
@@ -238,9 +357,8 @@ class ContentImageFile:
 
     async def render(self) -> DiscordMessage:
         """Render the ContentImageFile object to DiscordMessage object"""
-        image_bytes = await get_image_file(self.file_id)
-        pseudo_file = BytesIO(image_bytes)
-        discord_file = File(fp=pseudo_file, filename="output_image.png")
+        image_file = await get_image_file(self.file_id)
+        discord_file = File(fp=image_file, filename="output_image.png")
         rendered = DiscordMessage(
             content="",
             files=[discord_file],
@@ -0,0 +1,198 @@
+from __future__ import annotations
+
+import asyncio
+import copy
+import heapq
+import logging
+import time
+
+from openai import AsyncOpenAI
+
+from src.constants import ASSISTANT_CATALOG_PAGE_SIZE, ASSISTANT_CATALOG_TTL_SECONDS
+from src.models.assistant import Assistant
+from src.openai_api.assistant_search import AssistantIndex
+
+logger = logging.getLogger(__name__)
+client = AsyncOpenAI()
+
+# Score added to an assistant used just now in suggestions, halved every RECENT_USE_HALF_LIFE seconds
+RECENT_USE_BOOST = 3.0
+RECENT_USE_HALF_LIFE = 24 * 60 * 60
+
+
+class AssistantCatalog:
+    """Every assistant of the organization, held in memory.
+
+    The catalog is loaded on first use and refreshed in the background every ttl seconds.
+    Assistants only change through our own commands, which write through to the catalog
+    (see src/openai_api/assistants.py), so lookups do not need the API in the common case.
+    """
+
+    def __init__(
+        self,
+        client: AsyncOpenAI = client,
+        ttl: float = ASSISTANT_CATALOG_TTL_SECONDS,
+        page_size: int = ASSISTANT_CATALOG_PAGE_SIZE,
+    ):
+        self.client = client
+        self.ttl = ttl
+        self.page_size = page_size
+        self.assistants: dict[str, Assistant] = {}
+        self.index = AssistantIndex()
+        self.last_used: dict[str, float] = {}  # assistant id -> time of the last chat with it
+        self.loaded_at: float | None = None
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        # writes made while a refresh is listing the assistants, applied on top of its result
+        self._pending: dict[str, Assistant | None] | None = None
+        self._lock: asyncio.Lock | None = None
+        self._task: asyncio.Task | None = None
+        self._preload_task: asyncio.Task | None = None
+
+    async def get(self, id: str) -> Assistant:
+        """Get an assistant. If the assistant is not found, raise openai.NotFoundError.
+
+        A copy is returned, so the caller can change it before passing it to update_assistant.
+        """
+        await self.ensure_loaded()
+        assistant = self.assistants.get(id)
+        if assistant is not None:
+            self.hits += 1
+        else:
+            # created by someone else since the last refresh
+            self.misses += 1
+            response = await self.client.beta.assistants.retrieve(assistant_id=id)
+            assistant = Assistant.from_api_output(response)
+            self.put(assistant)
+        return copy.deepcopy(assistant)
+
+    async def list(self) -> list[Assistant]:
+        """All assistants, newest first. The assistants are shared, do not change them."""
+        await self.ensure_loaded()
+        return sorted(self.assistants.values(), key=lambda a: a.created_at or 0, reverse=True)
+
+    async def search(self, query: str, limit: int | None = None) -> list[Assistant]:
+        """The assistants matching the query, best match first. Do not change them."""
+        await self.ensure_loaded()
+        return [self.assistants[id] for id in self.index.search(query, limit)]
+
+    @property
+    def loaded(self) -> bool:
+        return self.loaded_at is not None
+
+    def preload(self) -> None:
+        """Load the catalog in the background"""
+        if self._preload_task is None or self._preload_task.done():
+            self._preload_task = asyncio.get_running_loop().create_task(self._preload())
+
+    async def _preload(self) -> None:
+        try:
+            await self.ensure_loaded()
+        except Exception as e:
+            logger.exception(e)
+
+    def mark_used(self, id: str) -> None:
+        self.last_used[id] = time.time()
+
+    def recency(self, id: str) -> float:
+        last_used = self.last_used.get(id)
+        if last_used is None:
+            return 0.0
+        return RECENT_USE_BOOST * 0.5 ** ((time.time() - last_used) / RECENT_USE_HALF_LIFE)
+
+    def suggest(self, query: str, limit: int | None = None) -> list[Assistant]:
+        """The assistants matching the query ranked by match and recent use, without calling the API.
+
+        Recently used assistants come first for an empty query. Empty if the catalog is not loaded.
+        """
+        if query.strip() == "":
+            key = lambda a: (self.recency(a.id), a.created_at or 0)
+            if limit is None:
+                return sorted(self.assistants.values(), key=key, reverse=True)
+            return heapq.nlargest(limit, self.assistants.values(), key=key)
+        boost = {id: self.recency(id) for id in self.last_used}
+        return [self.assistants[id] for id in self.index.search(query, limit, boost=boost)]
+
+    def put(self, assistant: Assistant) -> None:
+        self.assistants[assistant.id] = assistant
+        self.index.add(assistant)
+        if self._pending is not None:
+            self._pending[assistant.id] = assistant
+
+    def remove(self, id: str) -> None:
+        self.assistants.pop(id, None)
+        self.last_used.pop(id, None)
+        self.index.remove(id)
+        if self._pending is not None:
+            self._pending[id] = None
+
+    async def ensure_loaded(self) -> None:
+        if self.loaded_at is None:
+            if self._lock is None:
+                self._lock = asyncio.Lock()
+            async with self._lock:
+                if self.loaded_at is None:
+                    await self.refresh()
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._refresh_loop())
+
+    async def refresh(self) -> None:
+        """Reload every assistant with the paginated list API"""
+        self._pending = {}
+        try:
+            assistants = {}
+            after = None
+            while True:
+                kwargs = {"limit": self.page_size, "order": "desc"}
+                if after is not None:
+                    kwargs["after"] = after
+                page = await self.client.beta.assistants.list(**kwargs)
+                for data in page.data:
+                    assistant = Assistant.from_api_output(data)
+                    assistants[assistant.id] = assistant
+                if len(page.data) < self.page_size:
+                    break
+                after = page.data[-1].id
+            for id, assistant in self._pending.items():
+                if assistant is None:
+                    assistants.pop(id, None)
+                else:
+                    assistants[id] = assistant
+        finally:
+            self._pending = None
+        # only reindex what changed since the last refresh
+        for id in self.assistants.keys() - assistants.keys():
+            self.index.remove(id)
+        for i, (id, assistant) in enumerate(assistants.items()):
+            if self.assistants.get(id) != assistant:
+                self.index.add(assistant)
+            if i % 500 == 499:
+                await asyncio.sleep(0)  # do not block the event loop when indexing a large catalog
+        self.assistants = assistants
+        self.loaded_at = time.monotonic()
+        self.refreshes += 1
+        logger.info(f"Loaded {len(assistants)} assistants")
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.ttl)
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.exception(e)
+
+    def stats(self) -> dict[str, int | float]:
+        lookups = self.hits + self.misses
+        return {
+            "assistants": len(self.assistants),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0,
+            "refreshes": self.refreshes,
+            # seconds since the last full refresh
+            "staleness": round(time.monotonic() - self.loaded_at) if self.loaded_at is not None else -1,
+        }
+
+
+assistant_catalog = AssistantCatalog()
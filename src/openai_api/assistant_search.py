@@ -0,0 +1,193 @@
+from __future__ import annotations
+
+import bisect
+import re
+from collections import defaultdict
+from dataclasses import dataclass
+from itertools import compress, islice
+from operator import attrgetter, itemgetter
+
+from src.models.assistant import Assistant
+
+# Words are runs of letters and digits. CJK text has no spaces, so substrings are found
+# with the n-gram index instead.
+_WORD_RE = re.compile(r"\w+")
+# The instructions are long, only their words are indexed
+NGRAM_FIELDS = ("name", "description")
+# Substrings up to this length are indexed, so short terms are answered from one posting list
+NGRAM_MAX = 3
+
+# How much a match in each field counts
+FIELD_WEIGHTS = {"name": 3.0, "description": 2.0, "instructions": 1.0}
+EXACT_WORD = 2.0
+WORD_PREFIX = 1.0
+SUBSTRING = 0.5
+
+
+@dataclass
+class IndexedAssistant:
+    id: str
+    created_at: int
+    fields: dict[str, str]  # casefolded text of the searched fields
+
+
+def _trigrams(text: str) -> set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _ngrams(text: str) -> set[str]:
+    """The substrings of 1 to NGRAM_MAX characters of the text, without whitespace"""
+    return {
+        chunk[i:i + n]
+        for chunk in text.split()
+        for n in range(1, NGRAM_MAX + 1)
+        for i in range(len(chunk) - n + 1)
+    }
+
+
+class AssistantIndex:
+    """Inverted index over the name, description and instructions of the assistants.
+
+    Every query term matches assistants that contain a word starting with it (ranked higher
+    for a whole word), or that contain it anywhere in the name or description, found through
+    an index of their substrings of up to NGRAM_MAX characters. Matches in the name count more
+    than in the description, which count more than in the instructions. All terms of the query
+    have to match. Only the words of the instructions are indexed, a term in the middle of a
+    word of the instructions is not found.
+    """
+
+    def __init__(self):
+        self.assistants: dict[str, IndexedAssistant] = {}
+        self.words: dict[str, dict[str, float]] = {}  # word -> {assistant id: score of the whole word}
+        self.vocabulary: list[str] = []  # sorted words, for prefix lookups
+        # n-gram -> {assistant id: score as a substring}
+        self.ngrams: dict[str, dict[str, float]] = defaultdict(dict)
+        self.by_created_at: list[tuple[int, str]] = []  # (created_at, assistant id), oldest first
+
+    def __len__(self) -> int:
+        return len(self.assistants)
+
+    def add(self, assistant: Assistant) -> None:
+        """Index an assistant, replacing the previous version of it"""
+        self.remove(assistant.id)
+        indexed = IndexedAssistant(
+            id=assistant.id,
+            created_at=assistant.created_at or 0,
+            fields={name: (getattr(assistant, name) or "").casefold() for name in FIELD_WEIGHTS},
+        )
+        self.assistants[assistant.id] = indexed
+        bisect.insort(self.by_created_at, (indexed.created_at, assistant.id))
+        for name, text in indexed.fields.items():
+            for word in set(_WORD_RE.findall(text)):
+                postings = self.words.get(word)
+                if postings is None:
+                    postings = self.words[word] = {}
+                    bisect.insort(self.vocabulary, word)
+                postings[assistant.id] = postings.get(assistant.id, 0.0) + FIELD_WEIGHTS[name] * EXACT_WORD
+        for name in NGRAM_FIELDS:
+            for ngram in _ngrams(indexed.fields[name]):
+                postings = self.ngrams[ngram]
+                postings[assistant.id] = postings.get(assistant.id, 0.0) + FIELD_WEIGHTS[name] * SUBSTRING
+
+    def remove(self, id: str) -> None:
+        indexed = self.assistants.pop(id, None)
+        if indexed is None:
+            return
+        del self.by_created_at[bisect.bisect_left(self.by_created_at, (indexed.created_at, id))]
+        for text in indexed.fields.values():
+            for word in set(_WORD_RE.findall(text)):
+                postings = self.words.get(word)
+                if postings is None:
+                    continue
+                postings.pop(id, None)
+                if not postings:
+                    del self.words[word]
+                    del self.vocabulary[bisect.bisect_left(self.vocabulary, word)]
+        for name in NGRAM_FIELDS:
+            for ngram in _ngrams(indexed.fields[name]):
+                postings = self.ngrams.get(ngram)
+                if postings is not None:
+                    postings.pop(id, None)
+                    if not postings:
+                        del self.ngrams[ngram]
+
+    def search(
+        self, query: str, limit: int | None = None, boost: dict[str, float] | None = None
+    ) -> list[str]:
+        """The ids of the assistants matching every term of the query, best match first.
+
+        boost[id] is added to the score of the match, e.g. to rank recently used assistants higher.
+        """
+        terms = _WORD_RE.findall(query.casefold()) or [query.casefold()]
+        scores: dict[str, float] | None = None
+        for term in terms:
+            term_scores = self._match(term)
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {id: score + term_scores[id] for id, score in scores.items() if id in term_scores}
+            if not scores:
+                return []
+        if boost:
+            for id in boost.keys() & scores.keys():
+                scores[id] += boost[id]
+        if limit is None or len(scores) <= limit:
+            return self._sorted(scores)
+        return self._top(scores, limit)
+
+    def _sorted(self, scores: dict[str, float]) -> list[str]:
+        """The ids by score, the newest assistant first among equal scores"""
+        created_at = map(attrgetter("created_at"), map(self.assistants.__getitem__, scores))
+        return [id for _, _, id in sorted(zip(scores.values(), created_at, scores), reverse=True)]
+
+    def _top(self, scores: dict[str, float], limit: int) -> list[str]:
+        """The first limit ids of _sorted(scores).
+
+        Common terms match most assistants with a handful of distinct scores. Instead of sorting
+        every match, the few above the cutoff score are sorted and the matches tied at the cutoff
+        are taken newest first from by_created_at.
+        """
+        ranked = sorted(scores.values(), reverse=True)
+        cutoff = ranked[limit - 1]
+        above: list[str] = []
+        if ranked[0] > cutoff:
+            ids = compress(scores, map(cutoff.__lt__, scores.values()))
+            above = self._sorted({id: scores[id] for id in ids})
+        tied = set(compress(scores, map(cutoff.__eq__, scores.values())))
+        newest = map(itemgetter(1), reversed(self.by_created_at))
+        return above + list(islice(filter(tied.__contains__, newest), limit - len(above)))
+
+    def _match(self, term: str) -> dict[str, float]:
+        # words starting with the term, the term itself comes first. The postings hold the score
+        # of the whole word, so a common word is copied without a Python loop.
+        i = bisect.bisect_left(self.vocabulary, term)
+        scores: dict[str, float] = {}
+        if i < len(self.vocabulary) and self.vocabulary[i] == term:
+            scores = dict(self.words[term])
+            i += 1
+        factor = WORD_PREFIX / EXACT_WORD
+        while i < len(self.vocabulary) and self.vocabulary[i].startswith(term):
+            get = scores.get
+            for id, score in self.words[self.vocabulary[i]].items():
+                score *= factor
+                if score > get(id, 0.0):
+                    scores[id] = score
+            i += 1
+
+        # the term anywhere in the text, e.g. in the middle of a CJK sentence
+        if len(term) <= NGRAM_MAX:
+            # the posting list of a short term is exact
+            postings = self.ngrams.get(term, {})
+            for id in set(postings).difference(scores):
+                scores[id] = postings[id]
+            return scores
+        postings = sorted((self.ngrams.get(trigram, {}) for trigram in _trigrams(term)), key=len)
+        others = postings[1:]
+        for id in set(postings[0]).difference(scores):
+            if not all(id in other for other in others):
+                continue
+            fields = self.assistants[id].fields
+            weight = sum(FIELD_WEIGHTS[name] for name in NGRAM_FIELDS if term in fields[name])
+            if weight:
+                scores[id] = weight * SUBSTRING
+        return scores
@@ -5,6 +5,7 @@ import logging
 from openai import AsyncOpenAI
 
 from src.models.assistant import Assistant, AssistantCreate
+from src.openai_api.assistant_catalog import assistant_catalog
 
 logger = logging.getLogger(__name__)
 client = AsyncOpenAI()
@@ -12,10 +13,12 @@ client = AsyncOpenAI()
 
 async def create_assistant(cfg: AssistantCreate) -> Assistant:
     response = await client.beta.assistants.create(**cfg.input_to_api_create())
-    return Assistant.from_api_output(response)
+    assistant = Assistant.from_api_output(response)
+    assistant_catalog.put(assistant)
+    return assistant
 
 
-async def list_assistants(limit: int = "20", order: str = "desc",
+async def list_assistants(limit: int = 20, order: str = "desc",
         after: str = '') -> list[Assistant]:
     if after == '':
         response = await client.beta.assistants.list(limit=limit, order=order)
@@ -29,20 +32,22 @@ async def list_assistants(limit: int = "20", order: str = "desc",
 
 
 async def get_assistant(id: str) -> Assistant:
-    """Get an assistant. If the assistant is not found, raise openai.NotFoundError."""
-    response = await client.beta.assistants.retrieve(assistant_id=id)
-    return Assistant.from_api_output(response)
+    """Get an assistant from the catalog. If the assistant is not found, raise openai.NotFoundError."""
+    return await assistant_catalog.get(id)
 
 
 async def update_assistant(cfg: Assistant) -> Assistant:
     response = await client.beta.assistants.update(**cfg.input_to_api_update())
-    return Assistant.from_api_output(response)
+    assistant = Assistant.from_api_output(response)
+    assistant_catalog.put(assistant)
+    return assistant
 
 
 async def delete_assistant(id: str) -> None:
     """Delete an assistant. If the assistant is not found, raise openai.NotFoundError."""
     response = await client.beta.assistants.delete(assistant_id=id)
     if response.deleted:
+        assistant_catalog.remove(id)
         logger.info(f"Deleted assistant {response.id}")
         return
     else:
@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+# Returned by the caches on a miss, so that None can be cached as a value
+MISSING = object()
+
+
+class TTLCache:
+    """In-process LRU cache whose entries expire ttl seconds after they were set.
+
+    Thread-safe, because the blocking function tools use it from the thread pool.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[Any, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Any) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] < time.monotonic():
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return MISSING
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def set(self, key: Any, value: Any, ttl: float | None = None) -> None:
+        """Set the value, expiring after ttl seconds instead of the default ttl if given"""
+        with self._lock:
+            self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: Any) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+class SQLiteCache:
+    """Persistent key-value store in a SQLite table, with JSON values that expire after ttl seconds"""
+
+    def __init__(self, path: str, table: str, ttl: float):
+        self.table = table
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or row[1] < time.time():
+                self.misses += 1
+                return MISSING
+            self.hits += 1
+            return json.loads(row[0])
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), time.time() + self.ttl),
+            )
+
+    def delete(self, key: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+    def purge_expired(self) -> int:
+        with self._lock, self._conn:
+            return self._conn.execute(
+                f"DELETE FROM {self.table} WHERE expires_at < ?", (time.time(),)
+            ).rowcount
+
+
+class TwoLevelCache:
+    """A TTLCache in front of an optional SQLiteCache. Disk hits are promoted to memory."""
+
+    def __init__(self, name: str, memory: TTLCache, disk: SQLiteCache | None = None):
+        self.name = name
+        self.memory = memory
+        self.disk = disk
+
+    def get(self, key: str) -> Any:
+        value = self.memory.get(key)
+        if value is MISSING and self.disk is not None:
+            value = self.disk.get(key)
+            if value is not MISSING:
+                self.memory.set(key, value)
+        return value
+
+    def set(self, key: str, value: Any, ttl: float | None = None) -> None:
+        """Set the value in both levels. With a ttl, e.g. for a negative result, only in memory."""
+        self.memory.set(key, value, ttl=ttl)
+        if self.disk is not None and ttl is None:
+            self.disk.set(key, value)
+
+    def delete(self, key: str) -> None:
+        self.memory.delete(key)
+        if self.disk is not None:
+            self.disk.delete(key)
+
+    @property
+    def hits(self) -> int:
+        return self.memory.hits + (self.disk.hits if self.disk is not None else 0)
+
+    @property
+    def misses(self) -> int:
+        # a memory miss is only a real miss if the disk missed too
+        return self.disk.misses if self.disk is not None else self.memory.misses
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "memory_hits": self.memory.hits,
+            "disk_hits": self.disk.hits if self.disk is not None else 0,
+            "misses": self.misses,
+            "size": len(self.memory),
+        }
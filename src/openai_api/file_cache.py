@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import io
+import logging
+import os
+import sqlite3
+import time
+
+import openai
+from openai import AsyncOpenAI
+from openai._types import FileTypes
+
+from src.constants import FILE_CACHE_CHECK_SECONDS, FILE_CACHE_DB
+
+logger = logging.getLogger(__name__)
+client = AsyncOpenAI()
+
+HASH_CHUNK_BYTES = 1024 * 1024
+
+
+def _file_content(file: FileTypes):
+    """The content of a file given in any of the forms upload_file accepts"""
+    if isinstance(file, tuple):
+        return file[1]
+    return file
+
+
+def hash_file(file: FileTypes) -> tuple[str, int]:
+    """The sha256 and size of the file content, read in chunks for paths and file objects.
+
+    A file object is hashed from the start, wherever a previous upload left it, and rewound
+    for the upload.
+    """
+    content = _file_content(file)
+    digest = hashlib.sha256()
+    if isinstance(content, (bytes, bytearray, memoryview)):
+        digest.update(content)
+        return digest.hexdigest(), len(content)
+    if isinstance(content, (str, os.PathLike)):
+        with open(content, "rb") as f:
+            return _hash_stream(f, digest)
+    content.seek(0)
+    try:
+        return _hash_stream(content, digest)
+    finally:
+        content.seek(0)
+
+
+def _hash_stream(f: io.IOBase, digest) -> tuple[str, int]:
+    size = 0
+    while chunk := f.read(HASH_CHUNK_BYTES):
+        digest.update(chunk)
+        size += len(chunk)
+    return digest.hexdigest(), size
+
+
+class FileUploadCache:
+    """OpenAI file ids by sha256 of the content and purpose, kept in SQLite.
+
+    Uploading content that was uploaded before with the same purpose returns the existing
+    file id instead of sending the bytes again. A cached id is checked with files.retrieve,
+    at most every check_interval seconds, in case the file was deleted on the OpenAI side.
+    """
+
+    def __init__(
+        self,
+        client: AsyncOpenAI = client,
+        path: str = FILE_CACHE_DB,
+        check_interval: float = FILE_CACHE_CHECK_SECONDS,
+    ):
+        self.client = client
+        self.check_interval = check_interval
+        self.hits = 0
+        self.misses = 0
+        self.dead = 0
+        self.bytes_saved = 0
+        self._in_flight: dict[tuple[str, str], asyncio.Future] = {}
+        self._conn = sqlite3.connect(path)
+        with self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS file_uploads (
+                    sha256 TEXT NOT NULL,
+                    purpose TEXT NOT NULL,
+                    file_id TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    checked_at REAL NOT NULL,
+                    PRIMARY KEY (sha256, purpose)
+                )
+                """
+            )
+
+    async def upload(self, file: FileTypes, purpose: str = "assistants") -> str:
+        """Upload the file unless the same content was uploaded before, and return its file id"""
+        sha256, size = await asyncio.to_thread(hash_file, file)
+        key = (sha256, purpose)
+        # the same content uploaded concurrently, e.g. one file attached to two messages
+        while (in_flight := self._in_flight.get(key)) is not None:
+            try:
+                file_id = await asyncio.shield(in_flight)
+            except asyncio.CancelledError:
+                if in_flight.cancelled():
+                    continue  # the caller uploading it was cancelled, upload it here
+                raise
+            self.hits += 1
+            self.bytes_saved += size
+            return file_id
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            file_id = await self._lookup(sha256, purpose, size)
+            if file_id is None:
+                self.misses += 1
+                openai_file = await self.client.files.create(file=file, purpose=purpose)
+                file_id = openai_file.id
+                self._put(sha256, purpose, file_id, size)
+            future.set_result(file_id)
+            return file_id
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # retrieved, waiters get it through shield
+            raise
+        finally:
+            if not future.done():
+                future.cancel()  # this caller was cancelled, the waiters upload it themselves
+            del self._in_flight[key]
+
+    async def _lookup(self, sha256: str, purpose: str, size: int) -> str | None:
+        row = self._conn.execute(
+            "SELECT file_id, checked_at FROM file_uploads WHERE sha256 = ? AND purpose = ?",
+            (sha256, purpose),
+        ).fetchone()
+        if row is None:
+            return None
+        file_id, checked_at = row
+        if time.time() - checked_at >= self.check_interval:
+            try:
+                await self.client.files.retrieve(file_id)
+            except openai.NotFoundError:
+                logger.info(f"Cached file {file_id} was deleted, uploading again")
+                self.dead += 1
+                with self._conn:
+                    self._conn.execute(
+                        "DELETE FROM file_uploads WHERE sha256 = ? AND purpose = ?", (sha256, purpose)
+                    )
+                return None
+            with self._conn:
+                self._conn.execute(
+                    "UPDATE file_uploads SET checked_at = ? WHERE sha256 = ? AND purpose = ?",
+                    (time.time(), sha256, purpose),
+                )
+        self.hits += 1
+        self.bytes_saved += size
+        return file_id
+
+    def _put(self, sha256: str, purpose: str, file_id: str, size: int) -> None:
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO file_uploads (sha256, purpose, file_id, size, checked_at) VALUES (?, ?, ?, ?, ?)",
+                (sha256, purpose, file_id, size, time.time()),
+            )
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "dead": self.dead,
+            "bytes_saved": self.bytes_saved,
+        }
+
+
+file_cache = FileUploadCache()
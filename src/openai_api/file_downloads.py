@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import asyncio
+import io
+import logging
+from collections import OrderedDict
+from typing import IO, Awaitable, Callable
+
+from src.constants import RENDER_CACHE_BYTES, RENDER_MAX_CONCURRENCY
+from src.openai_api.transfer import download_openai_file
+
+logger = logging.getLogger(__name__)
+
+
+class FileDownloads:
+    """Downloads of OpenAI files for rendering replies, with an LRU cache of the content by file id.
+
+    At most max_concurrency files are downloaded at a time. Files that fit in memory (see
+    TRANSFER_SPOOL_BYTES) are cached up to max_bytes in total, so re-rendered or shared outputs
+    are not fetched again. Concurrent requests for the same file share one download.
+    """
+
+    def __init__(
+        self,
+        download: Callable[[str], Awaitable[IO[bytes]]] = download_openai_file,
+        max_concurrency: int = RENDER_MAX_CONCURRENCY,
+        max_bytes: int = RENDER_CACHE_BYTES,
+    ):
+        self.download = download
+        self.max_concurrency = max_concurrency
+        self.max_bytes = max_bytes
+        self.cache: OrderedDict[str, bytes] = OrderedDict()
+        self.cached_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._in_flight: dict[str, asyncio.Future] = {}
+        self._semaphore: asyncio.Semaphore | None = None
+
+    async def get(self, file_id: str) -> IO[bytes]:
+        """The content of the file as a new file object, which the caller closes"""
+        data = self.cache.get(file_id)
+        if data is not None:
+            self.hits += 1
+            self.cache.move_to_end(file_id)
+            return io.BytesIO(data)
+        while (in_flight := self._in_flight.get(file_id)) is not None:
+            try:
+                data = await asyncio.shield(in_flight)
+            except asyncio.CancelledError:
+                if in_flight.cancelled():
+                    continue  # the caller downloading it was cancelled, download it here
+                raise
+            self.hits += 1
+            if data is not None:
+                return io.BytesIO(data)
+            break  # too large to share, download it again
+
+        self.misses += 1
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[file_id] = future
+        try:
+            async with self._semaphore:
+                f = await self.download(file_id)
+            if isinstance(f, io.BytesIO):
+                data = f.getvalue()
+                self._put(file_id, data)
+            else:
+                data = None  # spooled to disk, not cached
+            future.set_result(data)
+            return f
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # retrieved, waiters get it through shield
+            raise
+        finally:
+            if not future.done():
+                future.cancel()  # this caller was cancelled, the waiters download it themselves
+            del self._in_flight[file_id]
+
+    def _put(self, file_id: str, data: bytes) -> None:
+        if len(data) > self.max_bytes:
+            return
+        self.cache[file_id] = data
+        self.cached_bytes += len(data)
+        while self.cached_bytes > self.max_bytes:
+            _, evicted = self.cache.popitem(last=False)
+            self.cached_bytes -= len(evicted)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "cached_files": len(self.cache),
+            "cached_bytes": self.cached_bytes,
+        }
+
+
+file_downloads = FileDownloads()
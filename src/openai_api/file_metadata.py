@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+
+import openai
+from openai import AsyncOpenAI
+
+from src.constants import FILE_METADATA_CACHE_SIZE, FILE_METADATA_TTL_SECONDS
+from src.openai_api.cache import MISSING, TTLCache
+
+logger = logging.getLogger(__name__)
+client = AsyncOpenAI()
+
+
+class FileMetadata:
+    """Filenames of OpenAI files by id, cached in memory, to name the sources cited in replies.
+
+    Concurrent lookups of the same file share one files.retrieve request. A file that cannot be
+    retrieved has no filename and is not cached, the next reply citing it tries again.
+    """
+
+    def __init__(
+        self,
+        client: AsyncOpenAI = client,
+        maxsize: int = FILE_METADATA_CACHE_SIZE,
+        ttl: float = FILE_METADATA_TTL_SECONDS,
+    ):
+        self.client = client
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.failures = 0
+        self._in_flight: dict[str, asyncio.Future] = {}
+
+    async def filename(self, file_id: str) -> str | None:
+        filename = self.cache.get(file_id)
+        if filename is not MISSING:
+            return filename
+        while (in_flight := self._in_flight.get(file_id)) is not None:
+            try:
+                return await asyncio.shield(in_flight)
+            except asyncio.CancelledError:
+                if not in_flight.cancelled():
+                    raise
+                # the caller looking it up was cancelled, look it up here
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[file_id] = future
+        try:
+            try:
+                filename = (await self.client.files.retrieve(file_id)).filename
+                self.cache.set(file_id, filename)
+            except openai.APIError as e:
+                logger.warning(f"Failed to retrieve the file {file_id}: {e}")
+                self.failures += 1
+                filename = None
+            future.set_result(filename)
+            return filename
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # retrieved, waiters get it through shield
+            raise
+        finally:
+            if not future.done():
+                future.cancel()  # this caller was cancelled, the waiters look it up themselves
+            del self._in_flight[file_id]
+
+    async def filenames(self, file_ids: list[str]) -> dict[str, str | None]:
+        """The filenames of the files, looked up concurrently"""
+        file_ids = list(dict.fromkeys(file_ids))
+        filenames = await asyncio.gather(*(self.filename(file_id) for file_id in file_ids))
+        return dict(zip(file_ids, filenames))
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "hits": self.cache.hits,
+            "misses": self.cache.misses,
+            "failures": self.failures,
+            "cached_files": len(self.cache),
+        }
+
+
+file_metadata = FileMetadata()
@@ -1,15 +1,15 @@
+from typing import IO
+
 from openai import AsyncOpenAI
 from openai._types import FileTypes
 from src.openai_api.assistants import get_assistant
+from src.openai_api.file_cache import file_cache
+from src.openai_api.file_downloads import file_downloads
 
 
 async def upload_file(file:FileTypes, purpose: str = "assistants") -> str:
-    client = AsyncOpenAI()
-    openai_file = await client.files.create(
-        file=file,
-        purpose=purpose,
-    )
-    return openai_file.id
+    """Upload a file, or return the id of the file uploaded before with the same content and purpose"""
+    return await file_cache.upload(file=file, purpose=purpose)
 
 async def create_vector_store(name: str, file_ids:list[str]|None=None) -> str:
     client = AsyncOpenAI()
@@ -26,14 +26,16 @@ async def create_vector_store(name: str, file_ids:list[str]|None=None) -> str:
 
 async def update_vector_store(vector_store_id: str, file:FileTypes) -> str:
     client = AsyncOpenAI()
-    vector_store = await client.beta.vector_stores.files.upload(
+    file_id = await upload_file(file=file)
+    vector_store_file = await client.beta.vector_stores.files.create(
         vector_store_id=vector_store_id,
-        file=file,
+        file_id=file_id,
     )
-    return vector_store.id
+    return vector_store_file.id
 
-async def get_image_file(file_id: str) -> bytes:
-    client = AsyncOpenAI()
-    image_data = await client.files.content(file_id=file_id)
-    image_data_bytes = image_data.read()
-    return image_data_bytes
\ No newline at end of file
+async def get_image_file(file_id: str) -> IO[bytes]:
+    """Download a file, in a temporary file if it is larger than TRANSFER_SPOOL_BYTES. Close it after use.
+
+    Small files are served from the cache of file_downloads if they were downloaded before.
+    """
+    return await file_downloads.get(file_id)
\ No newline at end of file
@@ -1,74 +1,41 @@
-from src.models.message import create_function
+from __future__ import annotations
+
+from src.models.message import FunctionTool
 from src.openai_api.functions import (
     get_wikipedia_summary_function,
     get_wikipedia_page_content_function,
 )
-import json
-
-
-def get_function_tool_outputs(tool_calls):
-    tool_outputs = []
-    for tool in tool_calls:
-        function_dict = tool.function.dict()
-        argumants_dict = json.loads(function_dict["arguments"])
+from src.openai_api.tool_registry import tool_registry
 
-        if tool.function.name == "get_wikipedia_summary":
-            query = argumants_dict["query"]
-            summary = get_wikipedia_summary_function(query)
 
-            if summary:
-                tool_outputs.append(
-                    {
-                        "tool_call_id": tool.id,
-                        "output": summary,
-                    }
-                )
+async def get_function_tool_outputs(tool_calls) -> list[dict[str, str]]:
+    """Run the function tools requested by a run concurrently.
 
-        if tool.function.name == "get_wikipedia_page_content":
-            query = argumants_dict["query"]
-            content = get_wikipedia_page_content_function(query)
+    Every tool call gets an output, because the run does not continue until all outputs are submitted.
+    """
+    return await tool_registry.call_all(tool_calls)
 
-            if content:
-                tool_outputs.append(
-                    {
-                        "tool_call_id": tool.id,
-                        "output": content,
-                    }
-                )
 
-    return tool_outputs
+# not cacheable, the searches and pages are cached in src/openai_api/functions.py
+@tool_registry.tool()
+def get_wikipedia_summary(query: str) -> str | None:
+    """Search Wikipedia and retrieve a page summary and its URL
 
+    Args:
+        query: The search query to look up on Wikipedia
+    """
+    return get_wikipedia_summary_function(query)
 
-get_wikipedia_summary = create_function(
-    name="get_wikipedia_summary",
-    description="Search Wikipedia and retrieve a page summary and its URL",
-    parameters={
-        "query": {
-            "type": "string",
-            "description": "The search query to look up on Wikipedia",
-        },
-    },
-    required_parameters=["query"],
-)
-
-get_wikipedia_page_content = create_function(
-    name="get_wikipedia_page_content",
-    description="Retrieve the content of a Wikipedia page based on the search query and respond to the user with the relevant information",
-    parameters={
-        "query": {
-            "type": "string",
-            "description": "The search query to look up on Wikipedia",
-        },
-    },
-    required_parameters=["query"],
-)
 
+@tool_registry.tool()
+def get_wikipedia_page_content(query: str) -> str | None:
+    """Retrieve the content of a Wikipedia page based on the search query and respond to the user with the relevant information
 
-def get_available_functions():
-    return available_functions
+    Args:
+        query: The search query to look up on Wikipedia
+    """
+    return get_wikipedia_page_content_function(query)
 
 
-available_functions = [
-    get_wikipedia_summary,
-    get_wikipedia_page_content,
-]
+def get_available_functions() -> list[FunctionTool]:
+    return tool_registry.schemas()
@@ -1,30 +1,152 @@
+from __future__ import annotations
+
+import logging
+import threading
+
 from mediawikiapi import MediaWikiAPI
 
+from src.constants import (
+    WIKIPEDIA_BACKEND,
+    WIKIPEDIA_CACHE_DB,
+    WIKIPEDIA_CACHE_SIZE,
+    WIKIPEDIA_CACHE_TTL_SECONDS,
+    WIKIPEDIA_CHUNK_CHARS,
+    WIKIPEDIA_CONTENT_MAX_CHARS,
+    WIKIPEDIA_FALLBACK_TO_API,
+    WIKIPEDIA_INDEX_DB,
+    WIKIPEDIA_LANGUAGE,
+    WIKIPEDIA_NEGATIVE_TTL_SECONDS,
+)
+from src.openai_api.cache import MISSING, SQLiteCache, TTLCache, TwoLevelCache
+from src.openai_api.text_ranking import select_relevant_chunks
+from src.openai_api.wikipedia_index import WikipediaIndex
+
+logger = logging.getLogger(__name__)
+
+_mw: MediaWikiAPI | None = None
+_mw_lock = threading.Lock()
+_index: WikipediaIndex | None = None
+_index_lock = threading.Lock()
+_index_missing = False  # the local index does not exist and the API is used instead
+
+
+def _create_cache(name: str) -> TwoLevelCache:
+    disk = None
+    if WIKIPEDIA_CACHE_DB:
+        disk = SQLiteCache(WIKIPEDIA_CACHE_DB, table=name, ttl=WIKIPEDIA_CACHE_TTL_SECONDS)
+    return TwoLevelCache(
+        name=name,
+        memory=TTLCache(maxsize=WIKIPEDIA_CACHE_SIZE, ttl=WIKIPEDIA_CACHE_TTL_SECONDS),
+        disk=disk,
+    )
+
+
+# query -> title of the first search result (None if nothing was found)
+search_cache = _create_cache("wikipedia_search")
+# title -> {"summary": ..., "content": ..., "url": ...}, filled as the fields are requested
+page_cache = _create_cache("wikipedia_page")
+
+
+def get_mediawiki_client() -> MediaWikiAPI:
+    """The MediaWikiAPI client shared by all lookups, so its HTTP session is reused"""
+    global _mw
+    with _mw_lock:
+        if _mw is None:
+            _mw = MediaWikiAPI()
+            _mw.config.language = WIKIPEDIA_LANGUAGE
+        return _mw
+
+
+def get_wikipedia_index() -> WikipediaIndex | None:
+    """The offline index, or None if the local backend is not enabled.
+
+    A missing index raises FileNotFoundError, unless the lookups fall back to the API anyway.
+    """
+    global _index, _index_missing
+    if WIKIPEDIA_BACKEND != "local" or _index_missing:
+        return None
+    with _index_lock:
+        if _index is None:
+            try:
+                _index = WikipediaIndex(WIKIPEDIA_INDEX_DB, create=False)
+            except FileNotFoundError as e:
+                if not WIKIPEDIA_FALLBACK_TO_API:
+                    raise
+                logger.error(f"{e}, the Wikipedia tools use the API instead")
+                _index_missing = True
+        return _index
+
+
+def search_wikipedia_title(query: str) -> str | None:
+    index = get_wikipedia_index()
+    if index is not None:
+        title = index.search(query)
+        if title is not None or not WIKIPEDIA_FALLBACK_TO_API:
+            return title
+
+    title = search_cache.get(query)
+    if title is MISSING:
+        search_result = get_mediawiki_client().search(query)
+        title = search_result[0] if search_result else None
+        # a search without a result may be a temporary failure, it is not kept for the whole ttl
+        search_cache.set(query, title, ttl=WIKIPEDIA_NEGATIVE_TTL_SECONDS if title is None else None)
+    return title
+
+
+def get_wikipedia_page_fields(title: str, *fields: str) -> dict[str, str]:
+    """Get the given fields (summary, content, url) of the page, fetching only the uncached ones"""
+    index = get_wikipedia_index()
+    if index is not None:
+        page = index.get_page(title)
+        if page is not None:
+            return page
+
+    payload = page_cache.get(title)
+    if payload is MISSING:
+        payload = {}
+    missing = [name for name in fields if name not in payload]
+    if missing:
+        # the title comes from the search, so skip the search done by auto_suggest
+        page = get_mediawiki_client().page(title, auto_suggest=False)
+        payload = dict(payload)
+        for name in missing:
+            payload[name] = getattr(page, name)
+        page_cache.set(title, payload)
+    return payload
+
 
 def get_wikipedia_summary_function(query: str) -> str | None:
-    mw = MediaWikiAPI()
-    mw.config.language = "ja"
-    search_result = mw.search(query)
+    title = search_wikipedia_title(query)
 
-    if search_result:
-        page = mw.page(search_result[0])
-        summary = page.summary
-        url = page.url
+    if title:
+        page = get_wikipedia_page_fields(title, "summary", "url")
+        summary = page["summary"]
+        url = page["url"]
 
         return f"{summary}\n\n{url}"
     else:
         return None
 
 
-def get_wikipedia_page_content_function(query: str) -> str | None:
-    mw = MediaWikiAPI()
-    mw.config.language = "ja"
-    search_result = mw.search(query)
+def get_wikipedia_page_content_function(query: str, budget: int = WIKIPEDIA_CONTENT_MAX_CHARS) -> str | None:
+    """The parts of the page content most relevant to the query, within budget characters"""
+    title = search_wikipedia_title(query)
 
-    if search_result:
-        page = mw.page(search_result[0])
-        content = page.content
+    if title:
+        page = get_wikipedia_page_fields(title, "content", "url")
+        content = page["content"]
+        url = page["url"]
 
-        return f"{content}"
+        if len(content) > budget:
+            chunks = select_relevant_chunks(
+                content, query, budget=budget - len(url) - 2, chunk_chars=WIKIPEDIA_CHUNK_CHARS
+            )
+            content = "\n\n".join(chunk.render() for chunk in chunks)
+
+        return f"{content}\n\n{url}"
     else:
         return None
+
+
+def wikipedia_cache_stats() -> dict[str, dict[str, int]]:
+    return {cache.name: cache.stats() for cache in (search_cache, page_cache)}
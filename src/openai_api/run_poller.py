@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from dataclasses import dataclass, field
+
+from openai import AsyncOpenAI
+from openai.types.beta.threads import Run
+
+from src.constants import (
+    RUN_POLL_BACKOFF,
+    RUN_POLL_INITIAL_INTERVAL_SECONDS,
+    RUN_POLL_JITTER,
+    RUN_POLL_MAX_INTERVAL_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+client = AsyncOpenAI()
+
+TERMINAL_RUN_STATUSES = frozenset(["completed", "cancelled", "expired", "failed", "incomplete"])
+# The statuses for which the waiting coroutine has to do something
+WAKE_RUN_STATUSES = TERMINAL_RUN_STATUSES | {"requires_action"}
+
+
+@dataclass
+class TrackedRun:
+    thread_id: str
+    run_id: str
+    future: asyncio.Future
+    interval: float
+    next_poll_at: float
+    started_at: float = field(default_factory=time.monotonic)
+    polls: int = 0
+
+
+class RunPoller:
+    """A single background task that polls every in-flight run.
+
+    Each run is polled on its own schedule: the first poll comes after initial_interval,
+    and the interval grows by backoff (with jitter) up to max_interval. The coroutine
+    waiting on the run is woken through a future once the run reaches a terminal or
+    requires_action status.
+    """
+
+    def __init__(
+        self,
+        client: AsyncOpenAI = client,
+        initial_interval: float = RUN_POLL_INITIAL_INTERVAL_SECONDS,
+        max_interval: float = RUN_POLL_MAX_INTERVAL_SECONDS,
+        backoff: float = RUN_POLL_BACKOFF,
+        jitter: float = RUN_POLL_JITTER,
+    ):
+        self.client = client
+        self.initial_interval = initial_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.jitter = jitter
+        self.runs: dict[str, TrackedRun] = {}
+        # (run_id, number of polls) of the most recently woken runs
+        self.finished: deque[tuple[str, int]] = deque(maxlen=100)
+        self.total_polls = 0
+        self._task: asyncio.Task | None = None
+        self._changed: asyncio.Event | None = None
+
+    @property
+    def in_flight(self) -> int:
+        return len(self.runs)
+
+    def poll_counts(self) -> dict[str, int]:
+        """The number of polls so far for each in-flight run"""
+        return {run_id: tracked.polls for run_id, tracked in self.runs.items()}
+
+    async def wait(self, thread_id: str, run_id: str) -> Run:
+        """Wait until the run reaches a terminal or requires_action status and return it"""
+        loop = asyncio.get_running_loop()
+        tracked = TrackedRun(
+            thread_id=thread_id,
+            run_id=run_id,
+            future=loop.create_future(),
+            interval=self.initial_interval,
+            next_poll_at=time.monotonic() + self.initial_interval,
+        )
+        self.runs[run_id] = tracked
+        self._ensure_task()
+        self._changed.set()
+        try:
+            return await tracked.future
+        finally:
+            # also unregister the run if the waiting coroutine was cancelled
+            if self.runs.get(run_id) is tracked:
+                del self.runs[run_id]
+
+    def _ensure_task(self) -> None:
+        if self._changed is None:
+            self._changed = asyncio.Event()
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._poll_loop())
+
+    async def _poll_loop(self) -> None:
+        while self.runs:
+            self._changed.clear()
+            now = time.monotonic()
+            due = [tracked for tracked in self.runs.values() if tracked.next_poll_at <= now]
+            if due:
+                await asyncio.gather(*(self._poll(tracked) for tracked in due))
+                continue
+            next_poll_at = min(tracked.next_poll_at for tracked in self.runs.values())
+            try:
+                # wake up early if a new run is registered
+                await asyncio.wait_for(self._changed.wait(), timeout=next_poll_at - now)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _poll(self, tracked: TrackedRun) -> None:
+        if tracked.future.done():
+            return
+        try:
+            run = await self.client.beta.threads.runs.retrieve(
+                thread_id=tracked.thread_id, run_id=tracked.run_id
+            )
+        except Exception as e:
+            self._wake(tracked)
+            if not tracked.future.done():
+                tracked.future.set_exception(e)
+            return
+
+        tracked.polls += 1
+        self.total_polls += 1
+        if run.status in WAKE_RUN_STATUSES:
+            logger.debug(f"Run {tracked.run_id} {run.status} after {tracked.polls} polls")
+            self._wake(tracked)
+            if not tracked.future.done():
+                tracked.future.set_result(run)
+            return
+
+        tracked.interval = min(tracked.interval * self.backoff, self.max_interval)
+        tracked.next_poll_at = time.monotonic() + tracked.interval * random.uniform(
+            1 - self.jitter, 1 + self.jitter
+        )
+
+    def _wake(self, tracked: TrackedRun) -> None:
+        if self.runs.get(tracked.run_id) is tracked:
+            del self.runs[tracked.run_id]
+        self.finished.append((tracked.run_id, tracked.polls))
+
+
+run_poller = RunPoller()
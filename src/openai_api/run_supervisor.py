@@ -0,0 +1,245 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable
+
+from openai import AsyncOpenAI
+
+from src.constants import RUN_DEADLINE_SECONDS
+from src.openai_api.run_poller import TERMINAL_RUN_STATUSES, run_poller
+
+logger = logging.getLogger(__name__)
+client = AsyncOpenAI()
+
+# How long to wait for a cancelled run to leave the cancelling state, so the thread can take a new run
+CANCEL_SETTLE_SECONDS = 15
+
+
+class RunCancelled(Exception):
+    """The run was cancelled by the supervisor before it finished"""
+
+
+@dataclass
+class SupervisedRun:
+    thread_id: str | None  # unknown until the run is created if the thread is created with it
+    assistant_id: str
+    budget: float
+    run_id: str | None = None  # unknown until the run is created
+    discord_thread_id: int | None = None  # known from the start, unlike the OpenAI thread of a first turn
+    started_at: float = field(default_factory=time.time)
+    cancel_reason: str | None = None
+    superseded: bool = False
+    round_trips: int = 0  # API calls made for the turn, not counting the status polls
+    task: asyncio.Task | None = field(default=None, repr=False)
+    # the cancellation through the API, shared by everyone cancelling the run
+    cancelling: asyncio.Task | None = field(default=None, repr=False)
+    # set once a cancelled run has ended, so the next run on the thread does not collide with it
+    settled: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+
+    @property
+    def elapsed(self) -> float:
+        return time.time() - self.started_at
+
+    @property
+    def remaining(self) -> float:
+        return self.budget - self.elapsed
+
+
+class RunSupervisor:
+    """Keeps track of the active run of every OpenAI thread so that runs can be cancelled.
+
+    There can only be one active run per OpenAI thread, so the runs are keyed by thread id.
+    They are also keyed by discord thread id, because the OpenAI thread of the first turn is only
+    created with its run. Runs are cancelled when they exceed their budget, when an admin kills
+    them, or when a newer user message supersedes them.
+    """
+
+    def __init__(self, client: AsyncOpenAI = client):
+        self.client = client
+        self.runs: dict[str, SupervisedRun] = {}
+        self.discord_runs: dict[int, SupervisedRun] = {}
+        self.timed_out = 0
+        self.killed = 0
+        self.superseded = 0
+        # Averages of the completed runs, used to estimate what cancelling a superseded run saved
+        self.completed = 0
+        self.total_seconds = 0.0
+        self.total_completion_tokens = 0
+        self.total_round_trips = 0
+        self.saved_seconds = 0.0
+        self.saved_tokens = 0.0
+
+    def track(
+        self,
+        thread_id: str | None,
+        assistant_id: str,
+        budget: float = RUN_DEADLINE_SECONDS,
+        discord_thread_id: int | None = None,
+    ) -> SupervisedRun:
+        """Start supervising a run. thread_id is None if the thread is created with the run."""
+        supervised = SupervisedRun(
+            thread_id=thread_id, assistant_id=assistant_id, budget=budget, discord_thread_id=discord_thread_id
+        )
+        if thread_id is not None:
+            self.runs[thread_id] = supervised
+        if discord_thread_id is not None:
+            self.discord_runs[discord_thread_id] = supervised
+        return supervised
+
+    def attach(self, supervised: SupervisedRun, thread_id: str, run_id: str) -> None:
+        """Record the ids of the run once it has been created"""
+        supervised.thread_id = thread_id
+        supervised.run_id = run_id
+        self.runs[thread_id] = supervised
+        if supervised.cancel_reason is not None and supervised.cancelling is None:
+            # cancelled while the run was being created, it can be cancelled now that it has an id
+            supervised.cancelling = asyncio.ensure_future(self._cancel_run(supervised))
+            if supervised.task is not None:
+                supervised.task.cancel()
+
+    def untrack(self, supervised: SupervisedRun) -> None:
+        if supervised.thread_id is not None and self.runs.get(supervised.thread_id) is supervised:
+            del self.runs[supervised.thread_id]
+        discord_thread_id = supervised.discord_thread_id
+        if discord_thread_id is not None and self.discord_runs.get(discord_thread_id) is supervised:
+            del self.discord_runs[discord_thread_id]
+
+    def list_runs(self) -> list[SupervisedRun]:
+        """The active runs, oldest first, including the ones still creating their thread"""
+        runs = {id(supervised): supervised for supervised in [*self.runs.values(), *self.discord_runs.values()]}
+        return sorted(runs.values(), key=lambda supervised: supervised.started_at)
+
+    def find(self, id: str) -> SupervisedRun | None:
+        """Find an active run by its run id or thread id"""
+        if id in self.runs:
+            return self.runs[id]
+        return next((s for s in self.runs.values() if s.run_id == id), None)
+
+    async def run(self, supervised: SupervisedRun, coro: Awaitable[Any]) -> Any:
+        """Drive the run with coro within the budget.
+
+        Raise asyncio.TimeoutError if the budget is exceeded and RunCancelled if the run was
+        cancelled through the supervisor. In both cases the run is cancelled through the API first.
+        """
+        supervised.task = asyncio.ensure_future(coro)
+        supervised.task.add_done_callback(lambda task: self._task_done(supervised, task))
+        try:
+            done, _ = await asyncio.wait({supervised.task}, timeout=supervised.remaining)
+        except BaseException:
+            supervised.task.cancel()
+            raise
+        if not done:
+            self.timed_out += 1
+            await self.cancel(supervised, reason=f"exceeded {supervised.budget:.0f}s budget")
+            raise asyncio.TimeoutError()
+        if supervised.task.cancelled():
+            try:
+                await asyncio.wait_for(supervised.settled.wait(), timeout=CANCEL_SETTLE_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            raise RunCancelled(supervised.cancel_reason)
+        return supervised.task.result()
+
+    def _task_done(self, supervised: SupervisedRun, task: asyncio.Task) -> None:
+        if supervised.run_id is None:
+            # the run was never created, there is nothing left to cancel
+            if supervised.cancel_reason is not None and not task.cancelled():
+                task.exception()  # retrieved, the run already ended with a timeout or cancellation
+            supervised.settled.set()
+
+    async def cancel(self, supervised: SupervisedRun, reason: str) -> bool:
+        """Cancel the run through the API and release the coroutine driving it.
+
+        Wait until the run has really ended, because the thread does not accept a new run before.
+        A run that is still being created is cancelled by attach as soon as its id is known.
+        Return False if the run could not be cancelled through the API.
+        """
+        supervised.cancel_reason = reason
+        if supervised.run_id is None and supervised.task is not None and not supervised.task.done():
+            # the create request may already have started the run, let it return the run id
+            try:
+                await asyncio.wait_for(supervised.settled.wait(), timeout=CANCEL_SETTLE_SECONDS)
+            except asyncio.TimeoutError:
+                supervised.task.cancel()
+                return False
+            return supervised.cancelling is not None and await asyncio.shield(supervised.cancelling)
+        if supervised.task is not None and not supervised.task.done():
+            supervised.task.cancel()
+        if supervised.run_id is None:
+            supervised.settled.set()
+            return False
+        if supervised.cancelling is None:
+            supervised.cancelling = asyncio.ensure_future(self._cancel_run(supervised))
+        return await asyncio.shield(supervised.cancelling)
+
+    async def _cancel_run(self, supervised: SupervisedRun) -> bool:
+        try:
+            run = await self.client.beta.threads.runs.cancel(
+                thread_id=supervised.thread_id, run_id=supervised.run_id
+            )
+            status = run.status
+            deadline = time.monotonic() + CANCEL_SETTLE_SECONDS
+            while status not in TERMINAL_RUN_STATUSES and time.monotonic() < deadline:
+                run = await asyncio.wait_for(
+                    run_poller.wait(thread_id=supervised.thread_id, run_id=supervised.run_id),
+                    timeout=deadline - time.monotonic(),
+                )
+                status = run.status
+        except Exception as e:
+            # the run may have reached a terminal state in the meantime
+            logger.warning(f"Failed to cancel run {supervised.run_id}: {e}")
+            return False
+        finally:
+            supervised.settled.set()
+        logger.info(f"Cancelled run {supervised.run_id} ({supervised.cancel_reason})")
+        return True
+
+    async def kill(self, id: str) -> SupervisedRun | None:
+        """Cancel the run with the given run id or thread id on behalf of an admin"""
+        supervised = self.find(id)
+        if supervised is None:
+            return None
+        self.killed += 1
+        await self.cancel(supervised, reason="killed by an admin")
+        return supervised
+
+    async def supersede(self, thread_id: str | int) -> SupervisedRun | None:
+        """Cancel the active run of the OpenAI or discord thread because a newer user message arrived"""
+        supervised = self.runs.get(thread_id) or self.discord_runs.get(thread_id)
+        if supervised is None or supervised.cancel_reason is not None:
+            return None
+        supervised.superseded = True
+        self.superseded += 1
+        # estimate the rest of the run from the average completed run
+        if self.completed:
+            average_seconds = self.total_seconds / self.completed
+            remaining_fraction = max(0.0, 1 - supervised.elapsed / average_seconds)
+            self.saved_seconds += average_seconds * remaining_fraction
+            self.saved_tokens += self.total_completion_tokens / self.completed * remaining_fraction
+        await self.cancel(supervised, reason="superseded by a newer message")
+        return supervised
+
+    def record_completion(self, supervised: SupervisedRun, usage) -> None:
+        self.completed += 1
+        self.total_seconds += supervised.elapsed
+        self.total_round_trips += supervised.round_trips
+        if usage is not None:
+            self.total_completion_tokens += usage.completion_tokens
+
+    def stats(self) -> dict[str, int | float]:
+        return {
+            "active": len(self.list_runs()),
+            "completed": self.completed,
+            "round_trips_per_turn": round(self.total_round_trips / self.completed, 2) if self.completed else 0,
+            "timed_out": self.timed_out,
+            "killed": self.killed,
+            "superseded": self.superseded,
+            "saved_seconds": round(self.saved_seconds),
+            "saved_tokens": round(self.saved_tokens),
+        }
+
+
+run_supervisor = RunSupervisor()
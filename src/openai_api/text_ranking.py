@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import math
+import re
+from collections import Counter
+from dataclasses import dataclass
+
+# MediaWiki plain text extracts mark sections with lines like "== History ==" or "=== Early life ==="
+_HEADING_RE = re.compile(r"^(={2,6})\s*(.+?)\s*\1\s*$", re.MULTILINE)
+# Latin words and numbers are tokens, runs of CJK characters are split into bigrams
+_TOKEN_RE = re.compile(r"[0-9a-z]+|[\u3040-\u30ff\u3400-\u9fff\uf900-\ufaff\uff66-\uff9f]+")
+_CJK_RE = re.compile(r"[\u3040-\u30ff\u3400-\u9fff\uf900-\ufaff\uff66-\uff9f]")
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+
+@dataclass
+class Chunk:
+    index: int  # position in the article, to restore the original order
+    heading: str  # "Section > Subsection", empty for the lead
+    text: str
+    score: float = 0.0
+
+    def render(self) -> str:
+        return f"## {self.heading}\n{self.text}" if self.heading else self.text
+
+
+def tokenize(text: str) -> list[str]:
+    tokens = []
+    for token in _TOKEN_RE.findall(text.lower()):
+        if _CJK_RE.match(token):
+            if len(token) == 1:
+                tokens.append(token)
+            else:
+                tokens.extend(token[i:i + 2] for i in range(len(token) - 1))
+        else:
+            tokens.append(token)
+    return tokens
+
+
+def split_into_sections(content: str) -> list[tuple[str, str]]:
+    """Split the article into (heading path, text) pairs"""
+    sections = []
+    path: list[str] = []
+    position = 0
+    heading = ""
+    for match in _HEADING_RE.finditer(content):
+        sections.append((heading, content[position:match.start()].strip()))
+        level = len(match.group(1)) - 1
+        path = path[:level - 1] + [match.group(2)]
+        heading = " > ".join(path)
+        position = match.end()
+    sections.append((heading, content[position:].strip()))
+    return [(heading, text) for heading, text in sections if text]
+
+
+def split_into_chunks(content: str, max_chars: int) -> list[Chunk]:
+    """Split the article into chunks of at most max_chars that never span two sections"""
+    chunks = []
+    for heading, text in split_into_sections(content):
+        current = ""
+        for paragraph in text.split("\n"):
+            paragraph = paragraph.strip()
+            if not paragraph:
+                continue
+            # hard-split paragraphs that are too long on their own
+            while len(paragraph) > max_chars:
+                if current:
+                    chunks.append(Chunk(len(chunks), heading, current))
+                    current = ""
+                chunks.append(Chunk(len(chunks), heading, paragraph[:max_chars]))
+                paragraph = paragraph[max_chars:]
+            if current and len(current) + 1 + len(paragraph) > max_chars:
+                chunks.append(Chunk(len(chunks), heading, current))
+                current = paragraph
+            else:
+                current = f"{current}\n{paragraph}" if current else paragraph
+        if current:
+            chunks.append(Chunk(len(chunks), heading, current))
+    return chunks
+
+
+def score_chunks(chunks: list[Chunk], query: str) -> None:
+    """Set the BM25 score of every chunk against the query. The heading counts as part of the chunk."""
+    query_terms = set(tokenize(query))
+    if not query_terms or not chunks:
+        return
+    term_counts = [Counter(tokenize(f"{chunk.heading}\n{chunk.text}")) for chunk in chunks]
+    lengths = [sum(counts.values()) for counts in term_counts]
+    average_length = sum(lengths) / len(lengths) or 1
+    n = len(chunks)
+    for term in query_terms:
+        document_frequency = sum(1 for counts in term_counts if term in counts)
+        if document_frequency == 0:
+            continue
+        idf = math.log(1 + (n - document_frequency + 0.5) / (document_frequency + 0.5))
+        for chunk, counts, length in zip(chunks, term_counts, lengths):
+            frequency = counts.get(term, 0)
+            if frequency:
+                chunk.score += idf * frequency * (BM25_K1 + 1) / (
+                    frequency + BM25_K1 * (1 - BM25_B + BM25_B * length / average_length)
+                )
+
+
+def select_relevant_chunks(content: str, query: str, budget: int, chunk_chars: int) -> list[Chunk]:
+    """Return the chunks most relevant to the query that fit into budget characters, in article order.
+
+    The lead section is preferred when scores are equal, so a query with no match still gets the
+    beginning of the article.
+    """
+    chunks = split_into_chunks(content, max_chars=chunk_chars)
+    score_chunks(chunks, query)
+    selected = []
+    used = 0
+    for chunk in sorted(chunks, key=lambda chunk: (-chunk.score, chunk.index)):
+        size = len(chunk.render()) + 2
+        if used + size > budget:
+            continue
+        selected.append(chunk)
+        used += size
+    return sorted(selected, key=lambda chunk: chunk.index)
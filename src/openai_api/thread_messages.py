@@ -1,116 +1,309 @@
+from __future__ import annotations
+
 import asyncio
 import logging
+from typing import Awaitable, Callable
 
 from openai import AsyncOpenAI
 from openai.types.beta.thread import Thread as OpenAIThread
+from openai.types.beta.threads import Message as OpenAIThreadMessage
 
+from src.constants import RUN_DEADLINE_SECONDS
 from src.models.api_response import ResponseData, ResponseStatus
-from src.models.message import Message, MessageCreate
+from src.models.message import ContentText, Message, MessageCreate
 
 logger = logging.getLogger(__name__)
 client = AsyncOpenAI()
 
+from src.openai_api.file_metadata import file_metadata
 from src.openai_api.function_tools import get_function_tool_outputs
+from src.openai_api.run_poller import run_poller
+from src.openai_api.run_supervisor import RunCancelled, SupervisedRun, run_supervisor
+
+TextDeltaCallback = Callable[[str], Awaitable[None]]
+
 
 async def create_thread() -> OpenAIThread:
     thread = await client.beta.threads.create()
     return thread
 
 
-# TODO: only support 1 message to add. If we want to add multiple messages, we need change input to list
-async def add_user_message_to_thread(cfg: MessageCreate) -> Message:
-    response = await client.beta.threads.messages.create(**cfg.input_to_api_create())
-    return Message.from_api_output(response)
+async def build_response_from_last_message(last_message: OpenAIThreadMessage) -> ResponseData:
+    """Wrap the last message of a run in ResponseData, with the filenames of the files it cites"""
+    last_message = Message.from_api_output(last_message)
+    await resolve_citations(last_message)
 
+    if last_message.role == "assistant":
+        return ResponseData(
+            status=ResponseStatus.OK,
+            message=last_message,
+            status_text=None,
+        )
+    else:
+        return ResponseData(
+            status=ResponseStatus.ERROR,
+            message=None,
+            status_text=f"No response from assistant",
+        )
 
-async def generate_assistant_message_in_thread(thread_id: str, assistant_id: str) -> ResponseData:
-    try:
-        run = await client.beta.threads.runs.create(thread_id=thread_id, assistant_id=assistant_id)
-        # TODO: check the run status periodically
-        while run.status != "completed":
-            if run.status == "cancelled":  # ending states (not error)
-                logger.info(f"Run {run.status}")
-                return ResponseData(
-                    status=ResponseStatus.OK,
-                    message=None,
-                    status_text=f"Run {run.status}",
-                )
-            elif run.status in ["cancelled", "expired", "failed"]:  # ending states (error)
-                logger.info(f"Run {run.status}")
-                return ResponseData(
-                    status=ResponseStatus.ERROR,
-                    message=None,
-                    status_text=f"Run {run.status}",
-                )
-
-            await asyncio.sleep(1)
-            run = await client.beta.threads.runs.retrieve(thread_id=thread_id, run_id=run.id)
-
-            # Check if there are tool outputs to submit
-            if run.required_action and run.required_action.submit_tool_outputs:
-                tool_outputs = get_function_tool_outputs(
-                    run.required_action.submit_tool_outputs.tool_calls
-                )
-                if tool_outputs:
-                    run = await client.beta.threads.runs.submit_tool_outputs(
-                        thread_id=thread_id,
+
+async def resolve_citations(message: Message) -> None:
+    """Set the filenames of the citations of the message, looked up concurrently"""
+    citations = [
+        citation
+        for content in message.content or []
+        if isinstance(content, ContentText)
+        for citation in content.citations or []
+    ]
+    if not citations:
+        return
+    filenames = await file_metadata.filenames([citation.file_id for citation in citations])
+    for citation in citations:
+        citation.filename = filenames[citation.file_id]
+
+
+def ended_run_response(supervised: SupervisedRun, status: str) -> ResponseData:
+    """The response for a run that ended without a message to show"""
+    logger.info(f"Run {status}")
+    if supervised.cancel_reason is not None:
+        return ResponseData(
+            status=ResponseStatus.ERROR,
+            message=None,
+            status_text=f"Run cancelled: {supervised.cancel_reason}",
+        )
+    if status == "cancelled":  # ending states (not error)
+        return ResponseData(
+            status=ResponseStatus.OK,
+            message=None,
+            status_text=f"Run {status}",
+        )
+    return ResponseData(  # ending states (error)
+        status=ResponseStatus.ERROR,
+        message=None,
+        status_text=f"Run {status}",
+    )
+
+
+def timed_out_response(supervised: SupervisedRun) -> ResponseData:
+    return ResponseData(
+        status=ResponseStatus.TIMEOUT,
+        message=None,
+        status_text=f"No response from assistant within {supervised.budget:.0f} seconds",
+    )
+
+
+def cancelled_response(supervised: SupervisedRun) -> ResponseData:
+    if supervised.superseded:
+        return ResponseData(
+            status=ResponseStatus.SUPERSEDED,
+            message=None,
+            status_text=supervised.cancel_reason,
+        )
+    return ended_run_response(supervised, "cancelled")
+
+
+async def _create_run(
+    thread_id: str | None, assistant_id: str, new_message: MessageCreate, stream: bool = False
+):
+    """Create the run together with the user message in a single request.
+
+    The message is passed as additional_messages of the run, or as the first message of a new
+    thread with create_and_run if the OpenAI thread does not exist yet.
+    """
+    message = new_message.input_to_additional_message()
+    if thread_id is None:
+        return await client.beta.threads.create_and_run(
+            assistant_id=assistant_id, thread={"messages": [message]}, stream=stream
+        )
+    return await client.beta.threads.runs.create(
+        thread_id=thread_id, assistant_id=assistant_id, additional_messages=[message], stream=stream
+    )
+
+
+async def _poll_run(
+    thread_id: str | None, assistant_id: str, new_message: MessageCreate, supervised: SupervisedRun
+) -> ResponseData:
+    run = await _create_run(thread_id, assistant_id, new_message)
+    supervised.round_trips += 1
+    run_supervisor.attach(supervised, run.thread_id, run.id)
+    thread_id = run.thread_id
+    while run.status not in ["completed", "incomplete"]:
+        if run.status in ["cancelled", "expired", "failed"]:
+            return ended_run_response(supervised, run.status)
+
+        # Wait on the shared poller until the run finishes or requires action
+        run = await run_poller.wait(thread_id=thread_id, run_id=run.id)
+
+        # Submit an output for every tool call, otherwise the run stays in requires_action
+        if run.status == "requires_action" and run.required_action.submit_tool_outputs:
+            tool_outputs = await get_function_tool_outputs(
+                run.required_action.submit_tool_outputs.tool_calls
+            )
+            run = await client.beta.threads.runs.submit_tool_outputs(
+                thread_id=thread_id,
+                run_id=run.id,
+                tool_outputs=tool_outputs,
+            )
+            supervised.round_trips += 1
+
+    if run.status == "incomplete":
+        logger.info(f"Run incomplete: {run.incomplete_details}")
+
+    # If the run is completed, retreive the last message the assistant sent in this run
+    desc_thread_messages = await client.beta.threads.messages.list(
+        thread_id=thread_id, limit=1, run_id=run.id
+    )
+    supervised.round_trips += 1
+    run_supervisor.record_completion(supervised, run.usage)
+    if not desc_thread_messages.data:
+        return ResponseData(
+            status=ResponseStatus.ERROR,
+            message=None,
+            status_text=f"No response from assistant",
+        )
+    return await build_response_from_last_message(desc_thread_messages.data[0])
+
+
+async def _stream_run(
+    thread_id: str | None,
+    assistant_id: str,
+    new_message: MessageCreate,
+    supervised: SupervisedRun,
+    on_text_delta: TextDeltaCallback,
+) -> ResponseData:
+    stream = await _create_run(thread_id, assistant_id, new_message, stream=True)
+    supervised.round_trips += 1
+    last_message = None
+    while stream is not None:
+        next_stream = None
+        async with stream:
+            async for event in stream:
+                if event.event == "thread.run.created":
+                    run_supervisor.attach(supervised, event.data.thread_id, event.data.id)
+                elif event.event == "thread.message.delta":
+                    for block in event.data.delta.content or []:
+                        if block.type == "text" and block.text and block.text.value:
+                            await on_text_delta(block.text.value)
+                elif event.event in ["thread.message.completed", "thread.message.incomplete"]:
+                    last_message = event.data
+                elif event.event == "thread.run.requires_action":
+                    run = event.data
+                    # Submit an output for every tool call, otherwise the run stays in requires_action
+                    tool_outputs = await get_function_tool_outputs(
+                        run.required_action.submit_tool_outputs.tool_calls
+                    )
+                    next_stream = await client.beta.threads.runs.submit_tool_outputs(
+                        thread_id=run.thread_id,
                         run_id=run.id,
                         tool_outputs=tool_outputs,
+                        stream=True,
                     )
+                    supervised.round_trips += 1
+                elif event.event == "thread.run.incomplete":
+                    logger.info(f"Run incomplete: {event.data.incomplete_details}")
+                    run_supervisor.record_completion(supervised, event.data.usage)
+                elif event.event == "thread.run.completed":
+                    run_supervisor.record_completion(supervised, event.data.usage)
+                elif event.event in ["thread.run.cancelled", "thread.run.expired", "thread.run.failed"]:
+                    return ended_run_response(supervised, event.data.status)
+                elif event.event == "error":
+                    return ResponseData(
+                        status=ResponseStatus.ERROR,
+                        message=None,
+                        status_text=event.data.message,
+                    )
+        stream = next_stream
 
-        # If the run is completed, retreive the last message the assistant sent
-        desc_thread_messages = await client.beta.threads.messages.list(thread_id)
-        last_message = desc_thread_messages.data[0]
-        
-        # Extract the message content
-        message_content = last_message.content[0].text
-        annotations = message_content.annotations
-        citations = []
-        # Iterate over the annotations and add footnotes
-        for index, annotation in enumerate(annotations):
-          # Replace the text with a footnote
-          # message_content.value = message_content.value.replace(annotation.text, f' [{index}]')
-          message_content.value = message_content.value.replace(annotation.text, f'')
-          # Gather citations based on annotation attributes
-          if (file_citation := getattr(annotation, 'file_citation', None)):
-              cited_file = await client.files.retrieve(file_citation.file_id)
-              # citations.append(f'[{index}] {file_citation.quote} from {cited_file.filename}')
-              citations.append(f'[{index}] from {cited_file.filename}')
-          elif (file_path := getattr(annotation, 'file_path', None)):
-              cited_file = await client.files.retrieve(file_path.file_id)
-              citations.append(f'[{index}] Click <here> to download {cited_file.filename}')
-              # Note: File download functionality not implemented above for brevity
-        
-        # Add footnotes to the end of the message before displaying to user
-        # message_content.value += '\n' + '\n'.join(citations)
-        
-        last_message = Message.from_api_output(last_message)
-
-        if last_message.role == "assistant":
-            return ResponseData(
-                status=ResponseStatus.OK,
-                message=last_message,
-                status_text=None,
-            )
-        else:
-            return ResponseData(
-                status=ResponseStatus.ERROR,
-                message=None,
-                status_text=f"No response from assistant",
-            )
+    if last_message is None:
+        return ResponseData(
+            status=ResponseStatus.ERROR,
+            message=None,
+            status_text=f"No response from assistant",
+        )
+    return await build_response_from_last_message(last_message)
+
+
+async def _supervise(supervised: SupervisedRun, coro: Awaitable[ResponseData]) -> ResponseData:
+    """Run coro under the supervisor and turn timeouts, cancellations and errors into a response"""
+    try:
+        response_data = await run_supervisor.run(supervised, coro)
+
+    except asyncio.TimeoutError:
+        response_data = timed_out_response(supervised)
+
+    except RunCancelled:
+        response_data = cancelled_response(supervised)
 
     # TODO: need error handling?: https://platform.openai.com/docs/guides/error-codes/python-library-error-types
     except Exception as e:
         logger.exception(e)
-        return ResponseData(
-            status=ResponseStatus.ERROR, 
-            message=None, 
+        response_data = ResponseData(
+            status=ResponseStatus.ERROR,
+            message=None,
             status_text=str(e)
         )
+    finally:
+        run_supervisor.untrack(supervised)
+    response_data.thread_id = supervised.thread_id
+    return response_data
 
 
-async def generate_response(thread_id: str, assistant_id: str, new_message: MessageCreate) -> ResponseData:
+async def generate_assistant_message_in_thread(
+    thread_id: str | None,
+    assistant_id: str,
+    new_message: MessageCreate,
+    deadline: float = RUN_DEADLINE_SECONDS,
+    discord_thread_id: int | None = None,
+) -> ResponseData:
+    supervised = run_supervisor.track(thread_id, assistant_id, budget=deadline, discord_thread_id=discord_thread_id)
+    return await _supervise(supervised, _poll_run(thread_id, assistant_id, new_message, supervised))
+
+
+async def stream_assistant_message_in_thread(
+    thread_id: str | None,
+    assistant_id: str,
+    new_message: MessageCreate,
+    on_text_delta: TextDeltaCallback,
+    deadline: float = RUN_DEADLINE_SECONDS,
+    discord_thread_id: int | None = None,
+) -> ResponseData:
+    """Run the assistant with streaming enabled and pass every text delta to on_text_delta.
+
+    Tool calls are answered on the fly and the run continues on the stream returned by
+    submit_tool_outputs, so the caller sees the first tokens as soon as they are generated.
+    """
+    supervised = run_supervisor.track(thread_id, assistant_id, budget=deadline, discord_thread_id=discord_thread_id)
+    return await _supervise(
+        supervised, _stream_run(thread_id, assistant_id, new_message, supervised, on_text_delta)
+    )
+
+
+async def generate_response(
+    thread_id: str | None,
+    assistant_id: str,
+    new_message: MessageCreate,
+    on_text_delta: TextDeltaCallback | None = None,
+    discord_thread_id: int | None = None,
+) -> ResponseData:
+    """Run the assistant on a new user message, sent with the run in the same request.
+
+    If thread_id is None, the OpenAI thread is created with the run and its id is returned in
+    ResponseData.thread_id. If on_text_delta is given, the run is streamed and the partial text
+    is passed to it. The run can be superseded by discord_thread_id before the thread exists.
+    """
     assert thread_id == new_message.thread_id
-    _ = await add_user_message_to_thread(new_message)
-    response_data = await generate_assistant_message_in_thread(thread_id=thread_id, assistant_id=assistant_id)
+    if on_text_delta is not None:
+        return await stream_assistant_message_in_thread(
+            thread_id=thread_id,
+            assistant_id=assistant_id,
+            new_message=new_message,
+            on_text_delta=on_text_delta,
+            discord_thread_id=discord_thread_id,
+        )
+    response_data = await generate_assistant_message_in_thread(
+        thread_id=thread_id,
+        assistant_id=assistant_id,
+        new_message=new_message,
+        discord_thread_id=discord_thread_id,
+    )
     return response_data
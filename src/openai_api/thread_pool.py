@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+
+from openai import AsyncOpenAI
+
+from src.constants import THREAD_POOL_MAX_AGE_SECONDS, THREAD_POOL_REFILL_PER_SECOND, THREAD_POOL_SIZE
+
+logger = logging.getLogger(__name__)
+client = AsyncOpenAI()
+
+
+@dataclass
+class PooledThread:
+    id: str
+    created_at: float = field(default_factory=time.monotonic)
+
+
+class ThreadPool:
+    """Empty OpenAI threads created ahead of time, so that /chat does not wait on threads.create.
+
+    A background task keeps the pool at size threads, creating at most refill_rate threads per
+    second. Threads older than max_age are deleted and replaced, so an idle pool does not hand
+    out threads that OpenAI may have expired in the meantime.
+    """
+
+    def __init__(
+        self,
+        client: AsyncOpenAI = client,
+        size: int = THREAD_POOL_SIZE,
+        refill_rate: float = THREAD_POOL_REFILL_PER_SECOND,
+        max_age: float = THREAD_POOL_MAX_AGE_SECONDS,
+    ):
+        self.client = client
+        self.size = size
+        self.refill_rate = refill_rate
+        self.max_age = max_age
+        self.threads: deque[PooledThread] = deque()
+        self.hits = 0
+        self.misses = 0
+        self.recycled = 0
+        self._task: asyncio.Task | None = None
+        self._taken: asyncio.Event | None = None
+
+    def start(self) -> None:
+        if self.size <= 0:
+            return
+        if self._taken is None:
+            self._taken = asyncio.Event()
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._refill_loop())
+
+    async def stop(self) -> None:
+        """Stop refilling and delete the threads left in the pool"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        threads, self.threads = list(self.threads), deque()
+        await asyncio.gather(*(self._delete(thread) for thread in threads))
+
+    def take(self) -> str | None:
+        """The id of a pooled thread, or None if the pool is empty"""
+        # hand out the newest thread, the stale ones are at the other end for the refill loop
+        if self.threads and time.monotonic() - self.threads[-1].created_at < self.max_age:
+            self.hits += 1
+            self._wake()
+            return self.threads.pop().id
+        self.misses += 1
+        self._wake()
+        return None
+
+    def _wake(self) -> None:
+        if self._taken is not None:
+            self._taken.set()
+
+    async def _refill_loop(self) -> None:
+        while True:
+            self._taken.clear()
+            try:
+                await self._recycle_stale()
+                if len(self.threads) < self.size:
+                    thread = await self.client.beta.threads.create()
+                    self.threads.append(PooledThread(id=thread.id))
+                    await asyncio.sleep(1 / self.refill_rate)
+                    continue
+            except Exception as e:
+                logger.exception(e)
+                await asyncio.sleep(1 / self.refill_rate)
+                continue
+            # full: sleep until a thread is taken or the oldest one becomes stale
+            oldest_expires_in = self.threads[0].created_at + self.max_age - time.monotonic()
+            try:
+                await asyncio.wait_for(self._taken.wait(), timeout=max(oldest_expires_in, 0))
+            except asyncio.TimeoutError:
+                pass
+
+    async def _recycle_stale(self) -> None:
+        now = time.monotonic()
+        while self.threads and now - self.threads[0].created_at >= self.max_age:
+            thread = self.threads.popleft()
+            self.recycled += 1
+            await self._delete(thread)
+
+    async def _delete(self, thread: PooledThread) -> None:
+        try:
+            await self.client.beta.threads.delete(thread_id=thread.id)
+        except Exception as e:
+            logger.info(f"Failed to delete pooled thread {thread.id}: {e}")
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "pooled": len(self.threads),
+            "hits": self.hits,
+            "misses": self.misses,
+            "recycled": self.recycled,
+        }
+
+
+thread_pool = ThreadPool()
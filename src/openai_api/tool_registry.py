@@ -0,0 +1,242 @@
+from __future__ import annotations
+
+import asyncio
+import bisect
+import functools
+import inspect
+import json
+import logging
+import re
+import time
+import typing
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+from src.constants import (
+    TOOL_CACHE_SIZE,
+    TOOL_CACHE_TTL_SECONDS,
+    TOOL_MAX_CONCURRENCY,
+    TOOL_MAX_OUTPUT_CHARS,
+    TOOL_THREAD_POOL_WORKERS,
+    TOOL_TIMEOUT_SECONDS,
+)
+from src.models.message import FunctionTool, create_function
+from src.openai_api.cache import MISSING, TTLCache
+
+logger = logging.getLogger(__name__)
+
+_JSON_TYPES = {str: "string", int: "integer", float: "number", bool: "boolean"}
+_ARG_DOC_RE = re.compile(r"^\s*(\w+):\s*(.+)$")
+
+# Upper bounds in seconds of the latency histogram buckets (the last bucket is unbounded)
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class LatencyHistogram:
+    def __init__(self, buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile (inf if it is in the last bucket)"""
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def render(self) -> str:
+        mean = self.total / self.count if self.count else 0.0
+        return f"n={self.count} mean={mean:.2f}s p50<={self.quantile(0.5)}s p95<={self.quantile(0.95)}s"
+
+
+def _parse_docstring(doc: str) -> tuple[str, dict[str, str]]:
+    """Split a docstring into its first paragraph and the descriptions of the Args: section"""
+    doc = inspect.cleandoc(doc or "")
+    description = doc.split("\n\n", 1)[0].replace("\n", " ").strip()
+    arguments = {}
+    in_args = False
+    for line in doc.splitlines():
+        if line.strip() == "Args:":
+            in_args = True
+        elif in_args and (match := _ARG_DOC_RE.match(line)):
+            arguments[match.group(1)] = match.group(2).strip()
+        elif in_args and line.strip() and not line.startswith(" "):
+            in_args = False
+    return description, arguments
+
+
+def function_schema(function: Callable, name: str) -> tuple[str, FunctionTool]:
+    """Build the function tool schema from the signature and docstring of the function"""
+    description, argument_docs = _parse_docstring(function.__doc__)
+    hints = typing.get_type_hints(function)
+    parameters = {}
+    required = []
+    for parameter in inspect.signature(function).parameters.values():
+        parameters[parameter.name] = {
+            "type": _JSON_TYPES.get(hints.get(parameter.name, str), "string"),
+            "description": argument_docs.get(parameter.name, parameter.name),
+        }
+        if parameter.default is inspect.Parameter.empty:
+            required.append(parameter.name)
+    return description, create_function(
+        name=name,
+        description=description,
+        parameters=parameters,
+        required_parameters=required,
+    )
+
+
+@dataclass
+class RegisteredTool:
+    """A function tool and how it is executed"""
+    name: str
+    description: str
+    function: Callable[..., Any]
+    schema: FunctionTool
+    blocking: bool = True  # run in the thread pool instead of on the event loop
+    timeout: float = TOOL_TIMEOUT_SECONDS
+    max_concurrency: int = TOOL_MAX_CONCURRENCY
+    cacheable: bool = False
+    max_output_chars: int = TOOL_MAX_OUTPUT_CHARS
+    latency: LatencyHistogram = field(default_factory=LatencyHistogram)
+    cache: TTLCache | None = field(default=None, repr=False)
+    semaphore: asyncio.Semaphore | None = field(default=None, repr=False)
+
+    def __post_init__(self):
+        if self.cacheable:
+            self.cache = TTLCache(maxsize=TOOL_CACHE_SIZE, ttl=TOOL_CACHE_TTL_SECONDS)
+
+    async def __call__(self, executor: ThreadPoolExecutor, **kwargs) -> str | None:
+        cache_key = json.dumps(kwargs, sort_keys=True, ensure_ascii=False)
+        if self.cache is not None:
+            output = self.cache.get(cache_key)
+            if output is not MISSING:
+                return output
+
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        await self.semaphore.acquire()
+        start = time.perf_counter()
+        worker = None
+        try:
+            if self.blocking:
+                loop = asyncio.get_running_loop()
+                worker = loop.run_in_executor(executor, functools.partial(self.function, **kwargs))
+                # shielded, a thread cannot be stopped and the future must follow it until it returns
+                output = await asyncio.wait_for(asyncio.shield(worker), timeout=self.timeout)
+            else:
+                output = await asyncio.wait_for(self.function(**kwargs), timeout=self.timeout)
+        finally:
+            self.latency.observe(time.perf_counter() - start)
+            if worker is not None and not worker.done():
+                # timed out, the thread keeps its slot until it has really finished
+                worker.add_done_callback(self._release)
+            else:
+                self.semaphore.release()
+
+        if output is not None:
+            output = str(output)
+            if len(output) > self.max_output_chars:
+                output = output[:self.max_output_chars] + "\n[truncated]"
+        if self.cache is not None and output is not None:
+            self.cache.set(cache_key, output)
+        return output
+
+    def _release(self, worker: asyncio.Future) -> None:
+        if not worker.cancelled():
+            worker.exception()  # retrieved, the call already failed with a timeout
+        self.semaphore.release()
+
+
+class ToolRegistry:
+    """The function tools the assistants can call, declared once with the tool decorator.
+
+    The schema of each tool is generated from the signature and docstring of its function,
+    and tool calls are dispatched by name with a dict lookup.
+    """
+
+    def __init__(self, max_workers: int = TOOL_THREAD_POOL_WORKERS):
+        self.tools: dict[str, RegisteredTool] = {}
+        # The blocking tools share one bounded thread pool so they never stall the event loop
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="function-tool")
+
+    def tool(
+        self,
+        *,
+        name: str | None = None,
+        blocking: bool = True,
+        timeout: float = TOOL_TIMEOUT_SECONDS,
+        max_concurrency: int = TOOL_MAX_CONCURRENCY,
+        cacheable: bool = False,
+        max_output_chars: int = TOOL_MAX_OUTPUT_CHARS,
+    ) -> Callable[[Callable], Callable]:
+        """Register the decorated function as a function tool"""
+        def decorator(function: Callable) -> Callable:
+            tool_name = name or function.__name__
+            description, schema = function_schema(function, tool_name)
+            self.tools[tool_name] = RegisteredTool(
+                name=tool_name,
+                description=description,
+                function=function,
+                schema=schema,
+                blocking=blocking,
+                timeout=timeout,
+                max_concurrency=max_concurrency,
+                cacheable=cacheable,
+                max_output_chars=max_output_chars,
+            )
+            return function
+        return decorator
+
+    def get(self, name: str) -> RegisteredTool | None:
+        return self.tools.get(name)
+
+    def schemas(self) -> list[FunctionTool]:
+        return [tool.schema for tool in self.tools.values()]
+
+    async def call(self, tool_call) -> dict[str, str]:
+        """Run one tool call of a run and return its output, with an error message if the call failed"""
+        name = tool_call.function.name
+        try:
+            tool = self.tools.get(name)
+            if tool is None:
+                output = f"Error: unknown function {name}"
+            else:
+                output = await tool(self.executor, **json.loads(tool_call.function.arguments))
+
+            if not output:
+                output = f"No results found for {tool_call.function.arguments}"
+        except asyncio.TimeoutError:
+            logger.warning(f"{name} timed out")
+            output = f"Error: {name} timed out"
+        except Exception as e:
+            logger.exception(e)
+            output = f"Error: {name} failed: {e}"
+
+        return {
+            "tool_call_id": tool_call.id,
+            "output": output,
+        }
+
+    async def call_all(self, tool_calls) -> list[dict[str, str]]:
+        """Run the tool calls of a run concurrently"""
+        return list(await asyncio.gather(*(self.call(tool_call) for tool_call in tool_calls)))
+
+    def latency_stats(self) -> dict[str, str]:
+        return {name: tool.latency.render() for name, tool in self.tools.items()}
+
+
+tool_registry = ToolRegistry()
@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import asyncio
+import io
+import tempfile
+from typing import IO, AsyncIterator
+
+import aiohttp
+from openai import AsyncOpenAI
+
+from src.constants import TRANSFER_CHUNK_BYTES, TRANSFER_SPOOL_BYTES
+
+client = AsyncOpenAI()
+
+
+def spool(size: int | None, max_memory: int = TRANSFER_SPOOL_BYTES) -> IO[bytes]:
+    """A file to receive a transfer of size bytes: in memory up to max_memory, on disk above.
+
+    If the size is unknown, the file moves to disk once it gets larger than max_memory.
+    """
+    if size is not None and size <= max_memory:
+        return io.BytesIO()
+    if size is None:
+        return tempfile.SpooledTemporaryFile(max_size=max_memory)
+    return tempfile.TemporaryFile()
+
+
+async def write_chunks(chunks: AsyncIterator[bytes], size: int | None, max_memory: int = TRANSFER_SPOOL_BYTES) -> IO[bytes]:
+    """Write the chunks to a spool and return it, positioned at the start"""
+    f = spool(size, max_memory)
+    try:
+        async for chunk in chunks:
+            if isinstance(f, io.BytesIO):
+                f.write(chunk)
+            else:
+                # do not block the event loop on the disk
+                await asyncio.to_thread(f.write, chunk)
+    except BaseException:
+        f.close()
+        raise
+    f.seek(0)
+    return f
+
+
+async def download_url(
+    session: aiohttp.ClientSession, url: str, size: int | None = None, max_memory: int = TRANSFER_SPOOL_BYTES
+) -> IO[bytes]:
+    """Download the url in chunks of TRANSFER_CHUNK_BYTES, holding at most max_memory in memory"""
+    async with session.get(url) as response:
+        response.raise_for_status()
+        if size is None:
+            size = response.content_length
+        return await write_chunks(response.content.iter_chunked(TRANSFER_CHUNK_BYTES), size, max_memory)
+
+
+async def download_openai_file(
+    file_id: str, max_memory: int = TRANSFER_SPOOL_BYTES, client: AsyncOpenAI = client
+) -> IO[bytes]:
+    """Download the content of an OpenAI file in chunks, holding at most max_memory in memory"""
+    async with client.files.with_streaming_response.content(file_id=file_id) as response:
+        content_length = response.headers.get("content-length")
+        size = int(content_length) if content_length is not None else None
+        return await write_chunks(response.iter_bytes(TRANSFER_CHUNK_BYTES), size, max_memory)
@@ -0,0 +1,257 @@
+"""Offline Wikipedia index in SQLite FTS5 for the Wikipedia function tools.
+
+Import a MediaWiki XML dump (optionally .bz2/.gz compressed) or a JSONL export with one
+{"title", "text" or "content", "summary"?, "url"?} object per line:
+
+    python -m src.openai_api.wikipedia_index jawiki-latest-pages-articles.xml.bz2 --db wikipedia.db
+
+and set WIKIPEDIA_BACKEND=local and WIKIPEDIA_INDEX_DB=wikipedia.db.
+"""
+from __future__ import annotations
+
+import bz2
+import gzip
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import xml.etree.ElementTree as ET
+from typing import IO, Iterator
+from urllib.parse import quote
+
+import click
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_MAX_CHARS = 2000
+
+# Namespaces of links that are not part of the text (English and Japanese names)
+_HIDDEN_LINK_PREFIXES = ("file:", "image:", "category:", "ファイル:", "画像:", "カテゴリ:")
+_COMMENT_RE = re.compile(r"<!--.*?-->", re.DOTALL)
+_REF_RE = re.compile(r"<ref[^>]*/>|<ref[^>]*>.*?</ref>", re.DOTALL | re.IGNORECASE)
+_TEMPLATE_RE = re.compile(r"\{\{[^{}]*\}\}")
+_TABLE_RE = re.compile(r"\{\|.*?\|\}", re.DOTALL)
+_LINK_RE = re.compile(r"\[\[([^\[\]]*)\]\]")
+_EXTERNAL_LINK_RE = re.compile(r"\[https?://[^\s\]]+\s*([^\]]*)\]")
+_TAG_RE = re.compile(r"<[^>]+>")
+_EMPHASIS_RE = re.compile(r"'{2,}")
+_BLANK_LINES_RE = re.compile(r"\n{3,}")
+_HEADING_RE = re.compile(r"^==", re.MULTILINE)
+
+
+def _replace_link(match: re.Match) -> str:
+    target, _, label = match.group(1).partition("|")
+    if target.strip().lower().startswith(_HIDDEN_LINK_PREFIXES):
+        return ""
+    return label.rsplit("|", 1)[-1] if label else target
+
+
+def _sub_nested(pattern: re.Pattern, replacement, text: str) -> str:
+    """Apply the substitution until nothing matches, removing nested constructs from the inside out"""
+    count = 1
+    while count:
+        text, count = pattern.subn(replacement, text)
+    return text
+
+
+def wikitext_to_text(wikitext: str) -> str:
+    """Convert wikitext to plain text with the same "== Heading ==" lines as the API extracts"""
+    text = _COMMENT_RE.sub("", wikitext)
+    text = _REF_RE.sub("", text)
+    text = _sub_nested(_TEMPLATE_RE, "", text)
+    text = _TABLE_RE.sub("", text)
+    text = _sub_nested(_LINK_RE, _replace_link, text)
+    text = _EXTERNAL_LINK_RE.sub(r"\1", text)
+    text = _TAG_RE.sub("", text)
+    text = _EMPHASIS_RE.sub("", text)
+    return _BLANK_LINES_RE.sub("\n\n", text).strip()
+
+
+def summarize(text: str) -> str:
+    """The lead section of the text"""
+    match = _HEADING_RE.search(text)
+    lead = text[:match.start()] if match else text
+    return lead.strip()[:SUMMARY_MAX_CHARS]
+
+
+def page_url(title: str, language: str) -> str:
+    return f"https://{language}.wikipedia.org/wiki/{quote(title.replace(' ', '_'))}"
+
+
+def _open(path: str) -> IO[bytes]:
+    if path.endswith(".bz2"):
+        return bz2.open(path, "rb")
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+def _is_jsonl(path: str) -> bool:
+    """Whether the dump is a JSONL export, by its extension without the compression suffix"""
+    for suffix in (".bz2", ".gz"):
+        path = path.removesuffix(suffix)
+    return path.endswith((".json", ".jsonl"))
+
+
+def iter_xml_dump(file: IO[bytes]) -> Iterator[tuple[str, str]]:
+    """Yield (title, wikitext) for the articles of a MediaWiki XML dump.
+
+    Every element is cleared from the tree once it has been read, so memory stays bounded
+    however large the dump is.
+    """
+    root = None
+    for event, elem in ET.iterparse(file, events=("start", "end")):
+        if root is None:
+            root = elem
+        if event != "end" or elem.tag.rsplit("}", 1)[-1] != "page":
+            continue
+        title = ns = text = None
+        redirect = False
+        for child in elem.iter():
+            tag = child.tag.rsplit("}", 1)[-1]
+            if tag == "title":
+                title = child.text
+            elif tag == "ns":
+                ns = child.text
+            elif tag == "redirect":
+                redirect = True
+            elif tag == "text":
+                text = child.text
+        root.clear()
+        if title and text and ns == "0" and not redirect:
+            yield title, text
+
+
+def iter_jsonl(file: IO[bytes]) -> Iterator[dict[str, str]]:
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+class WikipediaIndex:
+    """Pages stored in SQLite with an FTS5 index over title and content.
+
+    The trigram tokenizer is used because Japanese text has no spaces between words.
+    With create=False the index must exist, so a wrong path is not served as an empty index.
+    """
+
+    def __init__(self, path: str, create: bool = True):
+        if not create and not os.path.exists(path):
+            raise FileNotFoundError(f"Wikipedia index {path} does not exist")
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS pages (
+                    id INTEGER PRIMARY KEY,
+                    title TEXT NOT NULL UNIQUE,
+                    url TEXT NOT NULL,
+                    summary TEXT NOT NULL,
+                    content TEXT NOT NULL
+                );
+                CREATE VIRTUAL TABLE IF NOT EXISTS pages_fts USING fts5(
+                    title, content, content='pages', content_rowid='id', tokenize='trigram'
+                );
+                """
+            )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT count(*) FROM pages").fetchone()[0]
+
+    def add_page(self, title: str, content: str, url: str, summary: str | None = None) -> bool:
+        """Add a page. Return False if a page with the same title is already indexed."""
+        if summary is None:
+            summary = summarize(content)
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO pages (title, url, summary, content) VALUES (?, ?, ?, ?)",
+                (title, url, summary, content),
+            )
+            if cursor.rowcount == 0:
+                return False
+            self._conn.execute(
+                "INSERT INTO pages_fts (rowid, title, content) VALUES (?, ?, ?)",
+                (cursor.lastrowid, title, content),
+            )
+            return True
+
+    def commit(self) -> None:
+        with self._lock:
+            self._conn.commit()
+
+    def search(self, query: str) -> str | None:
+        """The title of the best matching page, with matches in the title weighted higher"""
+        # the trigram tokenizer can not match terms shorter than 3 characters
+        terms = [term for term in query.split() if len(term) >= 3]
+        row = None
+        with self._lock:
+            if terms:
+                match = " OR ".join('"' + term.replace('"', '""') + '"' for term in terms)
+                row = self._conn.execute(
+                    "SELECT title FROM pages_fts WHERE pages_fts MATCH ? ORDER BY bm25(pages_fts, 10.0, 1.0) LIMIT 1",
+                    (match,),
+                ).fetchone()
+            if row is None and len(terms) < len(query.split()):
+                # short queries like "東京" are looked up as a title or title prefix on the title index
+                prefix = " ".join(query.split())
+                row = self._conn.execute(
+                    "SELECT title FROM pages WHERE title >= ? AND title < ? ORDER BY length(title) LIMIT 1",
+                    (prefix, prefix + "\U0010ffff"),
+                ).fetchone()
+        return row[0] if row else None
+
+    def get_page(self, title: str) -> dict[str, str] | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT summary, content, url FROM pages WHERE title = ?", (title,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"summary": row[0], "content": row[1], "url": row[2]}
+
+    def import_dump(self, path: str, language: str, batch_size: int = 1000) -> int:
+        """Import an XML dump or JSONL export and return the number of pages added"""
+        added = 0
+        with _open(path) as file:
+            if _is_jsonl(path):
+                pages = (
+                    (
+                        record["title"],
+                        record.get("content") or record.get("text", ""),
+                        record.get("url") or page_url(record["title"], language),
+                        record.get("summary"),
+                    )
+                    for record in iter_jsonl(file)
+                )
+            else:
+                pages = (
+                    (title, wikitext_to_text(wikitext), page_url(title, language), None)
+                    for title, wikitext in iter_xml_dump(file)
+                )
+            for title, content, url, summary in pages:
+                if self.add_page(title, content, url, summary):
+                    added += 1
+                    if added % batch_size == 0:
+                        self.commit()
+                        logger.info(f"Imported {added} pages")
+        self.commit()
+        return added
+
+
+@click.command()
+@click.argument("dump")
+@click.option("--db", required=True, help="SQLite file of the index")
+@click.option("--language", default="ja", help="Language of the wiki, used to build the page URLs")
+def main(dump, db, language):
+    logging.basicConfig(format="[%(asctime)s] %(message)s", level=logging.INFO)
+    added = WikipediaIndex(db).import_dump(dump, language=language)
+    logger.info(f"Imported {added} pages from {dump} into {db}")
+
+
+if __name__ == "__main__":
+    main()
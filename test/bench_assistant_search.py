@@ -0,0 +1,85 @@
+"""Benchmark of the assistant search index.
+
+Indexes 10,000 generated assistants and reports the time to build the index and the average
+time per query (top 25), compared with the substring scan the search used before. The
+match counts differ because the index matches every term of the query on its own.
+
+    python -m test.bench_assistant_search
+"""
+import random
+import time
+
+import test.conftest  # noqa: F401 (sets the environment needed by src.constants)
+from src.models.assistant import Assistant
+from src.openai_api.assistant_search import AssistantIndex
+
+COUNT = 10_000
+# selective queries, then common words that match most assistants (the worst case)
+QUERIES = ["translator", "trans", "python code", "ウィキ", "検索", "zzz", "assistant", "an"]
+TOPICS = (
+    "translator python code review recipe cooking travel guide history science math tutor "
+    "writer poetry english japanese summary legal finance music game story wiki search "
+    "ウィキペディア 検索 翻訳 料理 旅行"
+).split()
+COMMON = "you are an assistant that helps the user with".split()
+
+
+def make_assistants(count: int) -> list[Assistant]:
+    random.seed(0)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    vocabulary = ["".join(random.choices(letters, k=random.randint(4, 10))) for _ in range(20_000)]
+
+    def text(words: int) -> str:
+        # mostly rare words, a few topic words and the usual phrasing of instructions
+        return " ".join(
+            random.choice(TOPICS) if random.random() < 0.01
+            else random.choice(COMMON) if random.random() < 0.2
+            else random.choice(vocabulary)
+            for _ in range(words)
+        )
+
+    return [
+        Assistant.model_validate(dict(
+            id=f"asst_{i}", created_at=i, name=f"{text(2)} {i}",
+            description=text(12), instructions=text(80),
+        ))
+        for i in range(count)
+    ]
+
+
+def scan(assistants: list[Assistant], query: str) -> list[Assistant]:
+    return [
+        a for a in assistants
+        if query in a.name or query in a.description or query in a.instructions
+    ]
+
+
+def main():
+    assistants = make_assistants(COUNT)
+    index = AssistantIndex()
+    start = time.perf_counter()
+    for assistant in assistants:
+        index.add(assistant)
+    print(f"indexed {COUNT} assistants in {(time.perf_counter() - start) * 1000:.0f}ms")
+
+    print(f"{'query':>12} {'index':>8} {'scan':>8} {'index':>10} {'scan':>10}")
+    for query in QUERIES:
+        repeat = 100
+        start = time.perf_counter()
+        for _ in range(repeat):
+            matches = index.search(query, limit=25)
+        indexed = (time.perf_counter() - start) / repeat
+        start = time.perf_counter()
+        for _ in range(10):
+            scanned = scan(assistants, query)
+        scanned_time = (time.perf_counter() - start) / 10
+        found = len(index.search(query))
+        print(f"{query:>12} {found:>8} {len(scanned):>8} {indexed * 1e6:>8.0f}us {scanned_time * 1e6:>8.0f}us")
+
+    start = time.perf_counter()
+    index.add(assistants[0])
+    print(f"update of one assistant: {(time.perf_counter() - start) * 1e6:.0f}us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Benchmark of rewriting the LaTeX formulas of the replies.
+
+Builds replies out of the paragraphs of the rules texts in this directory, a fifth of them
+with formulas and code blocks like the math and code interpreter answers, and reports the
+time to rewrite all of them before (two re.sub passes with inline patterns) and with
+rewrite_formulas.
+
+    python -m test.bench_formulas
+"""
+import random
+import re
+import time
+from pathlib import Path
+
+import test.conftest  # noqa: F401 (sets the environment needed by src.constants)
+from src.models.message import rewrite_formulas
+
+REPLIES = 20_000
+MATH = [
+    r"The expected successes are \(n \cdot p = 10 \cdot 0.4 = 4\).",
+    "\\[\n\tP(X \\geq k) = \\sum_{i=k}^{n} \\binom{n}{i} p^i (1-p)^{n-i}\n\\]",
+    "```python\nfrom math import comb\nprint(sum(comb(10, i) * 0.4**i * 0.6**(10 - i) for i in range(4, 11)))\n```",
+]
+
+
+def old_rewrite_formulas(text: str) -> str:
+    """The two passes of ContentText.render before rewrite_formulas"""
+    display_pattern = r'\\\[([\w\s\^_.,=+\-*/{}\[\]()<>!&#:;\|\'\\]+?)\\\]'
+    text = re.sub(
+        display_pattern,
+        lambda match: '$$' + match.group(1).replace('\n', '').replace('\t', '').replace('\\\\', '\\\\\\\\') + '$$',
+        text, flags=re.DOTALL
+    )
+    inline_pattern = r'\\\(([\w\s\^_.,=+\-*/{}\[\]()<>!&#:;\|\'\\]+?)\\\)'
+    return re.sub(
+        inline_pattern,
+        lambda match: '$' + match.group(1).replace('\n', '').replace('\t', '').replace('\\\\', '\\\\\\\\') + '$',
+        text, flags=re.DOTALL
+    )
+
+
+def build_replies() -> list[str]:
+    rng = random.Random(0)
+    paragraphs = [
+        paragraph
+        for path in sorted(Path(__file__).parent.glob("*.txt"))
+        for paragraph in path.read_text(encoding="utf8", errors="replace").split("\n")
+        if paragraph.strip()
+    ]
+    replies = []
+    for _ in range(REPLIES):
+        parts = rng.sample(paragraphs, rng.randint(1, 4))
+        if rng.random() < 0.2:
+            parts += rng.sample(MATH, rng.randint(1, len(MATH)))
+            rng.shuffle(parts)
+        replies.append("\n\n".join(parts))
+    return replies
+
+
+def measure(rewrite, replies: list[str]) -> float:
+    start = time.perf_counter()
+    for reply in replies:
+        rewrite(reply)
+    return time.perf_counter() - start
+
+
+def main():
+    replies = build_replies()
+    with_math = [reply for reply in replies if "\\(" in reply or "\\[" in reply]
+    for name, corpus in [("all replies", replies), ("replies with math", with_math)]:
+        before = measure(old_rewrite_formulas, corpus)
+        after = measure(rewrite_formulas, corpus)
+        print(
+            f"{name} ({len(corpus)}): before {before * 1e6 / len(corpus):.1f}us"
+            f", after {after * 1e6 / len(corpus):.1f}us per reply, {before / after:.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Benchmark of splitting long replies into discord messages.
+
+Splits multi-MB texts with the old recursive splitter and with iter_message_chunks and reports
+the time of each. The old one recurses once per chunk of unbroken text, so it fails on a
+single line of base64 longer than about a thousand messages.
+
+    python -m test.bench_message_splitter
+"""
+import base64
+import random
+import sys
+import time
+
+import test.conftest  # noqa: F401 (sets the environment needed by src.constants)
+from src.constants import MAX_CHARS_PER_REPLY_MSG
+from src.discord_cogs._utils import iter_message_chunks
+
+SIZE_BYTES = 4 * 1024 * 1024
+
+
+def old_split_into_shorter_messages(text: str, limit=MAX_CHARS_PER_REPLY_MSG, code_block="```"):
+    """split_into_shorter_messages before the one pass splitter"""
+    def split_at_boundary(s, boundary):
+        parts = s.split(boundary)
+        result = []
+        for i, part in enumerate(parts):
+            if i % 2 == 1:
+                result.extend(split_code_block(part))
+            else:
+                result += split_substring(part)
+        return result
+
+    def split_substring(s):
+        if len(s) <= limit:
+            return [s]
+        for boundary in ("\n", " "):
+            if boundary in s:
+                break
+        else:
+            return [s[:limit]] + split_substring(s[limit:])
+
+        pieces = s.split(boundary)
+        result = []
+        current_part = pieces[0]
+        for piece in pieces[1:]:
+            if len(current_part) + len(boundary) + len(piece) > limit:
+                result.append(current_part)
+                current_part = piece
+            else:
+                current_part += boundary + piece
+        result.append(current_part)
+        return result
+
+    def split_code_block(s):
+        if len(code_block + s + code_block) <= limit:
+            return [code_block + s + code_block]
+        else:
+            lines = s.split("\n")
+            result = [code_block]
+            for line in lines:
+                if len(result[-1] + "\n" + line) > limit:
+                    result[-1] += code_block
+                    result.append(code_block + line)
+                else:
+                    result[-1] += "\n" + line
+            result[-1] += code_block
+            return result
+
+    return split_at_boundary(text, code_block)
+
+
+def texts() -> dict[str, str]:
+    rng = random.Random(0)
+    words = ["lorem", "ipsum", "dolor", "sit", "amet", "consectetur", "adipiscing", "elit"]
+    prose = "\n\n".join(
+        " ".join(rng.choice(words) for _ in range(rng.randint(20, 200)))
+        for _ in range(SIZE_BYTES // 600)
+    )
+    code = "\n".join(
+        f"```python\n" + "\n".join(f"value_{i} = compute({i}, {'x' * rng.randint(0, 80)})" for i in range(200)) + "\n```"
+        for _ in range(SIZE_BYTES // 12000)
+    )
+    return {
+        "prose": prose[:SIZE_BYTES],
+        "code blocks": code[:SIZE_BYTES],
+        "base64": base64.b64encode(rng.randbytes(SIZE_BYTES * 3 // 4)).decode(),
+    }
+
+
+def measure(split, text: str) -> str:
+    start = time.perf_counter()
+    try:
+        chunks = split(text)
+    except RecursionError:
+        return "RecursionError"
+    return f"{time.perf_counter() - start:.3f}s, {len(chunks)} messages"
+
+
+def main():
+    print(f"{SIZE_BYTES // 1024 // 1024}MB, recursion limit {sys.getrecursionlimit()}")
+    for name, text in texts().items():
+        print(f"{name}:")
+        print(f"  before:   {measure(old_split_into_shorter_messages, text)}")
+        print(f"  one pass: {measure(lambda text: list(iter_message_chunks(text)), text)}")
+
+
+if __name__ == "__main__":
+    main()
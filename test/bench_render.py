@@ -0,0 +1,74 @@
+"""Benchmark of rendering a reply with code interpreter images.
+
+Serves the file contents from a local stub of the OpenAI files API with 100ms of latency per
+file and reports the time to render a message with n images: downloading them one after
+another (before), with Message.render, and re-rendering it from the cache.
+
+    python -m test.bench_render
+"""
+import asyncio
+import contextlib
+import functools
+import io
+import time
+
+from aiohttp import web
+
+import test.conftest  # noqa: F401 (sets the environment needed by src.constants)
+from openai import AsyncOpenAI
+
+from src.models.message import ContentImageFile, ContentText, Message
+from src.openai_api.file_downloads import file_downloads
+from src.openai_api.transfer import download_openai_file
+
+LATENCY_SECONDS = 0.1
+IMAGE_BYTES = 200 * 1024
+
+
+async def send_file(request):
+    await asyncio.sleep(LATENCY_SECONDS)
+    return web.Response(body=b"x" * IMAGE_BYTES)
+
+
+async def render(message: Message) -> float:
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        rendered = await message.render()
+    for discord_message in rendered:
+        for file in discord_message.files or []:
+            file.close()
+    return time.perf_counter() - start
+
+
+async def main():
+    app = web.Application()
+    app.router.add_get("/v1/files/{file_id}/content", send_file)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    client = AsyncOpenAI(base_url=f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}/v1", api_key="x")
+    download = functools.partial(download_openai_file, client=client)
+    file_downloads.download = download
+
+    print(f"{LATENCY_SECONDS * 1000:.0f}ms per file, concurrency {file_downloads.max_concurrency}")
+    print(f"{'images':>6} {'serial':>8} {'render':>8} {'cached':>8}")
+    for n in [1, 2, 4, 8, 16]:
+        file_ids = [f"file_{n}_{i}" for i in range(n)]
+        start = time.perf_counter()
+        for file_id in file_ids:
+            (await download(file_id)).close()
+        serial = time.perf_counter() - start
+
+        message = Message(content=[ContentText(value="Charts", annotations=None)] + [
+            ContentImageFile(file_id=file_id) for file_id in file_ids
+        ])
+        first = await render(message)
+        cached = await render(message)
+        print(f"{n:>6} {serial * 1000:>6.0f}ms {first * 1000:>6.0f}ms {cached * 1000:>6.1f}ms")
+
+    await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,46 @@
+"""Benchmark of the Wikipedia page content tool output selection.
+
+Builds large articles out of the rules texts in this directory and reports the size of the
+tool output and the time spent chunking and scoring.
+
+    python -m test.bench_text_ranking
+"""
+import time
+from pathlib import Path
+
+import test.conftest  # noqa: F401 (sets the environment needed by src.constants)
+from src.constants import WIKIPEDIA_CHUNK_CHARS, WIKIPEDIA_CONTENT_MAX_CHARS
+from src.openai_api.text_ranking import select_relevant_chunks
+
+QUERY = "withering attack initiative damage"
+
+
+def build_article(size: int) -> str:
+    texts = [path.read_text(encoding="utf8", errors="replace") for path in sorted(Path(__file__).parent.glob("*.txt"))]
+    parts = []
+    total = 0
+    i = 0
+    while total < size:
+        text = texts[i % len(texts)]
+        part = f"== Section {i} ==\n{text}\n"
+        parts.append(part)
+        total += len(part)
+        i += 1
+    return "".join(parts)
+
+
+def main():
+    print(f"{'article':>10} {'output':>8} {'chunks':>7} {'time':>9}")
+    for size in [50_000, 200_000, 500_000, 1_000_000]:
+        article = build_article(size)
+        start = time.perf_counter()
+        chunks = select_relevant_chunks(
+            article, QUERY, budget=WIKIPEDIA_CONTENT_MAX_CHARS, chunk_chars=WIKIPEDIA_CHUNK_CHARS
+        )
+        elapsed = time.perf_counter() - start
+        output = "\n\n".join(chunk.render() for chunk in chunks)
+        print(f"{len(article):>10} {len(output):>8} {len(chunks):>7} {elapsed * 1000:>7.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Benchmark of the peak memory of an attachment transfer.
+
+Downloads a file from a local HTTP server standing in for the discord CDN and uploads it
+through the file upload cache to a local server standing in for the OpenAI files API. Each
+transfer runs in its own process and reports how much the peak RSS grew, for the old path
+(the whole file in memory) and the streamed one.
+
+    python -m test.bench_transfer
+"""
+import asyncio
+import resource
+import subprocess
+import sys
+import time
+
+import aiohttp
+from aiohttp import web
+
+import test.conftest  # noqa: F401 (sets the environment needed by src.constants)
+from src.constants import TRANSFER_CHUNK_BYTES, TRANSFER_SPOOL_BYTES
+from src.openai_api.file_cache import FileUploadCache
+from src.openai_api.transfer import download_url
+
+SIZES_MB = [16, 64, 256]
+
+
+async def send_file(request):
+    size = int(request.query["size"])
+    chunk = b"x" * TRANSFER_CHUNK_BYTES
+    response = web.StreamResponse()
+    response.content_length = size
+    await response.prepare(request)
+    for _ in range(size // len(chunk)):
+        await response.write(chunk)
+    return response
+
+
+async def receive_file(request):
+    async for _ in request.content.iter_chunked(TRANSFER_CHUNK_BYTES):
+        pass
+    return web.json_response({
+        "id": "file_1", "object": "file", "bytes": 0, "created_at": 0,
+        "filename": "upload", "purpose": "assistants", "status": "processed",
+    })
+
+
+async def transfer(mode: str, size: int) -> tuple[float, float]:
+    from openai import AsyncOpenAI
+
+    app = web.Application(client_max_size=0)
+    app.router.add_get("/file", send_file)
+    app.router.add_post("/v1/files", receive_file)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    base = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+    cache = FileUploadCache(client=AsyncOpenAI(base_url=f"{base}/v1", api_key="x"), path=":memory:")
+
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    async with aiohttp.ClientSession() as session:
+        if mode == "buffered":
+            async with session.get(f"{base}/file?size={size}") as response:
+                data = await response.read()
+            await cache.upload(("upload", data))
+        else:
+            with await download_url(session, f"{base}/file?size={size}", size) as f:
+                await cache.upload(("upload", f))
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    await runner.cleanup()
+    return (peak - before) / 1024, elapsed
+
+
+def main():
+    if len(sys.argv) == 3:
+        growth, elapsed = asyncio.run(transfer(sys.argv[1], int(sys.argv[2])))
+        print(f"{growth:.0f} {elapsed:.2f}")
+        return
+
+    print(f"spooling above {TRANSFER_SPOOL_BYTES // (1024 * 1024)}MB")
+    print(f"{'file':>8} {'mode':>9} {'peak RSS growth':>16} {'time':>7}")
+    for size_mb in SIZES_MB:
+        for mode in ["buffered", "streamed"]:
+            output = subprocess.run(
+                [sys.executable, "-m", "test.bench_transfer", mode, str(size_mb * 1024 * 1024)],
+                capture_output=True, text=True, check=True,
+            ).stdout.split()
+            print(f"{size_mb:>6}MB {mode:>9} {float(output[0]):>14.0f}MB {float(output[1]):>6.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,12 @@
+import os
+
+# src.constants reads these at import time
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("DISCORD_BOT_TOKEN", "test")
+os.environ.setdefault("DISCORD_CLIENT_ID", "1")
+os.environ.setdefault("OWNER_USERID", "1")
+os.environ.setdefault("ADMIN_SERVER_ID", "1")
+os.environ.setdefault("ALLOWED_SERVER_IDS", "2")
+os.environ.setdefault("DEFAULT_MODEL", "gpt-4")
+os.environ.setdefault("SESSION_DB", ":memory:")
+os.environ.setdefault("FILE_CACHE_DB", ":memory:")
@@ -0,0 +1,62 @@
+from types import SimpleNamespace
+
+import discord
+
+from src.constants import ACTIVATE_CHAT_THREAD_PREFIX, INACTIVATE_CHAT_THREAD_PREFIX
+from src.discord_cogs._admission import ChatAdmission
+
+BOT_ID = 99
+
+
+def thread(id, guild_id=2, owner_id=BOT_ID, name=f"{ACTIVATE_CHAT_THREAD_PREFIX} user", archived=False):
+    return SimpleNamespace(
+        id=id, guild=SimpleNamespace(id=guild_id), owner_id=owner_id, name=name, archived=archived, locked=False
+    )
+
+
+class FakeThread(discord.Thread):
+    def __init__(self, **attributes):
+        for name, value in attributes.items():
+            setattr(self, name, value)
+
+
+def message(channel_id, channel=None):
+    return SimpleNamespace(channel=channel or SimpleNamespace(id=channel_id))
+
+
+def test_only_active_bot_chat_threads_are_admitted():
+    admission = ChatAdmission(allowed_guild_ids=frozenset([2]))
+    admission.track(thread(1), BOT_ID)
+    admission.track(thread(2, guild_id=3), BOT_ID)
+    admission.track(thread(3, owner_id=1), BOT_ID)
+    admission.track(thread(4, archived=True), BOT_ID)
+
+    assert [admission.admit(message(id), BOT_ID) for id in (1, 2, 3, 4, 5)] == [True, False, False, False, False]
+    assert admission.stats() == {"active_threads": 1, "admitted": 1, "rejected": 4}
+
+
+def test_renamed_and_deleted_threads_are_forgotten():
+    admission = ChatAdmission(allowed_guild_ids=frozenset([2]))
+    admission.track(thread(1), BOT_ID)
+    admission.track(thread(2), BOT_ID)
+    admission.track(thread(1, name=f"{INACTIVATE_CHAT_THREAD_PREFIX} user"), BOT_ID)
+    admission.forget(2)
+    assert admission.active_thread_ids == set()
+
+
+def test_unarchived_threads_are_admitted_again():
+    admission = ChatAdmission(allowed_guild_ids=frozenset([2]))
+    admission.track(thread(1), BOT_ID)
+    admission.track(thread(1, archived=True), BOT_ID)
+    assert not admission.admit(message(1), BOT_ID)
+
+    # unarchived by a new message, without a thread update for the bot
+    unarchived = FakeThread(**vars(thread(1)))
+    assert admission.admit(message(1, channel=unarchived), BOT_ID)
+    assert admission.active_thread_ids == {1}
+
+    archived = FakeThread(**vars(thread(2, archived=True)))
+    other_owner = FakeThread(**vars(thread(3, owner_id=1)))
+    assert not admission.admit(message(2, channel=archived), BOT_ID)
+    assert not admission.admit(message(3, channel=other_owner), BOT_ID)
+    assert admission.active_thread_ids == {1}
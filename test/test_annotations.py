@@ -0,0 +1,66 @@
+import asyncio
+
+from src.models.message import ContentText, rewrite_annotations
+
+
+def citation(value, text, file_id, start=None):
+    start = value.index(text) if start is None else start
+    return {
+        "type": "file_citation", "text": text, "start_index": start, "end_index": start + len(text),
+        "file_citation": {"file_id": file_id},
+    }
+
+
+def test_citations_become_footnotes_numbered_by_file():
+    value = "Withering attacks build initiative【4:0†source】. Decisive ones spend it【4:1†source】【4:2†source】."
+    annotations = [
+        citation(value, "【4:0†source】", "file-a"),
+        citation(value, "【4:1†source】", "file-b"),
+        citation(value, "【4:2†source】", "file-a"),
+    ]
+    text, citations = rewrite_annotations(value, annotations)
+
+    assert text == "Withering attacks build initiative[1]. Decisive ones spend it[2][1]."
+    assert [(c.number, c.file_id) for c in citations] == [(1, "file-a"), (2, "file-b")]
+
+
+def test_repeated_marker_is_not_repeated():
+    value = "Initiative【4:0†source】【4:1†source】."
+    annotations = [citation(value, "【4:0†source】", "file-a"), citation(value, "【4:1†source】", "file-a")]
+    assert rewrite_annotations(value, annotations)[0] == "Initiative[1]."
+
+
+def test_only_the_annotated_span_is_rewritten():
+    value = "[chart](sandbox:/mnt/data/chart.png) was saved as sandbox:/mnt/data/chart.png"
+    start = value.rindex("sandbox")
+    annotation = {
+        "type": "file_path", "text": "sandbox:/mnt/data/chart.png", "start_index": start,
+        "end_index": len(value), "file_path": {"file_id": "file-c"},
+    }
+    text, citations = rewrite_annotations(value, [annotation])
+
+    assert text == "[chart](sandbox:/mnt/data/chart.png) was saved as "
+    assert citations == []
+
+
+def test_span_not_matching_its_text_is_found_after_the_previous_one():
+    # e.g. indices counted in UTF-16 code units, where the emoji takes two
+    value = "😀 a【1】b【2】"
+    annotations = [
+        citation(value, "【1】", "file-a", start=value.index("【1】") + 1),
+        citation(value, "【2】", "file-b", start=value.index("【2】") + 1),
+    ]
+    assert rewrite_annotations(value, annotations)[0] == "😀 a[1]b[2]"
+
+
+def test_sources_footer_is_rendered():
+    value = "Initiative【4:0†source】 and motes【4:1†source】"
+    content = ContentText.from_api_output({
+        "value": value,
+        "annotations": [citation(value, "【4:0†source】", "file-a"), citation(value, "【4:1†source】", "file-b")],
+    })
+    content.citations[0].filename = "combat.pdf"
+
+    rendered = asyncio.run(content.render())
+
+    assert rendered[0].content == "Initiative[1] and motes[2]\n-# Sources: [1] combat.pdf, [2] file-b"
@@ -0,0 +1,96 @@
+import asyncio
+from types import SimpleNamespace
+
+from openai.types.beta.assistant import Assistant as OpenAIAssistant
+
+from src.models.assistant import Assistant
+from src.openai_api.assistant_catalog import AssistantCatalog
+
+
+def make_api_assistant(i):
+    return OpenAIAssistant(
+        id=f"asst_{i}", created_at=i, model="gpt-4", name=f"name {i}",
+        object="assistant", tools=[],
+    )
+
+
+class FakeAssistants:
+    def __init__(self, count):
+        # newest first, like order="desc"
+        self.data = [make_api_assistant(i) for i in reversed(range(count))]
+        self.list_calls = 0
+        self.retrieve_calls = 0
+
+    async def list(self, limit, order, after=None):
+        self.list_calls += 1
+        start = 0 if after is None else [a.id for a in self.data].index(after) + 1
+        return SimpleNamespace(data=self.data[start:start + limit])
+
+    async def retrieve(self, assistant_id):
+        self.retrieve_calls += 1
+        return next(a for a in self.data if a.id == assistant_id)
+
+
+def make_catalog(count):
+    assistants = FakeAssistants(count)
+    client = SimpleNamespace(beta=SimpleNamespace(assistants=assistants))
+    return AssistantCatalog(client=client, ttl=60, page_size=2), assistants
+
+
+def test_catalog_loads_every_page_once():
+    catalog, api = make_catalog(5)
+
+    async def main():
+        listed = await catalog.list()
+        await catalog.get("asst_3")
+        await catalog.get("asst_0")
+        return listed
+
+    listed = asyncio.run(main())
+    assert [a.id for a in listed] == ["asst_4", "asst_3", "asst_2", "asst_1", "asst_0"]
+    assert api.list_calls == 3
+    assert api.retrieve_calls == 0
+    assert catalog.stats()["hit_rate"] == 1
+
+
+def test_get_returns_a_copy_and_misses_fall_back_to_the_api():
+    catalog, api = make_catalog(2)
+
+    async def main():
+        await catalog.ensure_loaded()
+        api.data.insert(0, make_api_assistant(9))
+        assistant = await catalog.get("asst_9")
+        assistant.name = "changed"
+        return await catalog.get("asst_9")
+
+    assert asyncio.run(main()).name == "name 9"
+    assert api.retrieve_calls == 1
+    assert catalog.stats()["misses"] == 1
+
+
+def test_writes_during_a_refresh_are_kept():
+    catalog, api = make_catalog(3)
+    created = Assistant.from_api_output(make_api_assistant(7))
+    list_page = api.list
+
+    async def list_and_write(**kwargs):
+        page = await list_page(**kwargs)
+        catalog.put(created)
+        catalog.remove("asst_1")
+        return page
+
+    api.list = list_and_write
+    asyncio.run(catalog.refresh())
+    assert set(catalog.assistants) == {"asst_0", "asst_2", "asst_7"}
+
+
+def test_suggestions_rank_recently_used_assistants_higher():
+    catalog, _ = make_catalog(0)
+    for i, name in enumerate(["Python tutor", "Python reviewer", "Chef"]):
+        catalog.put(Assistant.from_api_output(make_api_assistant(i).model_copy(update={"name": name})))
+    catalog.loaded_at = 0
+
+    assert [a.id for a in catalog.suggest("pyth")] == ["asst_1", "asst_0"]
+    catalog.mark_used("asst_0")
+    assert [a.id for a in catalog.suggest("pyth")] == ["asst_0", "asst_1"]
+    assert [a.id for a in catalog.suggest("", limit=2)] == ["asst_0", "asst_2"]
@@ -0,0 +1,66 @@
+from src.models.assistant import Assistant
+from src.openai_api.assistant_search import AssistantIndex
+
+
+def make_assistant(id, name=None, description=None, instructions=None, created_at=0):
+    return Assistant.model_validate(
+        dict(id=id, name=name, description=description, instructions=instructions, created_at=created_at)
+    )
+
+
+def make_index():
+    index = AssistantIndex()
+    index.add(make_assistant("translator", "Translator", "Translates English to Japanese", created_at=1))
+    index.add(make_assistant("cook", "Chef", "Recipes and cooking", "Answer in English", created_at=2))
+    index.add(make_assistant("wiki", "ウィキペディア検索", None, None, created_at=3))
+    index.add(make_assistant("empty", None, None, None, created_at=4))
+    return index
+
+
+def test_search_ranks_name_matches_first():
+    index = make_index()
+    assert index.search("english") == ["translator", "cook"]
+    assert index.search("chef") == ["cook"]
+
+
+def test_search_is_case_insensitive_with_prefixes_and_substrings():
+    index = make_index()
+    assert index.search("TRANS") == ["translator"]
+    assert index.search("slat") == ["translator"]
+    assert index.search("ペディア") == ["wiki"]
+    assert index.search("recipes english") == ["cook"]
+    assert index.search("recipes japanese") == []
+
+
+def test_short_terms_match_substrings_of_the_name_and_description_only():
+    index = make_index()
+    assert index.search("検索") == ["wiki"]
+    assert index.search("ウ") == ["wiki"]
+    assert index.search("ok") == ["cook"]
+    # a whole word of the instructions is found, not the middle of one
+    assert index.search("in") == ["cook"]
+    assert index.search("sw") == []
+
+
+def test_search_limit_keeps_the_ranking_of_the_full_search():
+    index = AssistantIndex()
+    for i in range(50):
+        name = f"Helper {i}" if i % 3 else f"An helper {i}"
+        index.add(make_assistant(f"a{i}", name, "an assistant", created_at=i))
+    ranked = index.search("an")
+    assert len(ranked) == 50
+    for limit in (1, 10, 25):
+        assert index.search("an", limit=limit) == ranked[:limit]
+    assert index.search("an", limit=10, boost={"a0": 10.0}) == ["a0"] + index.search("an")[:9]
+    assert ranked[:2] == ["a48", "a45"]
+
+
+def test_index_updates_incrementally():
+    index = make_index()
+    index.add(make_assistant("cook", "Baker", "Bread"))
+    assert index.search("chef") == []
+    assert index.search("bread") == ["cook"]
+    index.remove("translator")
+    assert index.search("english") == []
+    assert "translates" not in index.vocabulary
+    assert len(index) == 3
@@ -0,0 +1,81 @@
+import asyncio
+from types import SimpleNamespace
+
+from openai.types.beta.assistant import Assistant as OpenAIAssistant
+
+from src.discord_cogs import _utils, chat
+from src.models.assistant import Assistant
+
+
+def make_assistant(i):
+    return Assistant.from_api_output(OpenAIAssistant(
+        id=f"asst_{i}", created_at=i, model="gpt-4", name=f"name {i}", object="assistant", tools=[],
+    ))
+
+
+class FakeCatalog:
+    def __init__(self, count=0, loaded=True):
+        self.assistants = {f"asst_{i}": make_assistant(i) for i in range(count)}
+        self.loaded = loaded
+        self.preloads = 0
+
+    def preload(self):
+        self.preloads += 1
+
+    def suggest(self, query, limit):
+        return list(self.assistants.values())[:limit]
+
+
+class FakeInteraction:
+    def __init__(self):
+        self.edits = 0
+        self.response = SimpleNamespace(edit_message=self.edit_message)
+
+    async def edit_message(self, view):
+        self.edits += 1
+
+
+def test_assistants_are_paged_with_previous_and_next(monkeypatch):
+    catalog = FakeCatalog(45)
+    del catalog.assistants["asst_3"]  # deleted since the menu was created
+    monkeypatch.setattr(chat, "assistant_catalog", catalog)
+    interaction = FakeInteraction()
+
+    async def main():
+        view = chat.SelectView(assistant_ids=[f"asst_{i}" for i in range(45)])
+        pages = [[option.value for option in view.selectMenu.options]]
+        assert view.previous.disabled and not view.next.disabled
+
+        await view.next.callback(interaction)
+        pages.append([option.value for option in view.selectMenu.options])
+        assert not view.previous.disabled and not view.next.disabled
+
+        await view.next.callback(interaction)
+        pages.append([option.value for option in view.selectMenu.options])
+        assert not view.previous.disabled and view.next.disabled
+
+        await view.previous.callback(interaction)
+        await view.previous.callback(interaction)
+        pages.append([option.value for option in view.selectMenu.options])
+        assert view.previous.disabled and not view.next.disabled
+        return pages
+
+    first, second, third, back = asyncio.run(main())
+    assert first == [f"asst_{i}" for i in range(21) if i != 3]
+    assert second == [f"asst_{i}" for i in range(21, 41)]
+    assert third == [f"asst_{i}" for i in range(41, 45)]
+    assert back == first
+    assert interaction.edits == 4
+
+
+def test_autocomplete_is_empty_until_the_catalog_is_loaded(monkeypatch):
+    catalog = FakeCatalog(3, loaded=False)
+    monkeypatch.setattr(_utils, "assistant_catalog", catalog)
+
+    assert asyncio.run(_utils.assistant_id_autocomplete(None, "name")) == []
+    assert catalog.preloads == 1
+
+    catalog.loaded = True
+    choices = asyncio.run(_utils.assistant_id_autocomplete(None, "name"))
+    assert [choice.value for choice in choices] == ["asst_0", "asst_1", "asst_2"]
+    assert choices[0].name == "name 0 [asst_0]"
@@ -0,0 +1,96 @@
+import asyncio
+import contextlib
+import io
+import time
+from types import SimpleNamespace
+
+from src.discord_cogs._attachments import AttachmentIngestion
+from src.openai_api.file_cache import FileUploadCache
+
+
+class FakeAttachment:
+    def __init__(self, filename, size=100, delay=0.0):
+        self.filename = filename
+        self.size = size
+        self.content_type = None
+        self.delay = delay
+        self.reads = 0
+
+    async def read(self):
+        self.reads += 1
+        await asyncio.sleep(self.delay)
+        return b"x" * self.size
+
+
+def make_ingestion(**kwargs):
+    uploads = []
+
+    async def upload(file, purpose="assistants"):
+        await asyncio.sleep(0.05)
+        uploads.append((file[0], purpose))
+        return f"{purpose}:{file[0]}"
+
+    return AttachmentIngestion(upload=upload, **kwargs), uploads
+
+
+def test_images_for_code_interpreter_are_read_once_and_uploaded_for_both():
+    ingestion, uploads = make_ingestion()
+    image = FakeAttachment("cat.PNG")
+    result = asyncio.run(ingestion.ingest([image, FakeAttachment("notes.md"), FakeAttachment("movie.mp4")]))
+
+    assert image.reads == 1
+    assert result.image_ids == ["vision:cat.PNG"]
+    assert result.attachments == [
+        {"file_id": "assistants:cat.PNG", "tools": [{"type": "code_interpreter"}]},
+        {"file_id": "assistants:notes.md", "tools": [{"type": "file_search"}, {"type": "code_interpreter"}]},
+    ]
+    assert result.rejected == ["movie.mp4: unsupported file type"]
+    assert len(uploads) == 3
+
+
+def test_limits_are_checked_before_reading():
+    ingestion, _ = make_ingestion(max_files=1, max_bytes=1000)
+    big = FakeAttachment("big.pdf", size=2000)
+    extra = FakeAttachment("b.txt")
+    result = asyncio.run(ingestion.ingest([big, FakeAttachment("a.txt"), extra]))
+
+    assert big.reads == 0 and extra.reads == 0
+    assert [a["file_id"] for a in result.attachments] == ["assistants:a.txt"]
+    assert len(result.rejected) == 2
+
+
+def test_files_are_ingested_concurrently():
+    ingestion, _ = make_ingestion(max_concurrency=10)
+    attachments = [FakeAttachment(f"{i}.txt", delay=0.05) for i in range(10)]
+    start = time.perf_counter()
+    result = asyncio.run(ingestion.ingest(attachments))
+    elapsed = time.perf_counter() - start
+
+    assert len(result.attachments) == 10
+    # about one file (0.1s), not the sum of all of them (1s)
+    assert elapsed < 0.5
+    assert ingestion.stats()["files"] == 10
+
+
+def test_spooled_images_are_uploaded_whole_for_both_purposes():
+    uploaded = []
+
+    async def create(file, purpose):
+        uploaded.append((file[1].read(), purpose))
+        return SimpleNamespace(id=f"file_{len(uploaded)}")
+
+    cache = FileUploadCache(client=SimpleNamespace(files=SimpleNamespace(create=create)), path=":memory:")
+    ingestion = AttachmentIngestion(upload=cache.upload, max_memory=10)
+
+    @contextlib.asynccontextmanager
+    async def open_spooled(attachment):
+        yield io.BytesIO(attachment.filename.encode() * 10)  # stands in for the temporary file
+
+    ingestion.open = open_spooled
+    first, second = FakeAttachment("a.png", size=100), FakeAttachment("b.png", size=100)
+    result = asyncio.run(ingestion.ingest([first]))
+    result_second = asyncio.run(ingestion.ingest([second]))
+
+    assert result.image_ids == ["file_1"] and result.attachments[0]["file_id"] == "file_2"
+    assert result_second.image_ids == ["file_3"] and result_second.attachments[0]["file_id"] == "file_4"
+    assert [content for content, _ in uploaded] == [b"a.png" * 10] * 2 + [b"b.png" * 10] * 2
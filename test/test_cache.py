@@ -0,0 +1,64 @@
+import time
+from types import SimpleNamespace
+
+from src.openai_api import functions
+from src.openai_api.cache import MISSING, SQLiteCache, TTLCache, TwoLevelCache
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is MISSING
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+def test_ttl_cache_expires_entries():
+    cache = TTLCache(maxsize=10, ttl=0.01)
+    cache.set("a", None)
+    assert cache.get("a") is None
+    time.sleep(0.02)
+    assert cache.get("a") is MISSING
+    assert len(cache) == 0
+
+
+def test_two_level_cache_promotes_disk_hits(tmp_path):
+    disk = SQLiteCache(str(tmp_path / "cache.db"), table="pages", ttl=60)
+    TwoLevelCache("pages", TTLCache(10, 60), disk).set("title", {"url": "https://example.org"})
+
+    cache = TwoLevelCache("pages", TTLCache(10, 60), SQLiteCache(str(tmp_path / "cache.db"), table="pages", ttl=60))
+    assert cache.get("title") == {"url": "https://example.org"}
+    assert cache.get("title") == {"url": "https://example.org"}
+    assert cache.get("other") is MISSING
+    assert cache.stats() == {"memory_hits": 1, "disk_hits": 1, "misses": 1, "size": 1}
+
+
+def test_short_ttl_entries_stay_in_memory_and_expire_first(tmp_path):
+    cache = TwoLevelCache("search", TTLCache(10, 60), SQLiteCache(str(tmp_path / "cache.db"), table="search", ttl=60))
+    cache.set("found", "Title")
+    cache.set("not found", None, ttl=0.01)
+    assert cache.disk.get("found") == "Title"
+    assert cache.disk.get("not found") is MISSING
+    time.sleep(0.02)
+    assert cache.get("found") == "Title"
+    assert cache.get("not found") is MISSING
+
+
+def test_wikipedia_searches_without_a_result_are_retried(tmp_path, monkeypatch):
+    results = [[], ["Tokyo"]]
+    client = SimpleNamespace(search=lambda query: results.pop(0))
+    monkeypatch.setattr(functions, "get_mediawiki_client", lambda: client)
+    monkeypatch.setattr(functions, "WIKIPEDIA_NEGATIVE_TTL_SECONDS", 0.01)
+    disk = SQLiteCache(str(tmp_path / "cache.db"), table="search", ttl=60)
+    monkeypatch.setattr(functions, "search_cache", TwoLevelCache("search", TTLCache(10, 60), disk))
+
+    assert functions.search_wikipedia_title("tokyo") is None
+    assert disk.get("tokyo") is MISSING
+    time.sleep(0.02)
+    assert functions.search_wikipedia_title("tokyo") == "Tokyo"
+    assert functions.search_wikipedia_title("tokyo") == "Tokyo"
+    assert results == []
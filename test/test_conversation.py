@@ -0,0 +1,46 @@
+import asyncio
+from types import SimpleNamespace
+
+from src.discord_cogs._conversation import Conversations
+
+
+def message(content, thread_id=1):
+    return SimpleNamespace(content=content, channel=SimpleNamespace(id=thread_id))
+
+
+def test_messages_are_coalesced_into_one_turn_per_burst():
+    turns = []
+
+    async def handle_turn(thread, messages):
+        turns.append([m.content for m in messages])
+        await asyncio.sleep(0.05)  # the run
+
+    async def main():
+        conversations = Conversations(handle_turn, debounce=0.02)
+        for content in ["a", "b"]:
+            conversations.post(message(content))
+        await asyncio.sleep(0.01)
+        conversations.post(message("c"))  # within the debounce window
+        await asyncio.sleep(0.04)
+        conversations.post(message("d"))  # while the run is in progress
+        conversations.post(message("e"))
+        conversations.post(message("x", thread_id=2))
+        await asyncio.sleep(0.2)
+        return conversations
+
+    conversations = asyncio.run(main())
+    assert sorted(turns) == [["a", "b", "c"], ["d", "e"], ["x"]]
+    assert conversations.stats()["busy"] == 0
+
+
+def test_idle_actor_stops():
+    async def handle_turn(thread, messages):
+        pass
+
+    async def main():
+        conversations = Conversations(handle_turn, debounce=0, idle_timeout=0.01)
+        conversations.post(message("a"))
+        await asyncio.sleep(0.1)
+        return conversations
+
+    assert asyncio.run(main()).actors == {}
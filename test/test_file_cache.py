@@ -0,0 +1,120 @@
+import asyncio
+import io
+from types import SimpleNamespace
+
+import httpx
+import openai
+
+from src.openai_api.file_cache import FileUploadCache, hash_file
+
+
+class FakeFiles:
+    def __init__(self):
+        self.created = []
+        self.deleted = set()
+        self.creating = 0
+        self.delay = 0.01
+
+    async def create(self, file, purpose):
+        self.creating += 1
+        await asyncio.sleep(self.delay)
+        self.created.append((file[0], purpose))
+        return SimpleNamespace(id=f"file_{len(self.created)}")
+
+    async def retrieve(self, file_id):
+        if file_id in self.deleted:
+            response = httpx.Response(404, request=httpx.Request("GET", "https://api.openai.com"))
+            raise openai.NotFoundError("not found", response=response, body=None)
+        return SimpleNamespace(id=file_id)
+
+
+def make_cache(**kwargs):
+    files = FakeFiles()
+    return FileUploadCache(client=SimpleNamespace(files=files), path=":memory:", **kwargs), files
+
+
+def test_same_content_is_uploaded_once_per_purpose():
+    cache, files = make_cache()
+
+    async def main():
+        first = await cache.upload(("a.pdf", b"rules"))
+        again = await cache.upload(("copy of a.pdf", b"rules"))
+        vision = await cache.upload(("a.pdf", b"rules"), purpose="vision")
+        return first, again, vision
+
+    first, again, vision = asyncio.run(main())
+    assert first == again != vision
+    assert len(files.created) == 2
+    assert cache.stats() == {"hits": 1, "misses": 2, "dead": 0, "bytes_saved": 5}
+
+
+def test_concurrent_uploads_of_the_same_content_share_one_upload():
+    cache, files = make_cache()
+
+    async def main():
+        return await asyncio.gather(*(cache.upload(("a.txt", b"same")) for _ in range(3)))
+
+    assert len(set(asyncio.run(main()))) == 1
+    assert len(files.created) == 1
+
+
+def test_waiters_upload_themselves_when_the_first_upload_is_cancelled():
+    cache, files = make_cache()
+    files.delay = 0.2
+
+    async def main():
+        first = asyncio.create_task(cache.upload(("a.txt", b"same")))
+        waiter = asyncio.create_task(cache.upload(("a.txt", b"same")))
+        while not files.creating:
+            await asyncio.sleep(0.001)
+        await asyncio.sleep(0.05)  # the waiter hashes the same content and waits on the first
+        first.cancel()
+        return await asyncio.wait_for(waiter, timeout=1), first.cancelled()
+
+    file_id, cancelled = asyncio.run(main())
+    assert cancelled
+    assert file_id == "file_1"
+    assert len(files.created) == 1
+    assert cache._in_flight == {}
+
+
+def test_deleted_files_are_uploaded_again():
+    cache, files = make_cache(check_interval=0)
+
+    async def main():
+        first = await cache.upload(("a.txt", b"content"))
+        files.deleted.add(first)
+        return first, await cache.upload(("a.txt", b"content"))
+
+    first, second = asyncio.run(main())
+    assert first != second
+    assert cache.stats()["dead"] == 1
+
+
+def test_file_object_is_hashed_from_the_start_and_rewound():
+    f = io.BytesIO(b"0123456789")
+    f.read()  # left at the end by a previous upload
+    assert hash_file(("a", f)) == hash_file(b"0123456789")
+    assert f.tell() == 0
+
+
+def test_file_object_uploaded_twice_keeps_its_content():
+    cache, files = make_cache()
+    uploaded = []
+
+    async def create(file, purpose):
+        uploaded.append(file[1].read())
+        return SimpleNamespace(id=f"file_{len(uploaded)}")
+
+    files.create = create
+
+    async def main():
+        ids = []
+        for content in [b"first large file", b"second large file"]:
+            f = io.BytesIO(content)
+            ids.append(await cache.upload(("a.png", f), purpose="vision"))
+            ids.append(await cache.upload(("a.png", f)))
+        return ids
+
+    assert asyncio.run(main()) == ["file_1", "file_2", "file_3", "file_4"]
+    assert uploaded == [b"first large file", b"first large file", b"second large file", b"second large file"]
@@ -0,0 +1,66 @@
+import asyncio
+import io
+
+from src.openai_api.file_downloads import FileDownloads
+
+
+def make_downloads(**kwargs):
+    downloaded = []
+    active = []
+    peak = [0]
+
+    async def download(file_id):
+        active.append(file_id)
+        peak[0] = max(peak[0], len(active))
+        await asyncio.sleep(0.02)
+        active.remove(file_id)
+        downloaded.append(file_id)
+        return io.BytesIO(file_id.encode() * 10)
+
+    return FileDownloads(download=download, **kwargs), downloaded, peak
+
+
+def test_files_are_downloaded_concurrently_once():
+    downloads, downloaded, peak = make_downloads(max_concurrency=2)
+
+    async def main():
+        files = await asyncio.gather(*(downloads.get(f"f{i % 3}") for i in range(6)))
+        again = await downloads.get("f0")
+        return [f.read() for f in files + [again]]
+
+    contents = asyncio.run(main())
+    assert contents[0] == contents[3] == contents[6] == b"f0" * 10
+    assert sorted(downloaded) == ["f0", "f1", "f2"]
+    assert peak[0] == 2
+    assert downloads.stats()["misses"] == 3
+
+
+def test_waiters_download_themselves_when_the_first_download_is_cancelled():
+    downloads, downloaded, _ = make_downloads()
+
+    async def main():
+        first = asyncio.create_task(downloads.get("f0"))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(downloads.get("f0"))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await asyncio.wait_for(waiter, timeout=1), first.cancelled()
+
+    file, cancelled = asyncio.run(main())
+    assert cancelled
+    assert file.read() == b"f0" * 10
+    assert downloaded == ["f0"]
+    assert downloads._in_flight == {}
+
+
+def test_cache_evicts_least_recently_used_files_over_the_memory_cap():
+    downloads, downloaded, _ = make_downloads(max_bytes=50)
+
+    async def main():
+        for file_id in ["a1", "b1", "a1", "c1", "a1", "b1"]:
+            await downloads.get(file_id)
+
+    asyncio.run(main())
+    # each file is 20 bytes, so the cache holds two of them
+    assert downloaded == ["a1", "b1", "c1", "b1"]
+    assert downloads.cached_bytes == 40
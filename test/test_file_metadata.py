@@ -0,0 +1,69 @@
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import openai
+
+from src.openai_api.file_metadata import FileMetadata
+
+
+class FakeFiles:
+    def __init__(self, missing=()):
+        self.missing = set(missing)
+        self.calls = []
+
+    async def retrieve(self, file_id):
+        self.calls.append(file_id)
+        await asyncio.sleep(0.01)
+        if file_id in self.missing:
+            request = httpx.Request("GET", f"https://api.openai.com/v1/files/{file_id}")
+            raise openai.NotFoundError("not found", response=httpx.Response(404, request=request), body=None)
+        return SimpleNamespace(id=file_id, filename=f"{file_id}.pdf")
+
+
+def test_files_are_retrieved_once_concurrently():
+    files = FakeFiles()
+    metadata = FileMetadata(client=SimpleNamespace(files=files))
+
+    async def main():
+        filenames = await metadata.filenames(["file-a", "file-b", "file-a"])
+        again = await metadata.filenames(["file-b"])
+        return filenames, again
+
+    filenames, again = asyncio.run(main())
+
+    assert filenames == {"file-a": "file-a.pdf", "file-b": "file-b.pdf"}
+    assert again == {"file-b": "file-b.pdf"}
+    assert sorted(files.calls) == ["file-a", "file-b"]
+
+
+def test_waiters_retrieve_themselves_when_the_first_retrieval_is_cancelled():
+    files = FakeFiles()
+    metadata = FileMetadata(client=SimpleNamespace(files=files))
+
+    async def main():
+        first = asyncio.create_task(metadata.filename("file-a"))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(metadata.filename("file-a"))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await asyncio.wait_for(waiter, timeout=1), first.cancelled()
+
+    filename, cancelled = asyncio.run(main())
+    assert cancelled
+    assert filename == "file-a.pdf"
+    assert files.calls == ["file-a", "file-a"]
+    assert metadata._in_flight == {}
+
+
+def test_missing_file_has_no_filename_and_is_retried():
+    files = FakeFiles(missing=["file-gone"])
+    metadata = FileMetadata(client=SimpleNamespace(files=files))
+
+    async def main():
+        return await asyncio.gather(metadata.filename("file-gone"), metadata.filename("file-gone"))
+
+    assert asyncio.run(main()) == [None, None]
+    assert asyncio.run(metadata.filename("file-gone")) is None
+    assert files.calls == ["file-gone", "file-gone"]
+    assert metadata.stats()["failures"] == 2
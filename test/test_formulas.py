@@ -0,0 +1,60 @@
+import random
+import re
+
+import pytest
+
+from src.models.message import rewrite_formulas
+
+
+def old_rewrite_formulas(text: str) -> str:
+    """The two passes of ContentText.render before rewrite_formulas"""
+    display_pattern = r'\\\[([\w\s\^_.,=+\-*/{}\[\]()<>!&#:;\|\'\\]+?)\\\]'
+    text = re.sub(
+        display_pattern,
+        lambda match: '$$' + match.group(1).replace('\n', '').replace('\t', '').replace('\\\\', '\\\\\\\\') + '$$',
+        text, flags=re.DOTALL
+    )
+    inline_pattern = r'\\\(([\w\s\^_.,=+\-*/{}\[\]()<>!&#:;\|\'\\]+?)\\\)'
+    return re.sub(
+        inline_pattern,
+        lambda match: '$' + match.group(1).replace('\n', '').replace('\t', '').replace('\\\\', '\\\\\\\\') + '$',
+        text, flags=re.DOTALL
+    )
+
+
+PIECES = [
+    "The area is ", r"\(\pi r^2\)", " and\n", "\\[\n  E = mc^2 \\\\\n\tF = ma\n\\]", " so ",
+    r"\(a_{i} + b\)", r"\[x\]", "(not math)", "[1]", "\\ ", "\n\n", "price $5", r"\(x < \$\)",
+]
+
+
+@pytest.mark.parametrize("seed", range(100))
+def test_same_as_before_for_formulas_outside_of_code(seed):
+    rng = random.Random(seed)
+    text = "".join(rng.choice(PIECES) for _ in range(rng.randint(0, 40)))
+    assert rewrite_formulas(text) == old_rewrite_formulas(text)
+
+
+def test_display_and_inline_formulas():
+    text = "Area \\(\\pi r^2\\) and\n\\[\n\tE = mc^2 \\\\ F = ma\n\\]"
+    assert rewrite_formulas(text) == "Area $\\pi r^2$ and\n$$E = mc^2 \\\\\\\\ F = ma$$"
+
+
+def test_code_is_kept():
+    text = "```latex\n\\(x\\) and \\[y\\]\n```\nuse `\\(z\\)` for \\(w\\)"
+    assert rewrite_formulas(text) == "```latex\n\\(x\\) and \\[y\\]\n```\nuse `\\(z\\)` for $w$"
+
+
+def test_unterminated_code_block_is_kept():
+    text = "\\(a\\)\n```\n\\(b\\)"
+    assert rewrite_formulas(text) == "$a$\n```\n\\(b\\)"
+
+
+def test_text_without_formulas_is_returned_as_is():
+    text = "no math here, only `code` and (brackets)"
+    assert rewrite_formulas(text) is text
+
+
+def test_inline_code_does_not_span_lines():
+    text = "a lone ` backtick\n\\(x\\) then `\\(y\\)`"
+    assert rewrite_formulas(text) == "a lone ` backtick\n$x$ then `\\(y\\)`"
@@ -0,0 +1,79 @@
+import random
+import re
+
+import pytest
+
+from src.discord_cogs._utils import iter_message_chunks, split_into_shorter_messages
+
+LANGUAGES = ["", "python", "js", "md"]
+OPENING_FENCE_RE = re.compile(r"^ {0,3}(`{3,})\w*$")
+
+
+def random_text(rng: random.Random, limit: int) -> str:
+    """Prose, long unbroken words, code blocks with languages, nested fences and inline code"""
+    parts = []
+    for _ in range(rng.randint(1, 30)):
+        kind = rng.random()
+        if kind < 0.4:
+            parts.append(" ".join(rng.choice(["lorem", "ipsum", "dolor", "sit", "amet"]) for _ in range(rng.randint(1, 60))))
+        elif kind < 0.5:
+            parts.append("x" * rng.randint(1, 3 * limit))
+        elif kind < 0.6:
+            parts.append("use ```inline``` code")
+        elif kind < 0.9:
+            body = "\n".join(f"line_{i} = {'y' * rng.randint(0, limit // 2)}" for i in range(rng.randint(0, 40)))
+            parts.append(f"```{rng.choice(LANGUAGES)}\n{body}\n```")
+        else:
+            parts.append(f"````md\n```python\nprint(1)\n```\n{'z ' * rng.randint(0, limit)}\n````")
+    return rng.choice(["\n", "\n\n", " "]).join(parts)
+
+
+def content(text: str) -> str:
+    """The text without backticks, languages and whitespace, which the splitter adds around cuts"""
+    return re.sub("|".join(["`", r"\s", *filter(None, LANGUAGES)]), "", text)
+
+
+def open_fence_at_end(chunk: str) -> str | None:
+    fence = None
+    for line in chunk.split("\n"):
+        stripped = line.strip()
+        if fence is None:
+            match = OPENING_FENCE_RE.match(line)
+            fence = match and match.group(1)
+        elif stripped and stripped.strip("`") == "" and len(stripped) >= len(fence):
+            fence = None
+    return fence
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_random_texts(seed):
+    rng = random.Random(seed)
+    limit = rng.choice([40, 100, 2000])
+    text = random_text(rng, limit)
+    chunks = split_into_shorter_messages(text, limit)
+
+    # every chunk fits and has something to show
+    assert all(0 < len(chunk) <= limit and chunk.strip() for chunk in chunks)
+    # nothing is lost or added besides fences and whitespace
+    assert content("\n".join(chunks)) == content(text)
+    # every chunk closes the code blocks it opens
+    assert all(open_fence_at_end(chunk) is None for chunk in chunks)
+
+
+def test_split_code_block_is_reopened_with_its_language():
+    text = "```python\n" + "\n".join(f"x = {i}" for i in range(10)) + "\n```"
+    chunks = split_into_shorter_messages(text, 40)
+
+    assert len(chunks) > 1
+    assert all(chunk.startswith("```python\n") and chunk.endswith("\n```") for chunk in chunks)
+
+
+def test_nested_fences_and_inline_code_do_not_toggle_code_blocks():
+    text = "````md\n```python\ncode\n```\n````\nuse ```x``` here"
+    assert split_into_shorter_messages(text, 2000) == [text]
+
+
+def test_unbroken_text_is_cut_at_the_limit_lazily():
+    chunks = iter_message_chunks("a" * 10_000_000, 2000)
+    assert next(chunks) == "a" * 2000
+    assert sum(1 for _ in chunks) == 4999
@@ -0,0 +1,144 @@
+import asyncio
+import io
+
+import discord
+
+from src.discord_cogs._outbound import ReplySender, pack_reply
+from src.discord_cogs._streaming import StreamingReply
+from src.discord_cogs._utils import split_into_shorter_messages
+
+
+def image(i):
+    return discord.File(io.BytesIO(b"png"), filename=f"output_{i}.png")
+
+
+def prose(size):
+    return ("lorem ipsum " * (size // 12 + 1))[:size]
+
+
+class FakeMessage:
+    def __init__(self, content):
+        self.content = content
+        self.embeds = []
+        self.attachments = []
+        self.deleted = False
+
+    async def edit(self, content, embeds=None, attachments=None):
+        self.content = content
+        self.embeds = embeds or []
+        self.attachments = attachments or []
+
+    async def delete(self):
+        self.deleted = True
+
+
+class FakeThread:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, content=None, **kwargs):
+        self.sent.append(dict(kwargs, content=content))
+        return FakeMessage(content)
+
+
+def test_text_is_folded_into_embeds():
+    text = prose(7900)
+    messages = pack_reply(text, [], limit=2000, attachment_chars=16000)
+
+    assert len(messages) == 1
+    assert len(messages[0].content) <= 2000
+    assert len(messages[0].embeds) == 3
+    assert sum(len(embed.description) for embed in messages[0].embeds) <= 6000
+    chunks = [messages[0].content] + [embed.description for embed in messages[0].embeds]
+    assert chunks == split_into_shorter_messages(text, 2000)
+
+
+def test_files_go_with_the_text_ten_per_message():
+    messages = pack_reply("chart", [image(i) for i in range(12)], limit=2000, attachment_chars=16000)
+
+    assert [message.content for message in messages] == ["chart", None]
+    assert [len(message.files) for message in messages] == [10, 2]
+
+
+def test_long_reply_is_sent_as_a_file():
+    text = prose(20000)
+    messages = pack_reply(text, [image(0)], limit=2000, attachment_chars=16000)
+
+    assert len(messages) == 1
+    assert messages[0].content == split_into_shorter_messages(text, 2000)[0]
+    assert messages[0].embeds == []
+    assert [file.filename for file in messages[0].files] == ["reply.md", "output_0.png"]
+    assert messages[0].files[0].fp.read().decode() == text
+
+
+def test_sends_per_reply_are_counted():
+    sender = ReplySender()
+    thread = FakeThread()
+
+    asyncio.run(sender.send(thread, prose(7900), [image(i) for i in range(3)]))
+    asyncio.run(sender.send(thread, "", [image(0)]))
+
+    assert len(thread.sent) == 2
+    assert sender.stats() == {"replies": 2, "sends": 2, "sends_per_reply": "1.00", "max_sends": 1, "as_file": 0}
+
+
+def test_streamed_reply_gets_the_files_without_another_send():
+    sender = ReplySender()
+    thread = FakeThread()
+
+    async def main():
+        streamed = StreamingReply(thread)
+        await streamed.start()
+        await sender.send(thread, "the charts", [image(i) for i in range(3)], streamed)
+        return streamed
+
+    streamed = asyncio.run(main())
+
+    assert streamed.messages[0].content == "the charts"
+    filenames = [file.filename for file in streamed.messages[0].attachments]
+    assert filenames == ["output_0.png", "output_1.png", "output_2.png"]
+    assert len(thread.sent) == 1
+    assert sender.stats()["sends"] == 1
+
+
+def test_long_streamed_reply_is_edited_into_a_preview_with_the_file():
+    sender = ReplySender()
+    thread = FakeThread()
+    text = prose(20000)
+
+    async def main():
+        streamed = StreamingReply(thread)
+        await streamed.start()
+        await streamed.show(split_into_shorter_messages(text))
+        last = await sender.send(thread, text, [image(0)], streamed)
+        return streamed, last
+
+    streamed, last = asyncio.run(main())
+
+    first = streamed.messages[0]
+    assert streamed.messages == [first] and last is first
+    assert first.content == split_into_shorter_messages(text)[0]
+    assert [file.filename for file in first.attachments] == ["reply.md", "output_0.png"]
+    # only the streamed messages were ever sent
+    assert len(thread.sent) == len(split_into_shorter_messages(text))
+    assert sender.stats() == {"replies": 1, "sends": 1, "sends_per_reply": "1.00", "max_sends": 1, "as_file": 1}
+
+
+def test_streamed_text_overflow_is_folded_into_embeds():
+    sender = ReplySender()
+    thread = FakeThread()
+    text = prose(5000)
+
+    async def main():
+        streamed = StreamingReply(thread)
+        await streamed.start()
+        await streamed.show(split_into_shorter_messages(text))
+        await sender.send(thread, text, [], streamed)
+        return streamed
+
+    streamed = asyncio.run(main())
+
+    chunks = split_into_shorter_messages(text)
+    assert len(streamed.messages) == 1
+    assert streamed.messages[0].content == chunks[0]
+    assert [embed.description for embed in streamed.messages[0].embeds] == chunks[1:]
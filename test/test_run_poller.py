@@ -0,0 +1,69 @@
+import asyncio
+from types import SimpleNamespace
+
+from src.openai_api.run_poller import RunPoller
+
+
+class FakeRuns:
+    def __init__(self, statuses: dict[str, list[str]]):
+        self.statuses = statuses
+        self.calls = []
+
+    async def retrieve(self, thread_id, run_id):
+        self.calls.append(run_id)
+        statuses = self.statuses[run_id]
+        status = statuses.pop(0) if len(statuses) > 1 else statuses[0]
+        return SimpleNamespace(id=run_id, status=status)
+
+
+def make_poller(statuses):
+    runs = FakeRuns(statuses)
+    client = SimpleNamespace(beta=SimpleNamespace(threads=SimpleNamespace(runs=runs)))
+    poller = RunPoller(client=client, initial_interval=0.01, max_interval=0.05, jitter=0.1)
+    return poller, runs
+
+
+def test_wait_returns_terminal_run():
+    poller, runs = make_poller({"run_a": ["queued", "in_progress", "completed"]})
+
+    async def main():
+        return await poller.wait("thread", "run_a")
+
+    run = asyncio.run(main())
+    assert run.status == "completed"
+    assert runs.calls == ["run_a"] * 3
+    assert poller.in_flight == 0
+    assert list(poller.finished) == [("run_a", 3)]
+
+
+def test_wakes_on_requires_action_and_polls_runs_independently():
+    poller, runs = make_poller({
+        "run_a": ["in_progress"] * 5 + ["completed"],
+        "run_b": ["requires_action"],
+    })
+
+    async def main():
+        task_a = asyncio.create_task(poller.wait("thread_a", "run_a"))
+        run_b = await poller.wait("thread_b", "run_b")
+        assert poller.in_flight == 1
+        return await task_a, run_b
+
+    run_a, run_b = asyncio.run(main())
+    assert run_a.status == "completed"
+    assert run_b.status == "requires_action"
+    assert runs.calls.count("run_b") == 1
+    assert runs.calls.count("run_a") == 6
+
+
+def test_cancelled_waiter_is_unregistered():
+    poller, _ = make_poller({"run_a": ["in_progress"]})
+
+    async def main():
+        task = asyncio.create_task(poller.wait("thread", "run_a"))
+        await asyncio.sleep(0.03)
+        assert poller.poll_counts()["run_a"] >= 1
+        task.cancel()
+        await asyncio.sleep(0)
+        return poller.in_flight
+
+    assert asyncio.run(main()) == 0
@@ -0,0 +1,146 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from src.openai_api.run_supervisor import RunCancelled, RunSupervisor
+
+
+class FakeRuns:
+    def __init__(self):
+        self.cancelled = []
+
+    async def cancel(self, thread_id, run_id):
+        self.cancelled.append(run_id)
+        return SimpleNamespace(id=run_id, status="cancelled")
+
+
+def make_supervisor():
+    runs = FakeRuns()
+    client = SimpleNamespace(beta=SimpleNamespace(threads=SimpleNamespace(runs=runs)))
+    return RunSupervisor(client=client), runs
+
+
+async def drive_run(supervised, seconds):
+    supervised.run_id = "run_a"
+    await asyncio.sleep(seconds)
+    return "done"
+
+
+def test_run_returns_result_within_budget():
+    supervisor, runs = make_supervisor()
+
+    async def main():
+        supervised = supervisor.track("thread_a", "asst", budget=1)
+        return await supervisor.run(supervised, drive_run(supervised, 0))
+
+    assert asyncio.run(main()) == "done"
+    assert runs.cancelled == []
+
+
+def test_run_is_cancelled_when_budget_is_exceeded():
+    supervisor, runs = make_supervisor()
+
+    async def main():
+        supervised = supervisor.track("thread_a", "asst", budget=0.05)
+        await supervisor.run(supervised, drive_run(supervised, 1))
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(main())
+    assert runs.cancelled == ["run_a"]
+    assert supervisor.stats()["timed_out"] == 1
+
+
+def test_superseded_run_is_cancelled_and_released():
+    supervisor, runs = make_supervisor()
+    supervisor.completed, supervisor.total_seconds, supervisor.total_completion_tokens = 1, 10.0, 100
+
+    async def main():
+        supervised = supervisor.track("thread_a", "asst", budget=60)
+        task = asyncio.create_task(supervisor.run(supervised, drive_run(supervised, 60)))
+        await asyncio.sleep(0.01)
+        await supervisor.supersede("thread_a")
+        with pytest.raises(RunCancelled):
+            await task
+        return supervised
+
+    supervised = asyncio.run(main())
+    assert supervised.superseded
+    assert runs.cancelled == ["run_a"]
+    stats = supervisor.stats()
+    assert stats["superseded"] == 1
+    assert stats["saved_seconds"] == 10
+    assert stats["saved_tokens"] == 100
+
+
+def test_run_on_a_new_thread_is_registered_once_created():
+    supervisor, _ = make_supervisor()
+    supervised = supervisor.track(None, "asst", budget=1)
+    assert supervisor.list_runs() == []
+    supervisor.attach(supervised, "thread_new", "run_a")
+    assert supervisor.find("thread_new") is supervised
+    supervisor.untrack(supervised)
+    assert supervisor.list_runs() == []
+
+
+def test_run_cancelled_while_being_created_is_cancelled_once_it_has_an_id():
+    supervisor, runs = make_supervisor()
+
+    async def create_run(supervised):
+        await asyncio.sleep(0.05)  # the create request
+        supervisor.attach(supervised, "thread_new", "run_a")
+        await asyncio.sleep(60)
+
+    async def main():
+        supervised = supervisor.track(None, "asst", budget=60)
+        task = asyncio.create_task(supervisor.run(supervised, create_run(supervised)))
+        await asyncio.sleep(0.01)
+        cancel = asyncio.create_task(supervisor.cancel(supervised, reason="killed by an admin"))
+        await asyncio.sleep(0.01)
+        assert not supervised.settled.is_set() and runs.cancelled == []
+        with pytest.raises(RunCancelled):
+            await task
+        return await cancel, supervised
+
+    cancelled, supervised = asyncio.run(main())
+    assert cancelled
+    assert supervised.settled.is_set()
+    assert runs.cancelled == ["run_a"]
+
+
+def test_run_timed_out_before_it_was_created_is_cancelled_once_created():
+    supervisor, runs = make_supervisor()
+
+    async def create_run(supervised):
+        await asyncio.sleep(0.1)  # a slow create request
+        supervisor.attach(supervised, "thread_a", "run_a")
+        await asyncio.sleep(60)
+
+    async def main():
+        supervised = supervisor.track("thread_a", "asst", budget=0.05)
+        with pytest.raises(asyncio.TimeoutError):
+            await supervisor.run(supervised, create_run(supervised))
+        return supervised
+
+    supervised = asyncio.run(main())
+    assert supervised.settled.is_set()
+    assert supervised.task.cancelled()
+    assert runs.cancelled == ["run_a"]
+
+
+def test_run_that_fails_to_be_created_settles_its_cancellation():
+    supervisor, runs = make_supervisor()
+
+    async def create_run(supervised):
+        await asyncio.sleep(0.1)
+        raise RuntimeError("the create request failed")
+
+    async def main():
+        supervised = supervisor.track("thread_a", "asst", budget=0.05)
+        with pytest.raises(asyncio.TimeoutError):
+            await supervisor.run(supervised, create_run(supervised))
+        return supervised
+
+    supervised = asyncio.run(main())
+    assert supervised.settled.is_set()
+    assert runs.cancelled == []
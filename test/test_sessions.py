@@ -0,0 +1,105 @@
+import asyncio
+from types import SimpleNamespace
+
+import discord
+
+from src.discord_cogs import chat
+from src.discord_cogs._sessions import ChatSession, SessionStore
+
+
+def test_sessions_are_written_through(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    store = SessionStore(path)
+    store.put(ChatSession(discord_thread_id=1, openai_thread_id="thread_a", owner_id=10))
+    assert store.update(1, assistant_id="asst_a").assistant_id == "asst_a"
+    assert store.update(2, assistant_id="asst_b") is None
+
+    session = SessionStore(path).get(1)
+    assert (session.openai_thread_id, session.assistant_id, session.owner_id) == ("thread_a", "asst_a", 10)
+    assert SessionStore(path).get(2) is None
+
+
+def test_sessions_are_reloaded_after_a_restart(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    store = SessionStore(path)
+    store.put(ChatSession(discord_thread_id=1, openai_thread_id="thread_a", assistant_id="asst_a", created_at=100.0))
+    store.close()
+
+    session = SessionStore(path).get(1)
+    assert session == ChatSession(
+        discord_thread_id=1,
+        openai_thread_id="thread_a",
+        assistant_id="asst_a",
+        created_at=100.0,
+        last_activity=session.last_activity,
+    )
+
+
+def test_last_activity_is_written_in_batches(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    store = SessionStore(path, flush_interval=60)
+    store.put(ChatSession(discord_thread_id=1, last_activity=1.0))
+    store.put(ChatSession(discord_thread_id=2, last_activity=1.0))
+    store.touch(1)
+    store.touch(2)
+
+    assert store.get(1).last_activity > 1.0
+    assert SessionStore(path).get(1).last_activity == 1.0
+
+    store.close()
+    reloaded = SessionStore(path)
+    assert reloaded.get(1).last_activity == store.get(1).last_activity
+    assert reloaded.get(2).last_activity == store.get(2).last_activity
+
+
+def test_touch_flushes_once_the_interval_has_passed(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    store = SessionStore(path, flush_interval=0)
+    store.put(ChatSession(discord_thread_id=1, last_activity=1.0))
+    store.touch(1)
+
+    assert SessionStore(path).get(1).last_activity == store.get(1).last_activity
+
+
+def test_missing_sessions_are_not_created(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    store = SessionStore(path, flush_interval=0)
+    store.touch(3)
+    store.close()
+
+    reloaded = SessionStore(path)
+    assert reloaded.get(3) is None
+    assert reloaded.update(3, assistant_id="asst_a") is None
+    assert reloaded.get(3) is None
+
+
+class FakeStarterMessage:
+    def __init__(self, embed):
+        self.embeds = [embed]
+        self.interaction = None
+
+    async def edit(self, embed):
+        self.embeds = [embed]
+
+
+def test_thread_created_with_the_first_run_is_stored_in_the_starter_embed(tmp_path, monkeypatch):
+    monkeypatch.setattr(chat, "sessions", SessionStore(str(tmp_path / "sessions.db")))
+    embed = discord.Embed(description="<@1> wants to chat!")
+    embed.add_field(name="thread_id", value="Not created")
+    embed.add_field(name="assistant_id", value="asst_a")
+    embed.add_field(name="name", value="Helper")
+    starter_message = FakeStarterMessage(embed)
+
+    async def fetch_message(id):
+        return starter_message
+
+    thread = SimpleNamespace(id=1, created_at=None, parent=SimpleNamespace(fetch_message=fetch_message))
+
+    async def main():
+        await chat.store_thread_id_in_starter_message(thread, "thread_new")
+        # the session store lost the session
+        return await chat.load_session_from_starter_message(thread)
+
+    session = asyncio.run(main())
+    assert starter_message.embeds[0].fields[0].value == "thread_new"
+    assert (session.openai_thread_id, session.assistant_id) == ("thread_new", "asst_a")
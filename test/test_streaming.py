@@ -0,0 +1,212 @@
+import asyncio
+from types import SimpleNamespace
+
+import discord
+from openai.types.beta.threads import Message as OpenAIThreadMessage
+
+from src.constants import STREAM_PLACEHOLDER_TEXT
+from src.discord_cogs._outbound import OutboundMessage
+from src.discord_cogs._streaming import StreamingReply
+from src.models.api_response import ResponseStatus
+from src.models.message import MessageCreate
+from src.openai_api import thread_messages
+
+
+def not_found():
+    return discord.NotFound(SimpleNamespace(status=404, reason="Not Found"), "Unknown Message")
+
+
+class FakeMessage:
+    def __init__(self, content, fail_delete=False):
+        self.id = id(self)
+        self.content = content
+        self.edits = 0
+        self.deleted = False
+        self.fail_delete = fail_delete
+
+    async def edit(self, content, embeds=None, attachments=None):
+        if self.fail_delete:
+            raise not_found()
+        self.content = content
+        self.edits += 1
+
+    async def delete(self):
+        if self.fail_delete:
+            raise not_found()
+        self.deleted = True
+
+
+class FakeThread:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, content=None, **kwargs):
+        message = FakeMessage(content)
+        self.sent.append(message)
+        return message
+
+
+def test_deltas_are_shown_at_most_once_per_edit_interval():
+    thread = FakeThread()
+    reply = StreamingReply(thread, edit_interval=60)
+
+    async def main():
+        await reply.start()
+        await reply.on_text_delta("Hello")
+        await reply.on_text_delta(" world")
+        assert thread.sent[0].content == STREAM_PLACEHOLDER_TEXT
+        reply.edit_interval = 0
+        await reply.on_text_delta("!")
+
+    asyncio.run(main())
+    assert reply.text == "Hello world!"
+    assert [message.content for message in thread.sent] == ["Hello world!"]
+    assert thread.sent[0].edits == 1
+
+
+def test_show_edits_only_the_changed_messages_and_sends_new_ones():
+    thread = FakeThread()
+    reply = StreamingReply(thread)
+
+    async def main():
+        await reply.start()
+        await reply.show(["one", "two"])
+        await reply.show(["one", "two!", "three", "  "])
+
+    asyncio.run(main())
+    assert [message.content for message in thread.sent] == ["one", "two!", "three"]
+    assert [message.edits for message in thread.sent] == [1, 1, 0]
+    assert reply.messages == thread.sent
+
+
+def test_finalize_deletes_the_messages_no_longer_needed():
+    thread = FakeThread()
+    reply = StreamingReply(thread)
+
+    async def main():
+        await reply.start()
+        await reply.show(["one", "two", "three"])
+        await reply.finalize([OutboundMessage(content="all in one")])
+
+    asyncio.run(main())
+    assert thread.sent[0].content == "all in one"
+    assert [message.deleted for message in thread.sent] == [False, True, True]
+    assert reply.messages == thread.sent[:1]
+
+
+def test_finalize_survives_messages_deleted_by_someone_else():
+    thread = FakeThread()
+    reply = StreamingReply(thread)
+
+    async def main():
+        await reply.start()
+        await reply.show(["one", "two", "three"])
+        thread.sent[0].fail_delete = True
+        thread.sent[2].fail_delete = True
+        await reply.finalize([OutboundMessage(content="all"), OutboundMessage(content="in two")])
+
+    asyncio.run(main())
+    assert [message.content for message in reply.messages] == ["all", "in two"]
+    assert reply.messages == [thread.sent[3], thread.sent[1]]
+
+
+def test_discard_deletes_every_message_even_if_one_is_gone():
+    thread = FakeThread()
+    reply = StreamingReply(thread)
+
+    async def main():
+        await reply.start()
+        await reply.show(["one", "two"])
+        thread.sent[0].fail_delete = True
+        await reply.discard()
+
+    asyncio.run(main())
+    assert [message.deleted for message in thread.sent] == [False, True]
+    assert reply.messages == []
+
+
+def event(name, data):
+    return SimpleNamespace(event=name, data=data)
+
+
+def make_api_message(text):
+    return OpenAIThreadMessage.model_validate({
+        "id": "msg_1", "object": "thread.message", "created_at": 0, "thread_id": "thread_a",
+        "role": "assistant", "status": "completed", "attachments": None, "metadata": None,
+        "content": [{"type": "text", "text": {"value": text, "annotations": []}}],
+        "assistant_id": "asst", "run_id": "run_1",
+        "completed_at": None, "incomplete_at": None, "incomplete_details": None,
+    })
+
+
+class FakeStream:
+    def __init__(self, events):
+        self.events = events
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def __aiter__(self):
+        for event in self.events:
+            yield event
+
+
+class FakeRuns:
+    def __init__(self):
+        self.submitted = []
+
+    async def create(self, thread_id, assistant_id, additional_messages, stream):
+        assert stream
+        run = SimpleNamespace(
+            id="run_1",
+            thread_id=thread_id,
+            status="requires_action",
+            required_action=SimpleNamespace(submit_tool_outputs=SimpleNamespace(tool_calls=["call_1"])),
+        )
+        return FakeStream([
+            event("thread.run.created", SimpleNamespace(id="run_1", thread_id=thread_id)),
+            event("thread.message.delta", SimpleNamespace(delta=SimpleNamespace(content=[
+                SimpleNamespace(type="text", text=SimpleNamespace(value="Let me look")),
+            ]))),
+            event("thread.run.requires_action", run),
+        ])
+
+    async def submit_tool_outputs(self, thread_id, run_id, tool_outputs, stream):
+        self.submitted.append((run_id, tool_outputs))
+        return FakeStream([
+            event("thread.message.delta", SimpleNamespace(delta=SimpleNamespace(content=[
+                SimpleNamespace(type="text", text=SimpleNamespace(value=" it up.")),
+            ]))),
+            event("thread.message.completed", make_api_message("Let me look it up.")),
+            event("thread.run.completed", SimpleNamespace(usage=None)),
+        ])
+
+
+def test_streamed_run_passes_deltas_and_answers_tool_calls(monkeypatch):
+    runs = FakeRuns()
+    monkeypatch.setattr(
+        thread_messages, "client", SimpleNamespace(beta=SimpleNamespace(threads=SimpleNamespace(runs=runs)))
+    )
+
+    async def get_function_tool_outputs(tool_calls):
+        return [{"tool_call_id": tool_call, "output": "found"} for tool_call in tool_calls]
+
+    monkeypatch.setattr(thread_messages, "get_function_tool_outputs", get_function_tool_outputs)
+    deltas = []
+
+    async def on_text_delta(delta):
+        deltas.append(delta)
+
+    new_message = MessageCreate.from_discord_messages(thread_id="thread_a", messages=[("alice", "hi")], image_ids=[])
+    response = asyncio.run(
+        thread_messages.stream_assistant_message_in_thread("thread_a", "asst", new_message, on_text_delta)
+    )
+
+    assert response.status is ResponseStatus.OK
+    assert response.thread_id == "thread_a"
+    assert response.message.content[0].value == "Let me look it up."
+    assert deltas == ["Let me look", " it up."]
+    assert runs.submitted == [("run_1", [{"tool_call_id": "call_1", "output": "found"}])]
@@ -0,0 +1,51 @@
+from src.openai_api.text_ranking import (
+    select_relevant_chunks,
+    split_into_chunks,
+    split_into_sections,
+    tokenize,
+)
+
+ARTICLE = """Exalted is a tabletop role-playing game.
+
+== History ==
+The first edition was published in 2001.
+
+== Rules ==
+Dice pools are made of d10s.
+
+=== Combat ===
+A decisive attack deals damage based on initiative.
+A withering attack steals initiative from the target.
+
+== Reception ==
+The game was well received.
+"""
+
+
+def test_tokenize_splits_cjk_into_bigrams():
+    assert tokenize("Decisive 攻撃ロール") == ["decisive", "攻撃", "撃ロ", "ロー", "ール"]
+
+
+def test_split_into_sections_keeps_heading_path():
+    sections = split_into_sections(ARTICLE)
+    assert [heading for heading, _ in sections] == ["", "History", "Rules", "Rules > Combat", "Reception"]
+
+
+def test_chunks_respect_max_chars_and_sections():
+    chunks = split_into_chunks(ARTICLE, max_chars=60)
+    assert all(len(chunk.text) <= 60 for chunk in chunks)
+    combat = [chunk for chunk in chunks if chunk.heading == "Rules > Combat"]
+    assert len(combat) == 2
+
+
+def test_select_relevant_chunks_ranks_and_keeps_order():
+    selected = select_relevant_chunks(ARTICLE, "withering attack initiative", budget=200, chunk_chars=60)
+    assert [chunk.heading for chunk in selected[-2:]] == ["Rules > Combat", "Rules > Combat"]
+    assert selected[-1].score > selected[-2].score > 0
+    assert sum(len(chunk.render()) + 2 for chunk in selected) <= 200
+    assert [chunk.index for chunk in selected] == sorted(chunk.index for chunk in selected)
+
+
+def test_select_relevant_chunks_falls_back_to_lead():
+    selected = select_relevant_chunks(ARTICLE, "unrelated", budget=60, chunk_chars=60)
+    assert selected[0].text == "Exalted is a tabletop role-playing game."
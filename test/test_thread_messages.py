@@ -0,0 +1,158 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+from openai.types.beta.threads import Message as OpenAIThreadMessage
+
+from src.models.api_response import ResponseStatus
+from src.models.message import MessageCreate
+from src.openai_api import function_tools, thread_messages
+
+
+def make_api_message(text):
+    return OpenAIThreadMessage.model_validate({
+        "id": "msg_1", "object": "thread.message", "created_at": 0, "thread_id": "thread_new",
+        "role": "assistant", "status": "completed", "attachments": None, "metadata": None,
+        "content": [{"type": "text", "text": {"value": text, "annotations": []}}],
+        "assistant_id": "asst", "run_id": "run_1",
+        "completed_at": None, "incomplete_at": None, "incomplete_details": None,
+    })
+
+
+class FakeThreads:
+    def __init__(self):
+        self.calls = []
+        self.runs = SimpleNamespace(create=self.create_run)
+        self.messages = SimpleNamespace(list=self.list_messages)
+
+    def completed_run(self, thread_id):
+        return SimpleNamespace(id="run_1", thread_id=thread_id, status="completed", usage=None)
+
+    async def create_and_run(self, assistant_id, thread, stream):
+        self.calls.append(("create_and_run", thread["messages"]))
+        return self.completed_run("thread_new")
+
+    async def create_run(self, thread_id, assistant_id, additional_messages, stream):
+        self.calls.append(("runs.create", additional_messages))
+        return self.completed_run(thread_id)
+
+    async def list_messages(self, thread_id, limit, run_id):
+        self.calls.append(("messages.list", limit, run_id))
+        return SimpleNamespace(data=[make_api_message("hello")])
+
+
+def run_turn(monkeypatch, thread_id):
+    threads = FakeThreads()
+    monkeypatch.setattr(thread_messages, "client", SimpleNamespace(beta=SimpleNamespace(threads=threads)))
+    new_message = MessageCreate.from_discord_messages(thread_id=thread_id, messages=[("alice", "hi")], image_ids=[])
+    response = asyncio.run(thread_messages.generate_response(thread_id, "asst", new_message))
+    return response, threads.calls
+
+
+def test_first_message_creates_the_thread_with_the_run(monkeypatch):
+    response, calls = run_turn(monkeypatch, None)
+
+    assert response.status is ResponseStatus.OK
+    assert response.thread_id == "thread_new"
+    assert calls[0] == ("create_and_run", [{"content": [{"text": "alice: hi", "type": "text"}], "role": "user"}])
+    assert calls[1] == ("messages.list", 1, "run_1")
+
+
+def test_message_is_sent_with_the_run(monkeypatch):
+    response, calls = run_turn(monkeypatch, "thread_a")
+
+    assert response.message.content[0].value == "hello"
+    assert [call[0] for call in calls] == ["runs.create", "messages.list"]
+
+
+class HangingThreads(FakeThreads):
+    def __init__(self):
+        super().__init__()
+        self.runs = SimpleNamespace(create=self.create_run, cancel=self.cancel_run)
+
+    async def create_run(self, thread_id, assistant_id, additional_messages, stream):
+        self.calls.append(("runs.create", additional_messages))
+        return SimpleNamespace(id="run_1", thread_id=thread_id, status="in_progress")
+
+    async def cancel_run(self, thread_id, run_id):
+        self.calls.append(("runs.cancel", run_id))
+        return SimpleNamespace(id=run_id, status="cancelled")
+
+
+def test_run_exceeding_its_deadline_times_out_and_is_cancelled(monkeypatch):
+    threads = HangingThreads()
+    client = SimpleNamespace(beta=SimpleNamespace(threads=threads))
+    monkeypatch.setattr(thread_messages, "client", client)
+    monkeypatch.setattr(thread_messages.run_supervisor, "client", client)
+
+    async def wait(thread_id, run_id):
+        await asyncio.sleep(60)
+
+    monkeypatch.setattr(thread_messages.run_poller, "wait", wait)
+    new_message = MessageCreate.from_discord_messages(thread_id="thread_a", messages=[("alice", "hi")], image_ids=[])
+
+    response = asyncio.run(
+        thread_messages.generate_assistant_message_in_thread("thread_a", "asst", new_message, deadline=0.05)
+    )
+
+    assert response.status is ResponseStatus.TIMEOUT
+    assert response.thread_id == "thread_a"
+    assert [call[0] for call in threads.calls] == ["runs.create", "runs.cancel"]
+    assert thread_messages.run_supervisor.find("thread_a") is None
+
+
+def test_every_tool_call_gets_an_output(monkeypatch):
+    def fail(query):
+        raise ConnectionError("wikipedia is down")
+
+    monkeypatch.setattr(function_tools, "get_wikipedia_summary_function", fail)
+    monkeypatch.setattr(function_tools, "get_wikipedia_page_content_function", lambda query: None)
+    arguments = json.dumps({"query": "unlisted page"})
+    tool_calls = [
+        SimpleNamespace(id=f"call_{i}", function=SimpleNamespace(name=name, arguments=arguments))
+        for i, name in enumerate(["get_wikipedia_summary", "get_wikipedia_page_content", "missing"])
+    ]
+
+    outputs = asyncio.run(function_tools.get_function_tool_outputs(tool_calls))
+
+    assert outputs == [
+        {"tool_call_id": "call_0", "output": "Error: get_wikipedia_summary failed: wikipedia is down"},
+        {"tool_call_id": "call_1", "output": 'No results found for {"query": "unlisted page"}'},
+        {"tool_call_id": "call_2", "output": "Error: unknown function missing"},
+    ]
+
+
+class SlowCreateThreads(HangingThreads):
+    async def create_and_run(self, assistant_id, thread, stream):
+        self.calls.append(("create_and_run", thread["messages"]))
+        await asyncio.sleep(0.05)
+        return SimpleNamespace(id="run_1", thread_id="thread_new", status="queued")
+
+
+def test_first_turn_is_superseded_before_its_thread_exists(monkeypatch):
+    threads = SlowCreateThreads()
+    client = SimpleNamespace(beta=SimpleNamespace(threads=threads))
+    monkeypatch.setattr(thread_messages, "client", client)
+    monkeypatch.setattr(thread_messages.run_supervisor, "client", client)
+
+    async def wait(thread_id, run_id):
+        await asyncio.sleep(60)
+
+    monkeypatch.setattr(thread_messages.run_poller, "wait", wait)
+    new_message = MessageCreate.from_discord_messages(thread_id=None, messages=[("alice", "hi")], image_ids=[])
+
+    async def main():
+        turn = asyncio.create_task(
+            thread_messages.generate_response(None, "asst", new_message, discord_thread_id=42)
+        )
+        await asyncio.sleep(0.01)
+        superseded = await thread_messages.run_supervisor.supersede(42)
+        return superseded, await turn
+
+    superseded, response = asyncio.run(main())
+
+    assert superseded is not None
+    assert response.status is ResponseStatus.SUPERSEDED
+    assert response.thread_id == "thread_new"
+    assert threads.calls[-1] == ("runs.cancel", "run_1")
+    assert thread_messages.run_supervisor.list_runs() == []
@@ -0,0 +1,60 @@
+import asyncio
+from types import SimpleNamespace
+
+from src.openai_api.thread_pool import ThreadPool
+
+
+class FakeThreads:
+    def __init__(self):
+        self.created = 0
+        self.deleted = []
+
+    async def create(self):
+        self.created += 1
+        return SimpleNamespace(id=f"thread_{self.created}")
+
+    async def delete(self, thread_id):
+        self.deleted.append(thread_id)
+
+
+def make_pool(**kwargs):
+    threads = FakeThreads()
+    client = SimpleNamespace(beta=SimpleNamespace(threads=threads))
+    return ThreadPool(client=client, **kwargs), threads
+
+
+def test_pool_fills_up_and_refills_after_take():
+    pool, threads = make_pool(size=2, refill_rate=1000, max_age=60)
+
+    async def main():
+        pool.start()
+        await asyncio.sleep(0.05)
+        assert len(pool.threads) == 2
+        taken = pool.take()
+        await asyncio.sleep(0.05)
+        await pool.stop()
+        return taken
+
+    assert asyncio.run(main()) == "thread_2"
+    assert threads.created == 3
+    assert sorted(threads.deleted) == ["thread_1", "thread_3"]
+    assert pool.stats()["hits"] == 1
+
+
+def test_take_from_empty_pool_is_a_miss():
+    pool, _ = make_pool(size=0)
+    assert pool.take() is None
+    assert pool.stats()["misses"] == 1
+
+
+def test_stale_threads_are_recycled():
+    pool, threads = make_pool(size=1, refill_rate=1000, max_age=0.02)
+
+    async def main():
+        pool.start()
+        await asyncio.sleep(0.1)
+        await pool.stop()
+
+    asyncio.run(main())
+    assert pool.recycled >= 1
+    assert "thread_1" in threads.deleted
@@ -0,0 +1,160 @@
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+from src.openai_api.function_tools import get_available_functions, tool_registry
+from src.openai_api.tool_registry import ToolRegistry
+
+
+def tool_call(id, name, **arguments):
+    return SimpleNamespace(id=id, function=SimpleNamespace(name=name, arguments=json.dumps(arguments)))
+
+
+def make_registry():
+    registry = ToolRegistry(max_workers=2)
+    calls = []
+
+    @registry.tool(cacheable=True, max_output_chars=10)
+    def lookup(query: str, limit: int = 3) -> str:
+        """Look something up
+
+        Args:
+            query: What to look up
+            limit: How many results
+        """
+        calls.append(query)
+        return query * limit
+
+    @registry.tool(timeout=0.05)
+    def slow(query: str) -> str:
+        """Take too long"""
+        time.sleep(0.2)
+        return query
+
+    @registry.tool(blocking=False)
+    async def empty() -> None:
+        """Find nothing"""
+        return None
+
+    return registry, calls
+
+
+def test_schema_is_generated_from_signature():
+    registry, _ = make_registry()
+    function = registry.get("lookup").schema["function"]
+    assert function["name"] == "lookup"
+    assert function["description"] == "Look something up"
+    assert function["parameters"]["properties"] == {
+        "query": {"type": "string", "description": "What to look up"},
+        "limit": {"type": "integer", "description": "How many results"},
+    }
+    assert function["parameters"]["required"] == ["query"]
+
+
+def test_wikipedia_tools_are_registered():
+    names = [schema["function"]["name"] for schema in get_available_functions()]
+    assert names == ["get_wikipedia_summary", "get_wikipedia_page_content"]
+
+
+def test_call_all_returns_an_output_for_every_call():
+    registry, calls = make_registry()
+
+    outputs = asyncio.run(registry.call_all([
+        tool_call("1", "lookup", query="ab"),
+        tool_call("2", "lookup", query="ab"),
+        tool_call("3", "slow", query="x"),
+        tool_call("4", "empty"),
+        tool_call("5", "missing"),
+    ]))
+
+    assert [output["tool_call_id"] for output in outputs] == ["1", "2", "3", "4", "5"]
+    assert outputs[0]["output"] == "ababab"
+    assert outputs[2]["output"] == "Error: slow timed out"
+    assert outputs[3]["output"] == "No results found for {}"
+    assert outputs[4]["output"] == "Error: unknown function missing"
+    assert registry.get("lookup").latency.count + registry.get("lookup").cache.hits == 2
+
+
+def test_output_is_truncated_and_cached():
+    registry, calls = make_registry()
+
+    async def main():
+        first = await registry.call(tool_call("1", "lookup", query="abcd"))
+        second = await registry.call(tool_call("2", "lookup", query="abcd"))
+        return first, second
+
+    first, second = asyncio.run(main())
+    assert first["output"] == "abcdabcdab\n[truncated]"
+    assert second["output"] == first["output"]
+    assert calls == ["abcd"]
+
+
+def test_concurrent_calls_are_limited_per_tool():
+    registry = ToolRegistry(max_workers=4)
+    active = []
+    peak = [0]
+
+    @registry.tool(max_concurrency=2)
+    def search(query: str) -> str:
+        """Search"""
+        active.append(query)
+        peak[0] = max(peak[0], len(active))
+        time.sleep(0.05)
+        active.remove(query)
+        return query
+
+    outputs = asyncio.run(registry.call_all([tool_call(str(i), "search", query=str(i)) for i in range(5)]))
+
+    assert [output["output"] for output in outputs] == ["0", "1", "2", "3", "4"]
+    assert peak[0] == 2
+
+
+def test_timed_out_call_keeps_its_slot_until_its_thread_finishes():
+    registry = ToolRegistry(max_workers=4)
+    running = []
+    peak = [0]
+
+    @registry.tool(timeout=0.05, max_concurrency=1)
+    def fetch(query: str) -> str:
+        """Fetch"""
+        running.append(query)
+        peak[0] = max(peak[0], len(running))
+        time.sleep(0.2 if query == "slow" else 0)
+        running.remove(query)
+        return query
+
+    async def main():
+        slow = await registry.call(tool_call("1", "fetch", query="slow"))
+        fast = await registry.call(tool_call("2", "fetch", query="fast"))
+        return slow, fast
+
+    slow, fast = asyncio.run(main())
+
+    assert slow["output"] == "Error: fetch timed out"
+    assert fast["output"] == "fast"
+    assert peak[0] == 1
+    assert not registry.get("fetch").semaphore.locked()
+
+
+def test_empty_outputs_are_not_cached():
+    registry = ToolRegistry(max_workers=1)
+    calls = []
+
+    @registry.tool(cacheable=True)
+    def find(query: str) -> str | None:
+        """Find"""
+        calls.append(query)
+        return None
+
+    async def main():
+        for i in range(2):
+            await registry.call(tool_call(str(i), "find", query="x"))
+
+    asyncio.run(main())
+    assert calls == ["x", "x"]
+
+
+def test_wikipedia_tools_are_only_cached_by_the_wikipedia_functions():
+    assert tool_registry.get("get_wikipedia_summary").cache is None
+    assert tool_registry.get("get_wikipedia_page_content").cache is None
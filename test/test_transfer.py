@@ -0,0 +1,57 @@
+import asyncio
+import io
+
+import aiohttp
+from aiohttp import web
+
+from src.openai_api.transfer import download_url, write_chunks
+
+SIZE = 300 * 1024
+
+
+async def serve(handler):
+    app = web.Application()
+    app.router.add_get("/file", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}/file"
+
+
+async def send_file(request):
+    response = web.StreamResponse()
+    response.content_length = SIZE
+    await response.prepare(request)
+    for _ in range(SIZE // 1024):
+        await response.write(b"x" * 1024)
+    return response
+
+
+async def chunks(*parts):
+    for part in parts:
+        yield part
+
+
+def test_small_transfers_stay_in_memory_and_large_ones_go_to_disk():
+    small = asyncio.run(write_chunks(chunks(b"ab", b"c"), size=3, max_memory=10))
+    assert isinstance(small, io.BytesIO) and small.read() == b"abc"
+
+    large = asyncio.run(write_chunks(chunks(b"x" * 8, b"y" * 8), size=16, max_memory=10))
+    assert not isinstance(large, io.BytesIO)
+    assert large.read() == b"x" * 8 + b"y" * 8
+    large.close()
+
+
+def test_download_streams_to_a_temporary_file():
+    async def main():
+        runner, url = await serve(send_file)
+        try:
+            async with aiohttp.ClientSession() as session:
+                with await download_url(session, url, max_memory=64 * 1024) as f:
+                    return isinstance(f, io.BytesIO), len(f.read())
+        finally:
+            await runner.cleanup()
+
+    assert asyncio.run(main()) == (False, SIZE)
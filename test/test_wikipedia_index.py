@@ -0,0 +1,89 @@
+import json
+import shutil
+from pathlib import Path
+
+import pytest
+
+from src.openai_api import functions
+from src.openai_api.wikipedia_index import WikipediaIndex, wikitext_to_text
+
+DUMP = str(Path(__file__).parent / "fixtures" / "wikipedia_dump.xml")
+
+
+def test_wikitext_to_text():
+    text = wikitext_to_text(
+        "{{Infobox|a={{nested}}}}'''Bold''' [[Target|label]] and [[Link]]<ref>x</ref>"
+        "[[File:a.png|thumb|[[caption]]]] [https://example.org site]"
+    )
+    assert text == "Bold label and Link site"
+
+
+def test_import_xml_dump(tmp_path):
+    index = WikipediaIndex(str(tmp_path / "index.db"))
+    assert index.import_dump(DUMP, language="ja") == 2
+    # importing again does not duplicate pages
+    assert index.import_dump(DUMP, language="ja") == 0
+    assert len(index) == 2
+
+    page = index.get_page("エクサルテッド")
+    assert page["summary"] == "エクサルテッド（Exalted）はTRPGである。"
+    assert "== ルール ==" in page["content"]
+    assert "ファイル" not in page["content"]
+    assert page["url"] == "https://ja.wikipedia.org/wiki/%E3%82%A8%E3%82%AF%E3%82%B5%E3%83%AB%E3%83%86%E3%83%83%E3%83%89"
+
+
+def test_search(tmp_path):
+    index = WikipediaIndex(str(tmp_path / "index.db"))
+    index.import_dump(DUMP, language="ja")
+    assert index.search("十面体ダイス") == "エクサルテッド"
+    assert index.search("decisive initiative") == "Decisive attack"
+    # terms shorter than a trigram are looked up as a title prefix
+    assert index.search("エク") == "エクサルテッド"
+    assert index.search("a 十面体ダイス") == "エクサルテッド"
+    index.add_page("東京都", "東京都は日本の首都である。", "https://example.org/tokyo-to")
+    index.add_page("東京", "東京は日本の首都である。", "https://example.org/tokyo")
+    assert index.search("東京") == "東京"
+    assert index.search("検索") is None
+    assert index.search("nothing like this") is None
+
+
+def test_import_jsonl(tmp_path):
+    path = tmp_path / "pages.jsonl"
+    path.write_text(
+        json.dumps({"title": "Grapple", "text": "Grapples control the enemy.", "url": "https://example.org/g"}) + "\n",
+        encoding="utf8",
+    )
+    index = WikipediaIndex(str(tmp_path / "index.db"))
+    assert index.import_dump(str(path), language="en") == 1
+    assert index.get_page("Grapple") == {
+        "summary": "Grapples control the enemy.",
+        "content": "Grapples control the enemy.",
+        "url": "https://example.org/g",
+    }
+
+
+def test_xml_dump_in_a_json_directory_is_not_read_as_jsonl(tmp_path):
+    path = tmp_path / "exports.json" / "dump.xml"
+    path.parent.mkdir()
+    shutil.copy(DUMP, path)
+    index = WikipediaIndex(str(tmp_path / "index.db"))
+    assert index.import_dump(str(path), language="ja") == 2
+
+
+def test_missing_index_is_not_created(tmp_path, monkeypatch):
+    path = str(tmp_path / "missing.db")
+    with pytest.raises(FileNotFoundError):
+        WikipediaIndex(path, create=False)
+
+    monkeypatch.setattr(functions, "WIKIPEDIA_BACKEND", "local")
+    monkeypatch.setattr(functions, "WIKIPEDIA_INDEX_DB", path)
+    monkeypatch.setattr(functions, "_index", None)
+    monkeypatch.setattr(functions, "_index_missing", False)
+    monkeypatch.setattr(functions, "WIKIPEDIA_FALLBACK_TO_API", False)
+    with pytest.raises(FileNotFoundError):
+        functions.get_wikipedia_index()
+
+    monkeypatch.setattr(functions, "WIKIPEDIA_FALLBACK_TO_API", True)
+    assert functions.get_wikipedia_index() is None
+    assert functions._index_missing
+    assert not Path(path).exists()